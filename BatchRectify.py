@@ -0,0 +1,351 @@
+# -*- coding: utf-8 -*-
+"""
+BatchRectify
+============
+
+Rectifies archived frames with the calibration made interactively in
+OrthoView: the rectangle corners, its sizes `scalex` and `scaley` and the beam
+position `pos` stored in OrthoView.ini, the current calibration or a named
+one (`--calibration`). The transforms are the same as in
+`OrthoView.getTransform`, see `PlateCalibration.py`. It runs without Qt:
+
+``
+    python BatchRectify.py archive/ scan.avi --output rectified/
+``
+
+The inputs are image files, video files, `.npy` stacks of frames (as in
+`FrameSources.ReplaySource`) and directories of them, walked recursively. An
+image becomes one rectified image of the same relative name in the output
+directory, a video or a stack becomes a directory of numbered frames. The
+frames are rectified by a pool of processes; the inputs are read and the
+results are written as a stream, with only a few frames per process in
+flight, so that the memory does not grow with the number of frames.
+
+Every frame adds a line to `metadata.jsonl` in the output directory: the
+source and its frame number, the output file, its size, the homography from
+the source image pixels to the output pixels, the beam position in output
+pixels, the plate mm per output pixel and the plate extent (left, right,
+bottom, top) in mm relative to the beam, as the extent of matplotlib's
+`imshow`.
+
+"""
+
+__author__ = "Konstantin Klementiev"
+__versioninfo__ = (1, 0, 0)
+__version__ = '.'.join(map(str, __versioninfo__))
+__license__ = "MIT license"
+
+import os
+import sys
+import json
+import collections
+import multiprocessing
+from timeit import default_timer as timer
+
+try:
+    from ConfigParser import ConfigParser
+except ImportError:
+    from configparser import ConfigParser
+
+import numpy as np
+import cv2
+
+from PlateCalibration import PlateCalibration
+from CalibrationStore import CalibrationStore, literal
+
+imageExtensions = ('.png', '.jpg', '.jpeg', '.bmp', '.tif', '.tiff')
+videoExtensions = ('.avi', '.mp4', '.mkv', '.mov', '.mpg', '.mpeg')
+stackExtensions = ('.npy',)
+inFlightPerProcess = 2
+
+
+def readCalibration(iniName, camera=None, name=None):
+    """The calibration of OrthoView.ini `iniName`, of the pane `camera` if
+    given (see `OrthoView.paneSection`), the current one or the stored
+    calibration `name` (see `CalibrationStore`), as the keyword arguments of
+    `PlateCalibration` except `imageSize`, the [view] interpolation and
+    maxpixels."""
+    config = ConfigParser(
+        dict(pos='[0, 0]', corners='[None]*4', scalex=0, scaley=0))
+    rectangle, beam = ['{0}:{1}'.format(kind, camera) if camera else kind
+                       for kind in ('rectangle', 'beam')]
+    if not config.read(iniName):
+        raise IOError('cannot read {0}'.format(iniName))
+    for section in (rectangle, beam, 'view'):
+        if not config.has_section(section):
+            config.add_section(section)
+    if name is not None:
+        try:
+            stored = CalibrationStore(config, camera).load(name)
+        except KeyError as e:
+            raise ValueError('{0}: {1}'.format(iniName, e.args[0]))
+        corners = stored['corners']
+        kw = dict(corners=corners, scalex=stored['scalex'],
+                  scaley=stored['scaley'], beamPos=stored['pos'])
+    else:
+        corners = literal(config.get(rectangle, 'corners'))
+        kw = dict(corners=corners,
+                  scalex=float(config.get(rectangle, 'scalex')),
+                  scaley=float(config.get(rectangle, 'scaley')),
+                  beamPos=literal(config.get(beam, 'pos')))
+    if None in corners or kw['scalex'] <= 0 or kw['scaley'] <= 0:
+        raise ValueError('{0} has no complete calibration: define the '
+                         'rectangle and its sizes in OrthoView'.format(
+                             iniName))
+    view = dict(interpolation='linear', maxpixels='4000000')
+    view.update(config.items('view'))
+    nearest = view['interpolation'].lower() == 'nearest'
+    maxPixels = int(float(view['maxpixels']))
+    return kw, nearest, maxPixels
+
+
+# =============================================================================
+# the worker side; the state is set once per process by `initWorker()`
+# =============================================================================
+
+worker = {}
+
+
+def initWorker(calibration, nearest, maxPixels, region):
+    cv2.setNumThreads(1)  # the parallelism is in the processes
+    worker.update(calibration=calibration, nearest=nearest,
+                  maxPixels=maxPixels, region=region, calibrations={})
+
+
+def calibrationFor(imageSize):
+    """The calibration for frames of `imageSize`, made once per size."""
+    calibs = worker['calibrations']
+    if imageSize not in calibs:
+        calibs[imageSize] = PlateCalibration(
+            imageSize=imageSize, **worker['calibration'])
+    return calibs[imageSize]
+
+
+def outputWindow(calib, region, maxPixels):
+    """The rectified window (x, y, width, height) of `region` and its output
+    size (width, height), downscaled to at most `maxPixels`."""
+    if region == 'rectangle':
+        (x0, y0), _, (x1, y1), _ = calib.targetRect
+        window = int(x0), int(y0), int(x1 - x0), int(y1 - y0)
+    else:
+        window = (0, 0) + tuple(calib.boundingRect[2:4])
+    w, h = window[2:4]
+    if w * h > maxPixels:
+        s = (maxPixels / float(w * h))**0.5
+        return window, (max(int(w*s), 1), max(int(h*s), 1))
+    return window, (w, h)
+
+
+def frameMetadata(calib, window, size):
+    x, y, w, h = window
+    # the output pixel edges in rectified pixels, as the extent of imshow:
+    left, right, top, bottom = calib.rectifiedToPlate(
+        [(x-0.5, y-0.5), (x+w-0.5, y+h-0.5)]).T.ravel()
+    sx, sy = size[0] / float(w), size[1] / float(h)
+    bx, by = calib.beamPosRectified
+    return dict(
+        size=list(size),
+        homography=calib.windowTransform(window, size).tolist(),
+        beamPixel=[(bx - x + 0.5)*sx - 0.5, (by - y + 0.5)*sy - 0.5],
+        mmPerPixel=[1. / (sx*calib.zoom), 1. / (sy*calib.zoom)],
+        plateExtent=[left, right, bottom, top])
+
+
+def makeDirs(fileName):
+    dirName = os.path.dirname(fileName)
+    if dirName and not os.path.isdir(dirName):
+        try:
+            os.makedirs(dirName)
+        except OSError:  # made meanwhile by another process
+            if not os.path.isdir(dirName):
+                raise
+
+
+def rectifyTask(task):
+    """Rectifies one frame. `task` is (source, frame number, the frame, None
+    to read the image file `source` or the exception of reading `source`,
+    output file name); returns the metadata of the frame."""
+    source, iframe, frame, outName = task
+    meta = collections.OrderedDict(
+        (('source', source), ('frame', iframe), ('output', outName)))
+    try:
+        if isinstance(frame, Exception):
+            raise frame
+        if frame is None:
+            frame = cv2.imread(source, cv2.IMREAD_UNCHANGED)
+            if frame is None:
+                raise IOError('cannot read the image')
+        calib = calibrationFor(frame.shape[1::-1])
+        window, size = outputWindow(
+            calib, worker['region'], worker['maxPixels'])
+        nearest = worker['nearest']
+        map1, map2 = calib.windowMaps(window, size, nearest)
+        img = cv2.remap(frame, map1, map2,
+                        cv2.INTER_NEAREST if nearest else cv2.INTER_LINEAR)
+        makeDirs(outName)
+        if not cv2.imwrite(outName, img):
+            raise IOError('cannot write {0}'.format(outName))
+        meta.update(frameMetadata(calib, window, size))
+    except Exception as e:
+        meta['error'] = str(e)
+    return meta
+
+
+# =============================================================================
+# the reading side
+# =============================================================================
+
+def listInputs(paths, skip=None):
+    """Yields (file name, its name relative to the given path) of the
+    inputs; directories are walked recursively in sorted order, `skip` (the
+    output directory) is not entered."""
+    skip = os.path.abspath(skip) if skip else None
+    extensions = imageExtensions + videoExtensions + stackExtensions
+    for path in paths:
+        if not os.path.isdir(path):
+            yield path, os.path.basename(path)
+            continue
+        for root, dirs, files in os.walk(path):
+            dirs[:] = sorted(d for d in dirs if
+                             os.path.abspath(os.path.join(root, d)) != skip)
+            for name in sorted(files):
+                if os.path.splitext(name)[1].lower() in extensions:
+                    fileName = os.path.join(root, name)
+                    yield fileName, os.path.relpath(fileName, path)
+
+
+def readFrames(fileName):
+    """Yields the frames of a video file or a `.npy` stack as BGR, the order
+    of OpenCV, one by one."""
+    if fileName.lower().endswith(stackExtensions):
+        stack = np.load(fileName, mmap_mode='r')
+        if stack.ndim not in (3, 4):
+            raise ValueError('{0} is not a stack of frames'.format(fileName))
+        for frame in stack:
+            frame = np.array(frame)
+            if frame.dtype == np.uint32:  # packed, see FrameCodec
+                import FrameCodec
+                frame = FrameCodec.unpack(frame)
+            if frame.ndim == 3:  # the stacks of OrthoView are RGB
+                frame = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
+            yield frame
+        return
+    video = cv2.VideoCapture(fileName)
+    if not video.isOpened():
+        raise IOError('cannot open the video {0}'.format(fileName))
+    try:
+        while True:
+            ret, frame = video.read()
+            if not ret:
+                break
+            yield frame
+    finally:
+        video.release()
+
+
+def makeTasks(paths, outDir, ext):
+    """Yields the tasks of `rectifyTask()`. The images are read by the
+    workers, the frames of videos and stacks are read here."""
+    for fileName, relName in listInputs(paths, outDir):
+        stem = os.path.splitext(relName)[0]
+        if fileName.lower().endswith(imageExtensions):
+            yield fileName, 0, None, os.path.join(outDir, stem + ext)
+            continue
+        try:
+            for iframe, frame in enumerate(readFrames(fileName)):
+                yield fileName, iframe, frame, os.path.join(
+                    outDir, stem, '{0:06d}{1}'.format(iframe, ext))
+        except (IOError, ValueError) as e:
+            yield fileName, 0, e, None
+
+
+def runTasks(tasks, processes, initArgs):
+    """Yields the results of `rectifyTask()` in the order of `tasks`, with at
+    most `inFlightPerProcess` tasks per process submitted ahead."""
+    if processes == 1:
+        initWorker(*initArgs)
+        for task in tasks:
+            yield rectifyTask(task)
+        return
+
+    pool = multiprocessing.Pool(processes, initWorker, initArgs)
+    pending = collections.deque()
+    try:
+        for task in tasks:
+            pending.append(pool.apply_async(rectifyTask, (task,)))
+            if len(pending) >= inFlightPerProcess * processes:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(
+        description='Rectifies images and videos with the OrthoView '
+        'calibration')
+    parser.add_argument('inputs', nargs='+',
+                        help='image, video or .npy files and directories')
+    parser.add_argument('-o', '--output', required=True,
+                        help='output directory')
+    parser.add_argument(
+        '--ini', default=os.path.join(os.path.dirname(__file__) or '.',
+                                      'OrthoView.ini'),
+        help='the OrthoView.ini with the calibration')
+    parser.add_argument('--camera', default=None,
+                        help='the camera pane of the calibration, see '
+                        '`cameras` in OrthoView.ini')
+    parser.add_argument('--calibration', default=None, metavar='NAME',
+                        help='a stored calibration; default: the current '
+                        'one')
+    parser.add_argument('--region', default='view',
+                        choices=('view', 'rectangle'),
+                        help='the whole rectified view or only the '
+                        'reference rectangle')
+    parser.add_argument('--interpolation', default=None,
+                        choices=('linear', 'nearest'),
+                        help='default: as in the [view] section of the ini')
+    parser.add_argument('--maxpixels', type=int, default=None,
+                        help='the largest output image, pixels; default: as '
+                        'in the [view] section of the ini')
+    parser.add_argument('--format', default='png',
+                        help='the output image format (file extension)')
+    parser.add_argument('--processes', type=int, default=None,
+                        help='default: the number of CPUs')
+    args = parser.parse_args()
+
+    calibration, nearest, maxPixels = readCalibration(
+        args.ini, args.camera, args.calibration)
+    if args.interpolation is not None:
+        nearest = args.interpolation == 'nearest'
+    if args.maxpixels is not None:
+        maxPixels = args.maxpixels
+    processes = args.processes or multiprocessing.cpu_count()
+    ext = '.' + args.format.lstrip('.').lower()
+    if not os.path.isdir(args.output):
+        os.makedirs(args.output)
+
+    nFrames, nErrors = 0, 0
+    t0 = timer()
+    tasks = makeTasks(args.inputs, args.output, ext)
+    with open(os.path.join(args.output, 'metadata.jsonl'), 'w') as f:
+        for meta in runTasks(tasks, processes,
+                             (calibration, nearest, maxPixels, args.region)):
+            f.write(json.dumps(meta) + '\n')
+            if 'error' in meta:
+                nErrors += 1
+                sys.stderr.write('{0}: {1}\n'.format(
+                    meta['source'], meta['error']))
+            else:
+                nFrames += 1
+    dt = timer() - t0
+    print('{0} frames rectified in {1:.1f} s ({2:.1f} fps), {3} errors'.format(
+        nFrames, dt, nFrames / dt if dt > 0 else 0, nErrors))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark
+=========
+
+Times the stages of the OrthoView refresh for several frame sizes, for the
+raw and rectified views and for both display canvases:
+
+- unpack: the packed Tango frame to RGB (`FrameCodec.unpack`);
+- rectify: the perspective remap (`OrthoView.rectify`);
+- overlay: drawing the overlay markers (`OverlayLayer.begin...end`);
+- blend: putting the overlay over the frame (`OverlayLayer.blend`);
+- draw: showing the frame by the canvas, including its repaint;
+- render: `OrthoView.renderView` from the cached frame, i.e. all of the
+  above except unpack and overlay, as it runs after a UI change.
+
+It runs without a display on the offscreen Qt platform. The frames come
+from `FrameSources.SyntheticPlateSource`. The views start from the default
+settings, not those of the user's OrthoView.ini, and keep their config and
+transform cache in a temporary directory, so neither OrthoView.ini nor
+OrthoView.cache is written. The results (ms per stage: median,
+mean and min over the repetitions) are written as JSON:
+
+``
+    python Benchmark.py --output before.json
+    python Benchmark.py --output after.json --compare before.json
+``
+
+"""
+
+__author__ = "Konstantin Klementiev"
+__versioninfo__ = (1, 0, 0)
+__version__ = '.'.join(map(str, __versioninfo__))
+__license__ = "MIT license"
+
+import os
+import sys
+import time
+import json
+import shutil
+import tempfile
+import platform
+import datetime
+from timeit import default_timer as timer
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+import numpy as np  # noqa: E402
+import cv2  # noqa: E402
+import matplotlib  # noqa: E402
+
+import FrameCodec  # noqa: E402
+import FrameSources  # noqa: E402
+import OrthoView  # noqa: E402
+
+qt = OrthoView.qt
+
+sizes = [(640, 480), (1280, 960), (1920, 1080), (2592, 1944), (3840, 2160)]
+stages = ['unpack', 'rectify', 'overlay', 'blend', 'draw', 'render']
+
+
+def isolateFiles():
+    """Drops the settings read from the user's OrthoView.ini and redirects
+    the config and the transform cache into a new temporary directory,
+    which is returned."""
+    tmpDir = tempfile.mkdtemp(prefix='OrthoViewBenchmark')
+    config = OrthoView.config
+    for section in config.sections():
+        config.remove_section(section)
+        config.add_section(section)
+    OrthoView.iniApp = os.path.join(tmpDir, 'OrthoView.ini')
+    OrthoView.mapCache = OrthoView.MapCache(
+        os.path.join(tmpDir, 'OrthoView.cache'), OrthoView.fileWriter)
+    return tmpDir
+
+
+def timeStage(func, repeat):
+    times = []
+    for i in range(repeat):
+        t0 = timer()
+        func()
+        times.append((timer() - t0) * 1e3)
+    return dict(median=float(np.median(times)), mean=float(np.mean(times)),
+                min=float(np.min(times)))
+
+
+def setupView(app, backend, size):
+    """An OrthoView of the QApplication `app` on a synthetic plate of
+    `size` (width, height), calibrated on the plate outline. The source
+    rate is so low that only the first frame is read; the view may start
+    without it and is given it here."""
+    source = FrameSources.SyntheticPlateSource(size[0], size[1], rate=0.01)
+    view = OrthoView.OrthoView(canvas=backend, source=source)
+    view.refreshTimer.stop()
+    # the frame count stays, the new frame flag is cleared by a render:
+    t0 = time.time()
+    while view.grabber.frameCount == 0:
+        if time.time() - t0 > 5:
+            raise RuntimeError('no frame from the synthetic source')
+        time.sleep(0.01)
+    view.updateFrame()
+    if view.img.shape[:2] != (size[1], size[0]):
+        raise RuntimeError('the view has not taken the synthetic frame')
+    view.resize(1000, 800)
+    view.show()
+    app.processEvents()
+
+    w, h = size
+    corners = [(0.2*w, 0.25*h), (0.85*w, 0.2*h), (0.9*w, 0.85*h),
+               (0.1*w, 0.8*h)]
+    view.buttonBaseRect.corners = [(int(x), int(y)) for x, y in corners]
+    view.buttonScaleX.scale = 117.  # the plate of SyntheticPlateSource, mm
+    view.buttonScaleY.scale = 81.
+    view.plotCanvas.beamPos = [w//2, h//2]
+    view.getTransform()
+    return view
+
+
+def runCase(view, mode, repeat):
+    canvas = view.plotCanvas
+    frame = view.img
+    packed = FrameCodec.pack(frame, isBGR=False)
+    rectified = mode == 'rectified'
+    view.buttonStraightRect.setChecked(rectified)
+    img = view.rectify(frame) if rectified else frame
+
+    def overlay():
+        view.overlay.begin(None, img.shape)
+        if rectified:
+            view.drawRectifiedOverlay(img.shape)
+        else:
+            view.drawImageOverlay(img.shape)
+        view.overlay.end()
+
+    def draw():
+        canvas.imshow(blended)
+        canvas.repaint()
+
+    def render():
+        view.renderedKey = None
+        view.renderView()
+        canvas.repaint()
+
+    overlay()
+    blended = view.overlay.blend(img)
+    draw()  # the first imshow sets up the canvas
+    res = {}
+    res['unpack'] = timeStage(lambda: FrameCodec.unpack(packed), repeat)
+    if rectified:
+        res['rectify'] = timeStage(lambda: view.rectify(frame), repeat)
+    res['overlay'] = timeStage(overlay, repeat)
+    res['blend'] = timeStage(lambda: view.overlay.blend(img), repeat)
+    res['draw'] = timeStage(draw, repeat)
+    res['render'] = timeStage(render, repeat)
+    return res
+
+
+def environment():
+    return dict(
+        date=datetime.datetime.now().isoformat(),
+        python=platform.python_version(), machine=platform.machine(),
+        platform=platform.platform(), numpy=np.__version__,
+        cv2=cv2.__version__, matplotlib=matplotlib.__version__,
+        qt=qt.QT_VERSION_STR, qpa=os.environ.get('QT_QPA_PLATFORM'))
+
+
+def printResults(results, reference=None):
+    """Prints the medians, ms, or their ratios to the `reference` run."""
+    ref = {}
+    if reference is not None:
+        ref = dict(((r['backend'], r['mode'], tuple(r['size'])), r)
+                   for r in reference['results'])
+    print('{0:7s} {1:10s} {2:>10s}'.format('canvas', 'mode', 'size') +
+          ''.join('{0:>9s}'.format(s) for s in stages) +
+          ('  (new/old)' if reference else '  (ms)'))
+    for r in results:
+        old = ref.get((r['backend'], r['mode'], tuple(r['size'])))
+        cells = []
+        for stage in stages:
+            if stage not in r['stages']:
+                cells.append('-')
+            elif reference is None:
+                cells.append('{0:.2f}'.format(r['stages'][stage]['median']))
+            elif old is None or stage not in old['stages']:
+                cells.append('?')
+            else:
+                cells.append('{0:.2f}'.format(
+                    r['stages'][stage]['median'] /
+                    old['stages'][stage]['median']))
+        print('{0:7s} {1:10s} {2:>10s}'.format(
+            r['backend'], r['mode'], '{0}x{1}'.format(*r['size'])) +
+            ''.join('{0:>9s}'.format(c) for c in cells))
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description='OrthoView benchmark')
+    parser.add_argument(
+        '--sizes', nargs='+', default=None, metavar='WxH',
+        help='frame sizes (default: {0})'.format(
+            ' '.join('{0}x{1}'.format(*s) for s in sizes)))
+    parser.add_argument('--backends', nargs='+', default=['mpl', 'qimage'],
+                        choices=('mpl', 'qimage'))
+    parser.add_argument('--modes', nargs='+', default=['raw', 'rectified'],
+                        choices=('raw', 'rectified'))
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--output', default=None,
+                        help='JSON file of the results')
+    parser.add_argument('--compare', default=None,
+                        help='JSON file of a previous run; the table shows '
+                        'the ratios to it')
+    args, qtArgs = parser.parse_known_args()
+    caseSizes = sizes if args.sizes is None else \
+        [tuple(int(v) for v in s.lower().split('x')) for s in args.sizes]
+
+    app = qt.QApplication(sys.argv[:1] + qtArgs)
+    tmpDir = isolateFiles()
+    results = []
+    try:
+        for backend in args.backends:
+            for size in caseSizes:
+                view = setupView(app, backend, size)
+                for mode in args.modes:
+                    results.append(dict(
+                        backend=backend, mode=mode, size=list(size),
+                        stages=runCase(view, mode, args.repeat)))
+                view.close()
+                view.deleteLater()
+    finally:
+        OrthoView.fileWriter.flush()
+        shutil.rmtree(tmpDir, ignore_errors=True)
+
+    report = dict(environment=environment(), repeat=args.repeat,
+                  results=results)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=1)
+    reference = None
+    if args.compare:
+        with open(args.compare) as f:
+            reference = json.load(f)
+    printResults(results, reference)
+
+
+if __name__ == "__main__":
+    main()
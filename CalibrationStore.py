@@ -0,0 +1,269 @@
+# -*- coding: utf-8 -*-
+"""
+CalibrationStore
+================
+
+Keeps the calibrations of OrthoView on disk:
+
+- `BackgroundWriter` writes the config file and the caches in a worker
+  thread. A file submitted again before it is written is written once, with
+  the last data, and every file is written into a temporary file that then
+  replaces it, so that a crash never leaves a partial file. The GUI only
+  serializes the config, which takes microseconds.
+
+- `CalibrationStore` holds the named calibrations of a camera pane in the
+  config sections [calibration NAME] (or [calibration:PANE NAME]): the
+  rectangle corners, its sizes, the beam position and a version, which
+  grows by one every time the calibration is saved with a change.
+
+- `MapCache` keeps the computed transforms of the calibrations,
+  `PlateCalibration.state()`, in `.npz` files named by the hash of the
+  calibration, `PlateCalibration.key`. The homographies and the remap
+  tables of the reset view of a calibration are then read back instead of
+  computed, at start-up and on switching between calibrations. A file is
+  written when its calibration is replaced or closed, not while the view is
+  panned or zoomed. Every owner of calibrations, e.g. a camera pane, tells
+  the keys it keeps, its current and stored calibrations. A file written by
+  this process is removed when no owner keeps its key any more; the files
+  of the other processes sharing the directory, e.g. another OrthoView or a
+  `BatchRectify` run, are left to them.
+
+"""
+
+__author__ = "Konstantin Klementiev"
+__versioninfo__ = (1, 0, 0)
+__version__ = '.'.join(map(str, __versioninfo__))
+__license__ = "MIT license"
+
+import os
+import ast
+import time
+import threading
+import numpy as np
+
+try:
+    replaceFile = os.replace
+except AttributeError:  # Python 2
+    def replaceFile(src, dst):
+        if os.name == 'nt' and os.path.exists(dst):
+            os.remove(dst)
+        os.rename(src, dst)
+
+
+def literal(text):
+    """A config value as a Python literal, by `ast.literal_eval`; '[None]*4'
+    is the unset corners of the older configs."""
+    text = text.strip()
+    if text == '[None]*4':
+        return [None] * 4
+    return ast.literal_eval(text)
+
+
+class BackgroundWriter(object):
+    """Writes the submitted files in a worker thread, each one `delay`
+    seconds after its last submission. A failed job, whatever the error, is
+    dropped and its error is kept in `lastError`; the thread goes on."""
+
+    def __init__(self, delay=0.5):
+        self.delay = delay
+        self.pending = {}  # file name: (due time, data, done)
+        self.isWriting = False
+        self.isStopped = False
+        self.lastError = None
+        self.condition = threading.Condition()
+        self.thread = threading.Thread(target=self.run,
+                                       name='BackgroundWriter')
+        self.thread.daemon = True
+        self.thread.start()
+
+    def submit(self, fileName, data, delay=None, done=None):
+        """`data` is bytes, text or a function that writes into a binary
+        file object; `done()` is called in the worker thread after the file
+        is in place."""
+        if delay is None:
+            delay = self.delay
+        with self.condition:
+            self.pending[fileName] = time.time() + delay, data, done
+            self.condition.notify()
+
+    def flush(self, timeout=10):
+        """Writes all the pending files now and waits for them."""
+        t0 = time.time()
+        with self.condition:
+            for fileName, (due, data, done) in list(self.pending.items()):
+                self.pending[fileName] = 0, data, done
+            self.condition.notify()
+            while self.pending or self.isWriting:
+                left = timeout - (time.time() - t0)
+                if left <= 0 or not self.thread.is_alive():
+                    break
+                self.condition.wait(left)
+
+    def stop(self, timeout=10):
+        self.flush(timeout)
+        with self.condition:
+            self.isStopped = True
+            self.condition.notify()
+        self.thread.join(timeout)
+
+    def run(self):
+        while True:
+            with self.condition:
+                while True:
+                    if self.isStopped:
+                        return
+                    if self.pending:
+                        fileName = min(self.pending,
+                                       key=lambda f: self.pending[f][0])
+                        wait = self.pending[fileName][0] - time.time()
+                        if wait <= 0:
+                            job = (fileName,) + self.pending.pop(fileName)
+                            self.isWriting = True
+                            break
+                        self.condition.wait(wait)
+                    else:
+                        self.condition.wait()
+            self.write(job[0], *job[2:])
+            with self.condition:
+                self.isWriting = False
+                self.condition.notify_all()
+
+    def write(self, fileName, data, done=None):
+        tmpName = fileName + '.tmp'
+        try:
+            dirName = os.path.dirname(fileName)
+            if dirName and not os.path.isdir(dirName):
+                os.makedirs(dirName)
+            with open(tmpName, 'wb') as f:
+                if callable(data):
+                    data(f)
+                else:
+                    if not isinstance(data, bytes):
+                        data = data.encode('utf-8')
+                    f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            replaceFile(tmpName, fileName)
+            self.lastError = None
+            if done is not None:
+                done()
+        except Exception as e:
+            self.lastError = e
+            try:
+                if os.path.exists(tmpName):
+                    os.remove(tmpName)
+            except OSError:
+                pass
+
+
+class CalibrationStore(object):
+    """The named calibrations of the camera pane `pane` (None for the single
+    view) in the ConfigParser `config`. A calibration is a dict with the
+    keys corners, scalex, scaley, pos (the beam position) and version."""
+
+    def __init__(self, config, pane=None):
+        self.config = config
+        self.prefix = 'calibration{0} '.format(':' + pane if pane else '')
+
+    def section(self, name):
+        return self.prefix + name
+
+    def names(self):
+        n = len(self.prefix)
+        return sorted(s[n:] for s in self.config.sections()
+                      if s.startswith(self.prefix))
+
+    def load(self, name):
+        section = self.section(name)
+        if not self.config.has_section(section):
+            raise KeyError('no calibration {0}'.format(name))
+        get = self.config.get
+        return dict(corners=literal(get(section, 'corners')),
+                    scalex=float(get(section, 'scalex')),
+                    scaley=float(get(section, 'scaley')),
+                    pos=literal(get(section, 'pos')),
+                    version=int(get(section, 'version')))
+
+    def save(self, name, corners, scalex, scaley, pos):
+        """Stores the calibration as `name`, a new version if it differs
+        from the stored one; returns the version."""
+        name = name.strip()
+        if not name or any(c in name for c in '[]\n'):
+            raise ValueError('bad calibration name {0!r}'.format(name))
+        section = self.section(name)
+        values = dict(corners=str([tuple(c) for c in corners]),
+                      scalex=str(float(scalex)), scaley=str(float(scaley)),
+                      pos=str(list(pos)))
+        if self.config.has_section(section):
+            version = int(self.config.get(section, 'version'))
+            if all(self.config.get(section, option) == value
+                   for option, value in values.items()):
+                return version
+        else:
+            self.config.add_section(section)
+            version = 0
+        version += 1
+        values.update(version=str(version),
+                      saved=time.strftime('%Y-%m-%d %H:%M:%S'))
+        for option, value in values.items():
+            self.config.set(section, option, value)
+        return version
+
+    def remove(self, name):
+        self.config.remove_section(self.section(name))
+
+
+class MapCache(object):
+    """The `PlateCalibration.state()` of the calibrations as `.npz` files in
+    `directory`, written by the `BackgroundWriter` `writer`. After a save
+    the files saved here whose keys have been released by `setKeys()` are
+    removed."""
+
+    def __init__(self, directory, writer):
+        self.directory = directory
+        self.writer = writer
+        self.lock = threading.Lock()
+        self.keys = {}  # owner: the keys of its calibrations
+        self.saved = set()  # the keys saved here
+        self.released = set()  # the keys that an owner has given up
+
+    def fileName(self, key):
+        return os.path.join(self.directory, key + '.npz')
+
+    def load(self, key):
+        """The state of the calibration `key` or None if not cached."""
+        fileName = self.fileName(key)
+        if not os.path.exists(fileName):
+            return None
+        try:
+            with np.load(fileName) as data:
+                return dict((name, data[name]) for name in data.files)
+        except Exception:  # a broken cache is computed anew
+            return None
+
+    def setKeys(self, owner, keys):
+        """The calibrations of `owner` to keep cached."""
+        keys = frozenset(keys)
+        with self.lock:
+            self.released |= self.keys.get(owner, frozenset()) - keys
+            self.keys[owner] = keys
+
+    def save(self, key, state):
+        with self.lock:
+            self.saved.add(key)
+        self.writer.submit(self.fileName(key),
+                           lambda f: np.savez(f, **state), done=self.prune)
+
+    def prune(self):
+        """Removes the files saved here whose keys were released and are
+        now of no owner; runs in the writer thread."""
+        with self.lock:
+            keep = frozenset().union(*self.keys.values())
+            remove = (self.released & self.saved) - keep
+            self.released.clear()
+            self.saved -= remove
+        for key in remove:
+            try:
+                os.remove(self.fileName(key))
+            except OSError:
+                pass
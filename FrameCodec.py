@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""
+FrameCodec
+==========
+
+Transport format of colour frames between `USBCamera.py` and `OrthoView.py`.
+
+A frame of 8-bit colour channels is packed into a 2D array of 32-bit
+integers, one per pixel, with the value 0xFFBBGGRR. On a little-endian host
+these are the bytes R, G, B, 0xFF in memory, i.e. the packed array viewed as
+uint8 is an RGBA image. Both packing and unpacking go through this byte view
+in one OpenCV pass, without temporary arrays. The old clients that unpack
+the colours by shifts and masks of 0xff keep working:
+
+``
+    unpacked[:, :, 2] = (frame >> 16) & 0xff
+    unpacked[:, :, 1] = (frame >> 8) & 0xff
+    unpacked[:, :, 0] = frame & 0xff
+``
+
+For a smaller transport a frame can also be compressed into JPEG or lossless
+PNG by `encode()`; the result is the (format, data) pair of a Tango
+DevEncoded attribute and is decoded by `decode()`.
+
+"""
+
+__author__ = "Konstantin Klementiev"
+__versioninfo__ = (1, 0, 0)
+__version__ = '.'.join(map(str, __versioninfo__))
+__license__ = "MIT license"
+
+import sys
+import numpy as np
+import cv2
+
+isBigEndian = sys.byteorder == 'big'
+
+
+def rgbaView(packed):
+    """The (h, w, 4) uint8 view of a packed (h, w) uint32 frame."""
+    h, w = packed.shape
+    return packed.view(np.uint8).reshape(h, w, 4)
+
+
+def pack(frame, out=None, isBGR=True):
+    """Packs an (h, w, 3) uint8 frame into an (h, w) uint32 array. The frames
+    from cv2.VideoCapture are BGR, hence the default of `isBGR`. `out` is
+    reused if it has the right shape."""
+    h, w = frame.shape[:2]
+    if out is None or out.shape != (h, w) or out.dtype != np.uint32:
+        out = np.empty((h, w), dtype=np.uint32)
+    code = cv2.COLOR_BGR2RGBA if isBGR else cv2.COLOR_RGB2RGBA
+    cv2.cvtColor(frame, code, dst=rgbaView(out))
+    if isBigEndian:
+        out.byteswap(True)
+    return out
+
+
+def unpack(packed, out=None):
+    """Unpacks an (h, w) uint32 frame into a contiguous (h, w, 3) RGB uint8
+    array; `out` is reused if it has the right shape."""
+    packed = np.ascontiguousarray(packed, dtype=np.uint32)
+    if isBigEndian:
+        packed = packed.byteswap()
+    h, w = packed.shape
+    if out is None or out.shape != (h, w, 3):
+        out = np.empty((h, w, 3), dtype=np.uint8)
+    cv2.cvtColor(rgbaView(packed), cv2.COLOR_RGBA2RGB, dst=out)
+    return out
+
+
+encodings = {'JPEG_RGB': '.jpg', 'PNG': '.png'}
+
+
+def encode(frame, encoding='JPEG_RGB', quality=80, isBGR=True):
+    """Compresses an (h, w, 3) uint8 frame into the DevEncoded pair
+    (`encoding`, bytes). `encoding` is one of `encodings`; `quality` (0 to
+    100) is the JPEG quality, PNG is always lossless."""
+    try:
+        ext = encodings[encoding]
+    except KeyError:
+        raise ValueError('unknown encoding {0}'.format(encoding))
+    if not isBGR:  # cv2.imencode expects BGR
+        frame = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
+    if ext == '.jpg':
+        params = [cv2.IMWRITE_JPEG_QUALITY, int(quality)]
+    else:
+        params = [cv2.IMWRITE_PNG_COMPRESSION, 1]  # fast, still lossless
+    ok, data = cv2.imencode(ext, frame, params)
+    if not ok:
+        raise ValueError('cannot encode the frame as {0}'.format(encoding))
+    return encoding, data.tobytes()
+
+
+def decode(encoding, data):
+    """Decompresses a DevEncoded pair into an (h, w, 3) RGB uint8 frame."""
+    if encoding not in encodings:
+        raise ValueError('unknown encoding {0}'.format(encoding))
+    frame = cv2.imdecode(np.frombuffer(data, dtype=np.uint8),
+                         cv2.IMREAD_COLOR)
+    if frame is None:
+        raise ValueError('cannot decode the {0} frame'.format(encoding))
+    return cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
@@ -0,0 +1,322 @@
+# -*- coding: utf-8 -*-
+"""
+FrameSources
+============
+
+Sources of the RGB frames displayed by OrthoView. A source is read by
+`OrthoView.FrameGrabber` in its worker thread: `read()` returns a new
+(h, w, 3) uint8 RGB frame or None when there is nothing new, every `period`
+seconds. The sources are:
+
+- `ImageSource`: a still image file, decoded once;
+- `ReplaySource`: a `.npy` stack of frames, memory-mapped, or a video file,
+  replayed in a loop at a set rate;
+- `SyntheticPlateSource`: a rendered sample plate with wells that moves
+  along a repeatable path, for profiling and soak tests without a camera;
+- `TangoCameraSource`: the Tango camera device of `USBCamera.py`.
+
+"""
+
+__author__ = "Konstantin Klementiev"
+__versioninfo__ = (1, 0, 0)
+__version__ = '.'.join(map(str, __versioninfo__))
+__license__ = "MIT license"
+
+import time
+import threading
+import numpy as np
+import cv2
+
+import FrameCodec
+
+
+def toRGB(frame, isBGR=False):
+    """Converts a gray, packed (uint32) or colour frame to contiguous RGB."""
+    if frame.dtype == np.uint32:
+        return FrameCodec.unpack(frame)
+    if frame.ndim == 2:
+        return cv2.cvtColor(frame, cv2.COLOR_GRAY2RGB)
+    if isBGR:
+        return cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    return np.ascontiguousarray(frame)
+
+
+class FrameSource(object):
+    """The interface of the frame sources. Event driven sources call the
+    callback of `subscribe()` on every new frame and return True there, the
+    polling `period` then only backs up missed events."""
+
+    period = 0.5  # s
+    lastError = None  # of the last failed setting, shown by OrthoView
+    # the time of the frame last read on this host's clock, if known:
+    frameTime = None
+
+    def read(self):
+        raise NotImplementedError
+
+    def subscribe(self, callback):
+        return False
+
+    def setRoi(self, roi):
+        """Asks for the full resolution region `roi` (x, y, width, height);
+        returns True if the source can deliver it. It is called from the GUI
+        thread and must not wait for the camera."""
+        return False
+
+    def close(self):
+        pass
+
+
+class ImageSource(FrameSource):
+    """A still image; it is delivered once, as there is nothing new later."""
+
+    def __init__(self, fileName):
+        frame = cv2.imread(fileName)
+        if frame is None:
+            raise IOError('cannot read the image {0}'.format(fileName))
+        # OpenCV uses BGR as its default colour order for images
+        self.frame = toRGB(frame, isBGR=True)
+        self.isRead = False
+
+    def read(self):
+        if self.isRead:
+            return None
+        self.isRead = True
+        return self.frame
+
+
+class ReplaySource(FrameSource):
+    """Replays the frames of a `.npy` file, a stack of (n, h, w, 3) RGB,
+    (n, h, w) gray or packed frames, or of a video file at `rate` frames per
+    second (0: as fast as they are taken) in a loop. The `.npy` stack is
+    memory-mapped, only the replayed frames are read from the disk."""
+
+    def __init__(self, fileName, rate=10.):
+        self.period = 1. / rate if rate > 0 else 0.
+        self.iframe = 0
+        if fileName.lower().endswith('.npy'):
+            self.stack = np.load(fileName, mmap_mode='r')
+            if self.stack.ndim not in (3, 4) or len(self.stack) == 0:
+                raise ValueError('{0} is not a stack of frames'.format(
+                    fileName))
+            self.video = None
+        else:
+            self.stack = None
+            self.video = cv2.VideoCapture(fileName)
+            if not self.video.isOpened():
+                raise IOError('cannot open the video {0}'.format(fileName))
+
+    def read(self):
+        if self.stack is not None:
+            frame = self.stack[self.iframe % len(self.stack)]
+            self.iframe += 1
+            return toRGB(np.array(frame))
+        ret, frame = self.video.read()
+        if not ret:  # the end, start again
+            self.video.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ret, frame = self.video.read()
+            if not ret:
+                return None
+        self.iframe += 1
+        return toRGB(frame, isBGR=True)
+
+    def close(self):
+        if self.video is not None:
+            self.video.release()
+
+
+class SyntheticPlateSource(FrameSource):
+    """A sample plate of `rows` x `columns` wells at `pitch` mm, seen in
+    perspective by a (`width`, `height`) camera. The plate moves in its
+    plane by up to `amplitude` mm along a Lissajous path; the frame n is
+    always the same, which makes the feed repeatable."""
+
+    pxPerMm = 5  # of the plate texture
+
+    def __init__(self, width=640, height=480, rate=10., rows=8, columns=12,
+                 pitch=9., amplitude=10.):
+        self.period = 1. / rate if rate > 0 else 0.
+        self.size = width, height
+        self.amplitude = amplitude
+        self.iframe = 0
+
+        s = self.pxPerMm
+        plateW, plateH = (columns + 1) * pitch, (rows + 1) * pitch
+        self.texture = np.full((int(plateH*s), int(plateW*s), 3), 200,
+                               dtype=np.uint8)
+        for row in range(rows):
+            for col in range(columns):
+                center = (int((col+1)*pitch*s), int((row+1)*pitch*s))
+                cv2.circle(self.texture, center, int(pitch*0.35*s),
+                           (60, 60, 70), -1, cv2.LINE_AA)
+        cv2.rectangle(self.texture, (0, 0), (self.texture.shape[1]-1,
+                      self.texture.shape[0]-1), (40, 40, 40), 2*s)
+
+        # the plate rectangle (mm) -> a trapezoid in the image:
+        pIn = np.float32([(0, 0), (plateW, 0), (plateW, plateH),
+                          (0, plateH)])
+        pOut = np.float32([(0.2*width, 0.25*height), (0.85*width, 0.2*height),
+                           (0.9*width, 0.85*height), (0.1*width, 0.8*height)])
+        self.view = cv2.getPerspectiveTransform(pIn, pOut)
+        yy, xx = np.mgrid[0:height, 0:width]
+        self.background = np.dstack(
+            (xx * 80 // width + 60, yy * 80 // height + 60,
+             np.full_like(xx, 90))).astype(np.uint8)
+
+    def plateShift(self, n):
+        """The plate shift (mm) at the frame n."""
+        a = self.amplitude
+        return a*np.sin(2*np.pi*n/200.), 0.5*a*np.sin(2*np.pi*n/130.)
+
+    def read(self):
+        dx, dy = self.plateShift(self.iframe)
+        self.iframe += 1
+        s = 1. / self.pxPerMm
+        textureToPlate = np.array([[s, 0, dx], [0, s, dy], [0, 0, 1]])
+        return cv2.warpPerspective(
+            self.texture, self.view.dot(textureToPlate), self.size,
+            dst=self.background.copy(), borderMode=cv2.BORDER_TRANSPARENT)
+
+
+class TangoCameraSource(FrameSource):
+    """The frames of the Tango camera `deviceName` (see `USBCamera.py`).
+    `transport` is 'raw' (the packed Image), 'encoded' (the compressed
+    encoded_image) or 'auto' (encoded if the device has it). With
+    `binning` > 1 the camera sends a coarse image, which is scaled back to
+    the full resolution here, and the region set by `setRoi()` at the full
+    resolution, which is pasted into it. The region is written to the
+    camera by the next `read()`, in the grabber thread. `frameTime` is the
+    receipt time of the data ready event of the frame, None when polled; the
+    camera's own frame_timestamp, read if the device has it, is only kept in
+    `cameraTime`, as it is of the camera host's clock."""
+
+    def __init__(self, deviceName, transport='auto', binning=1):
+        from taurus import Device as DeviceProxy
+        try:
+            self.camera = DeviceProxy(deviceName)
+        except Exception as e:
+            raise Exception("Something is wrong with the tango device {0}".
+                            format(e))
+        try:
+            self.attributes = [
+                a.lower() for a in self.camera.get_attribute_list()]
+        except Exception:
+            self.attributes = []
+        self.encoded = self.hasEncodedImage(transport)
+        self.hasTimestamp = 'frame_timestamp' in self.attributes
+        self.setupBinning(binning)
+        self.roi = None
+        self.pendingRoi = None
+        self.roiLock = threading.Lock()
+        self.eventId = None
+        self.eventTime = None
+        self.frameTime = None
+        self.cameraTime = None
+
+    def hasEncodedImage(self, transport):
+        if transport == 'raw':
+            return False
+        if transport == 'encoded':
+            return True
+        return 'encoded_image' in self.attributes
+
+    def setupBinning(self, binning):
+        self.binning = binning
+        if binning == 1:
+            return
+        try:
+            self.camera.write_attribute('binning', binning)
+        except Exception as e:
+            self.lastError = e
+            self.binning = 1
+
+    def setRoi(self, roi):
+        """Only a binned image needs the region, the full one has it. The
+        region is queued for `applyRoi()`; a newer one replaces it."""
+        if self.binning == 1:
+            return False
+        with self.roiLock:
+            self.pendingRoi = tuple(roi)
+        return True
+
+    def applyRoi(self):
+        """Writes the queued region to the camera, runs in `read()`."""
+        with self.roiLock:
+            roi, self.pendingRoi = self.pendingRoi, None
+        if roi is None:
+            return
+        try:
+            self.camera.write_attribute('roi', list(roi))
+            self.roi = roi
+            self.lastError = None
+        except Exception as e:
+            self.lastError = e
+            self.roi = None
+
+    def subscribe(self, callback):
+        """Reads the camera on its data ready events."""
+        from PyTango import EventType
+
+        def onEvent(event):
+            self.eventTime = time.time()
+            callback(event)
+
+        try:
+            self.eventId = self.camera.subscribe_event(
+                'Image', EventType.DATA_READY_EVENT, onEvent)
+        except Exception:  # no events from this device, keep polling it
+            return False
+        return True
+
+    def close(self):
+        if self.eventId is not None:
+            try:
+                self.camera.unsubscribe_event(self.eventId)
+            except Exception:
+                pass
+            self.eventId = None
+
+    def read(self):
+        self.applyRoi()
+        self.frameTime, self.eventTime = self.eventTime, None
+        imageName = 'encoded_image' if self.encoded else 'Image'
+        names = [imageName]
+        if self.binning > 1:
+            names += ['resolution']
+            if self.roi is not None:
+                names += ['roi_image', 'effective_roi']
+        if self.hasTimestamp:
+            names += ['frame_timestamp']
+        # in one request, so that all of them are of the same frame:
+        values = [a.value for a in self.camera.read_attributes(names)]
+        frame = self.decodeImage(values[0])
+        if self.hasTimestamp:
+            self.cameraTime = values[-1]
+        if self.binning == 1:
+            return frame
+
+        width, height = values[1]
+        if frame.shape[:2] != (height, width):  # binned
+            frame = cv2.resize(frame, (width, height),
+                               interpolation=cv2.INTER_LINEAR)
+        if self.roi is not None:
+            # the region as the camera has clamped it to the frame:
+            x, y, w, h = values[3]
+            if w > 0 and h > 0:
+                roi = FrameCodec.unpack(values[2])
+                h, w = frame[y:y+h, x:x+w].shape[:2]
+                frame[y:y+h, x:x+w] = roi[:h, :w]
+        return frame
+
+    def decodeImage(self, value):
+        if self.encoded:
+            return FrameCodec.decode(*value)
+
+        # for monochrome frames:
+#        img = cv2.normalize(
+#            src=value, dst=None, alpha=0, beta=255,
+#            norm_type=cv2.NORM_MINMAX, dtype=cv2.CV_8UC1)
+#        return cv2.cvtColor(img, cv2.COLOR_GRAY2BGR)
+
+        # for color frames:
+        return FrameCodec.unpack(value)
@@ -0,0 +1,281 @@
+# -*- coding: utf-8 -*-
+"""
+MotionExecutor
+==============
+
+Moves the sample stage of OrthoView in a worker thread, so that the GUI is
+never blocked by the motors.
+
+The executor takes jobs one by one: a relative move (`moveBy()`) or a tour
+(`startTour()`) over the queued absolute stage positions, each followed by
+a dwell time. After every write the executor waits until the motors are on
+target, i.e. not moving and within `tolerance` of the target, or gives up
+after `timeout`. `cancel()` drops the waiting jobs, stops the motors and
+ends the running job. Every job carries the cancel event of the time it was
+queued; a cancel sets this event and makes a new one for the later jobs, so
+it is never lost between queuing a job and starting it. The caller learns
+about the progress by the `onChange()` callback, called in the worker
+thread, and reads `state`, `position`, `current` (the tour target being
+visited) and `lastError`. The visited targets leave the queue, a cancelled
+tour continues from the first unvisited one. `addRelativeTarget()` queues a
+target relative to the stage position at the time of the call; the motors
+are read for it by a helper thread, as the worker may be busy with a tour.
+
+The motors are Tango (taurus) devices with the attribute `position`, or
+`SimulatedMotor` for the test mode. A move is on target only when the
+`State` attribute of no motor is MOVING; a failed read of it is an error of
+the job, like a failed read of the position.
+
+"""
+
+__author__ = "Konstantin Klementiev"
+__versioninfo__ = (1, 0, 0)
+__version__ = '.'.join(map(str, __versioninfo__))
+__license__ = "MIT license"
+
+import time
+import threading
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+
+
+class MotionError(Exception):
+    pass
+
+
+def errorText(e):
+    """The readable part of a Tango error: the text after 'desc ='."""
+    for line in reversed(str(e).splitlines()):
+        if 'desc =' in line:
+            return line.strip()[7:]
+    return str(e)
+
+
+class SimulatedMotor(object):
+    """A motor that moves at `speed` (mm/s), with the interface of a
+    taurus device used here."""
+
+    class Value(object):
+        def __init__(self, value):
+            self.value = value
+
+    def __init__(self, position=0., speed=2.):
+        self.speed = speed
+        self.start, self.target = position, position
+        self.startTime = time.time()
+        self.lock = threading.Lock()
+
+    def current(self):
+        with self.lock:
+            dt = time.time() - self.startTime
+            distance = self.target - self.start
+            if abs(distance) <= self.speed*dt:
+                return self.target, False
+            step = self.speed*dt if distance > 0 else -self.speed*dt
+            return self.start + step, True
+
+    def read_attribute(self, name):
+        if name == 'State':
+            return self.Value('MOVING' if self.current()[1] else 'ON')
+        return self.Value(self.current()[0])
+
+    def write_attribute(self, name, value):
+        position = self.current()[0]
+        with self.lock:
+            self.start, self.target = position, float(value)
+            self.startTime = time.time()
+
+    def command_inout(self, name):
+        if name == 'Stop':
+            self.write_attribute('position', self.current()[0])
+
+
+class MotionExecutor(object):
+    """Runs the moves of `motors` (x, y; either can be None) in a worker
+    thread. The positions are in the motor units (mm)."""
+
+    pollPeriod = 0.05  # s
+
+    def __init__(self, motors, tolerance=0.005, timeout=60., dwell=1.,
+                 onChange=None):
+        self.motors = tuple(motors)
+        self.tolerance = tolerance
+        self.timeout = timeout  # s, per move
+        self.dwell = dwell  # s, the default of the tour points
+        self.onChange = onChange
+        self.jobs = queue.Queue()
+        self.cancelled = threading.Event()  # of the jobs queued now
+        self.jobCancelled = self.cancelled  # of the running job
+        self.lock = threading.Lock()
+        self.position = (None,) * len(self.motors)
+        self.state = 'idle'  # or 'moving', 'dwelling'
+        self.targets = []  # the queued tour: (x, y, dwell or None)
+        self.current = None  # the tour target being visited
+        self.lastError = None
+        self.thread = threading.Thread(target=self.run, name='MotionExecutor')
+        self.thread.daemon = True
+        self.thread.start()
+        self.submit('read')
+
+    def stop(self, timeout=2):
+        self.cancel()
+        self.jobs.put(None)
+        self.thread.join(timeout)
+
+    # the GUI side:
+    def submit(self, name, *args):
+        with self.lock:
+            self.jobs.put((name, args, self.cancelled))
+
+    def moveBy(self, *offsets):
+        self.submit('moveBy', *offsets)
+
+    def addTarget(self, target, dwell=None):
+        with self.lock:
+            self.targets.append(tuple(target) + (dwell,))
+        self.changed()
+
+    def addRelativeTarget(self, offsets, dwell=None):
+        thread = threading.Thread(
+            target=self.readRelativeTarget, args=(offsets, dwell),
+            name='MotionExecutor.addRelativeTarget')
+        thread.daemon = True
+        thread.start()
+
+    def clearTargets(self):
+        with self.lock:
+            self.targets = []
+        self.changed()
+
+    def startTour(self):
+        with self.lock:
+            targets = list(self.targets)
+        if targets:
+            self.submit('tour', targets)
+
+    def cancel(self):
+        with self.lock:
+            self.cancelled.set()
+            self.cancelled = threading.Event()
+        while True:
+            try:
+                self.jobs.get_nowait()
+            except queue.Empty:
+                break
+
+    def isBusy(self):
+        return self.state != 'idle' or not self.jobs.empty()
+
+    # the worker side:
+    def changed(self):
+        if self.onChange is not None:
+            self.onChange()
+
+    def setState(self, state):
+        self.state = state
+        self.changed()
+
+    def run(self):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                break
+            name, args, self.jobCancelled = job
+            if self.jobCancelled.is_set():
+                continue
+            try:
+                self.lastError = None
+                getattr(self, 'do' + name[0].upper() + name[1:])(*args)
+                self.readPosition()
+            except Exception as e:
+                self.lastError = e
+                self.stopMotors()
+            self.current = None
+            self.setState('idle')
+
+    def readMotors(self):
+        return tuple(
+            None if motor is None else
+            motor.read_attribute('position').value for motor in self.motors)
+
+    def readPosition(self):
+        self.position = self.readMotors()
+        return self.position
+
+    def readRelativeTarget(self, offsets, dwell):
+        """Runs in the helper thread of `addRelativeTarget()`; leaves
+        `position` to the worker."""
+        try:
+            position = self.readMotors()
+        except Exception as e:
+            self.lastError = e
+            self.changed()
+            return
+        self.addTarget([None if p is None else p + d
+                        for p, d in zip(position, offsets)], dwell)
+
+    def isMoving(self):
+        for motor in self.motors:
+            if motor is None:
+                continue
+            # the attribute, as `state` of a taurus device is a property:
+            state = motor.read_attribute('State').value
+            if state is not None and str(state) == 'MOVING':
+                return True
+        return False
+
+    def stopMotors(self):
+        for motor in self.motors:
+            if motor is not None:
+                try:
+                    motor.command_inout('Stop')
+                except Exception:
+                    pass
+
+    def moveTo(self, target):
+        """Writes `target` and waits until on target; returns False if
+        cancelled."""
+        if self.jobCancelled.is_set():
+            return False
+        self.setState('moving')
+        for motor, value in zip(self.motors, target):
+            if motor is not None and value is not None:
+                motor.write_attribute('position', value)
+        t0 = time.time()
+        while not self.jobCancelled.is_set():
+            position = self.readPosition()
+            self.changed()
+            if not self.isMoving() and all(
+                    value is None or p is None or
+                    abs(p - value) <= self.tolerance
+                    for p, value in zip(position, target)):
+                return True
+            if time.time() - t0 > self.timeout:
+                raise MotionError('the motors are not on target after '
+                                  '{0:g} s'.format(self.timeout))
+            self.jobCancelled.wait(self.pollPeriod)
+        self.stopMotors()
+        return False
+
+    def doRead(self):
+        self.readPosition()
+
+    def doMoveBy(self, *offsets):
+        position = self.readPosition()
+        self.moveTo([None if p is None else p + d
+                     for p, d in zip(position, offsets)])
+
+    def doTour(self, targets):
+        for target in targets:
+            self.current = target
+            if not self.moveTo(target[:-1]):
+                return
+            self.setState('dwelling')
+            dwell = self.dwell if target[-1] is None else target[-1]
+            if self.jobCancelled.wait(dwell):
+                return
+            with self.lock:
+                if target in self.targets:
+                    self.targets.remove(target)
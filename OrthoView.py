@@ -26,10 +26,66 @@ dot on the button shows the currently expected corner to define. Set X and Y
 dimensions with the next two buttons. Define the local origin (beam position)
 by the right mouse click. Check the resulting image orthogonality in the
 expected plane by the last button. Also observe the mouse coordinates in the
-target plane, as displayed above the image.
-
-To use the motion functionality, set `isTest = False`, define your motions in
-the top part of the module and use them in the method `moveToBeam()`.
+target plane, as displayed above the image. A crosshair at the cursor shows
+the plate coordinates and the motion that would bring this point to the beam.
+
+The image is displayed by matplotlib. A lighter display that paints the
+frames directly as Qt images is selected by `python OrthoView.py --canvas
+qimage` or by `canvas = qimage` in the [view] section of OrthoView.ini; there
+the mouse wheel zooms and the middle button pans the image.
+The context menu item 'show performance' (or `stats = on` in the [view]
+section) shows a status line with the displayed frame rate, the frame age
+(from the data ready event of the frame or from its arrival, both on the
+clock of this computer) and the latencies of the refresh stages; its tooltip
+shows their histograms.
+The context menu item 'track the plate' (or `tracking = on` in the
+[rectangle] section) follows the four reference corners in every new frame,
+see `PlateTracker.py`, so that the calibration stays valid when the plate or
+the stage moves; the corners turn orange while the tracker has lost them. The
+tracked corners are saved when the tracking is switched off.
+Only the visible part of the view is computed, at the screen resolution and
+with at most `maxpixels` pixels (the [view] section), so that a steep
+perspective or zooming costs neither time nor memory. An overview is taken
+from a downscaled copy of the frame and a zoomed region from the full
+resolution frame.
+The context menu 'wells' loads a plate layout (a standard SBS plate, a grid
+of `rows` x `columns` wells at `pitch` mm or a CSV file of lines `[name, ]x,
+y` with the well centres in mm from the first reference corner, see
+`WellMap.py` and the [wells] section). The wells in the view are drawn over
+the image, and the cursor readout, 'move this point to beam' and the tour
+snap to the nearest well.
+The context menu 'calibrations' stores the calibration under a name, e.g. of
+a plate type, and switches between the stored ones; saving a changed
+calibration under its name makes a new version. OrthoView.ini is written in
+the background, a short while after the last change. The transforms and the
+remap tables of the reset view of every calibration are cached in
+`OrthoView.cache/`, named by a hash of the calibration, so that a start or a
+switch to a known calibration computes nothing, see `CalibrationStore.py`.
+
+The frames come from the Tango camera `device` of the [camera] section of
+OrthoView.ini or, for testing and profiling without a camera, from a still
+image, a replayed `.npy` stack of frames or video, or a synthetic moving
+sample plate, see `FrameSources.py`. The source is selected by `source =
+tango|image|replay|synthetic` in the same section or by `python OrthoView.py
+--source replay --file frames.npy --rate 25`.
+
+Several cameras, e.g. the top and side views of an end station, are shown as
+panes of one window by `cameras = top, side` in the [view] section or by
+`python OrthoView.py --cameras top side`. Every pane has its own sections
+[camera:top], [rectangle:top] and [beam:top]. One scheduler reads and renders
+all panes: the focused pane takes new frames at up to `maxfps` (0: as they
+come) and the others at `idlefps` of their camera sections; `priority` orders
+the panes that wait for a render.
+
+To use the motion functionality, set `isTest = False` and define your motions
+in the top part of the module; in the test mode the motions are simulated. The
+motors are driven in a worker thread, see `MotionExecutor.py`, so the view
+stays live while the stage moves; the context menu item 'cancel the motion'
+stops it. The submenu 'tour' queues stage positions, clicked on the image or
+imported from a CSV file of lines `x, y[, dwell]` (mm, s), and visits them in
+turn: every move waits until the motors are within `tolerance` (mm) of the
+target, at most `timeout` seconds, and stays there for `dwell` seconds (the
+[motion] section). The queued positions are marked on the image.
 
 """
 
@@ -41,9 +97,23 @@ __license__ = "MIT license"
 
 import os
 import sys
+import time
+import atexit
+import threading
+import collections
+from functools import partial
 import numpy as np
 import cv2
 from matplotlib.figure import Figure
+from matplotlib.transforms import offset_copy
+
+import FrameSources
+from PlateCalibration import PlateCalibration, calibrationKey
+from CalibrationStore import (BackgroundWriter, CalibrationStore, MapCache,
+                              literal)
+from PlateTracker import CornerTracker
+from MotionExecutor import MotionExecutor, SimulatedMotor, errorText
+from WellMap import WellMap, standardPlates
 
 # =============================================================================
 # select a qt source: from Taurus or Pyqt4 or PyQt5:
@@ -78,6 +148,10 @@ try:
     from ConfigParser import ConfigParser
 except ImportError:
     from configparser import ConfigParser
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
 
 isTest = True
 
@@ -87,9 +161,9 @@ if not isTest:
     motorX = None  # DeviceProxy('mp_x')
     motorY = DeviceProxy('mp_y')
     from taurus.qt.qtgui.display import TaurusLed
-    taurusLedModel = "b308a-eh/rpi/cam-01/status"
 else:
     TaurusLed = None
+    motorX, motorY = SimulatedMotor(), SimulatedMotor()
 
 selfDir = os.path.dirname(__file__)
 iniApp = (os.path.join(selfDir, 'OrthoView.ini'))
@@ -98,61 +172,183 @@ config = ConfigParser(
 config.add_section('rectangle')
 config.add_section('beam')
 config.add_section('colors')
+config.add_section('view')
+config.add_section('camera')
+config.add_section('motion')
+config.add_section('wells')
 config.read(iniApp)
 
+# the defaults of the options beyond the corners, the sizes and the beam
+# position, per section; a pane section [kind:name] has those of [kind]:
+optionDefaults = dict(
+    rectangle=dict(tracking='off', calibration=''),
+    view=dict(interpolation='linear', canvas='mpl', stats='off',
+              maxpixels='4000000', cameras=''),
+    camera=dict(source='auto', device='b308a-eh/rpi/cam-01', file='',
+                rate='10', transport='auto', binning='1', roi='off',
+                maxfps='0', idlefps='2', priority='0'),
+    motion=dict(dwell='1', tolerance='0.005', timeout='60'),
+    wells=dict(layout='off', rows='0', columns='0', pitch='0', origin='',
+               diameter='0', snap='on'))
+
+# the config and the cached transforms are written in the background:
+fileWriter = BackgroundWriter()
+atexit.register(fileWriter.flush)
+mapCache = MapCache(os.path.join(selfDir, 'OrthoView.cache'), fileWriter)
+
+
+try:
+    CV_AA = cv2.CV_AA
+except AttributeError:
+    CV_AA = cv2.LINE_AA
+
 
 def write_config():
-    with open(iniApp, 'w+') as cf:
-        config.write(cf)
+    """Saves the config: debounced, atomic and off the GUI thread, see
+    `CalibrationStore.BackgroundWriter`."""
+    text = StringIO()
+    config.write(text)
+    fileWriter.submit(iniApp, text.getvalue())
+
+
+def getOption(section, option):
+    """The `option` of `section` of the config or its default from
+    `optionDefaults`, which are not written into OrthoView.ini."""
+    if config.has_option(section, option):
+        return config.get(section, option)
+    return optionDefaults[section.split(':')[0]][option]
+
+
+def paneSection(kind, name=None):
+    """The config section `kind` ('rectangle', 'beam' or 'camera') of the
+    camera pane `name`, e.g. [rectangle:side]; the pane without a name uses
+    the plain sections. The section is added if missing, its options then
+    come from the defaults."""
+    section = '{0}:{1}'.format(kind, name) if name else kind
+    if not config.has_section(section):
+        config.add_section(section)
+    return section
+
+
+def displayFrameInterval():
+    """The refresh period of the primary screen, ms."""
+    try:
+        rate = qt.QApplication.primaryScreen().refreshRate()
+    except AttributeError:  # Qt4
+        rate = 60
+    return max(int(1000. / rate), 1) if rate > 0 else 16
+
+
+def makeFrameSource(kind=None, fileName=None, rate=None, section='camera'):
+    """Creates the frame source of the [camera] (or another camera
+    `section`) of OrthoView.ini: `kind` is 'tango', 'image', 'replay',
+    'synthetic' or 'auto' (the Tango camera or, in the test mode, the test
+    image); `fileName` and `rate` are used by the image and replay sources.
+    The arguments override the config."""
+    if kind is None:
+        kind = getOption(section, 'source')
+    if kind == 'auto':
+        kind = 'image' if isTest else 'tango'
+    if fileName is None:
+        fileName = getOption(section, 'file')
+    if rate is None:
+        rate = float(getOption(section, 'rate'))
+
+    if kind == 'tango':
+        return FrameSources.TangoCameraSource(
+            getOption(section, 'device'), getOption(section, 'transport'),
+            int(getOption(section, 'binning')))
+    if kind == 'image':
+        return FrameSources.ImageSource(
+            fileName or os.path.join(selfDir, '_images',
+                                     'sample-holder-test.png'))
+    if kind == 'replay':
+        return FrameSources.ReplaySource(fileName, rate)
+    if kind == 'synthetic':
+        return FrameSources.SyntheticPlateSource(rate=rate)
+    raise ValueError('unknown frame source {0}'.format(kind))
+
+
+def makeWellMap(section='wells', layout=None):
+    """Creates the well map of the [wells] (or another `section`) of
+    OrthoView.ini or None: `layout` is 'off', a standard plate of
+    `WellMap.standardPlates`, 'grid' of `rows` x `columns` wells at `pitch`
+    mm or a CSV file of the well centres. `origin` is the centre of the
+    well A1 in mm from the first reference corner, the standard plates
+    assume the reference rectangle at the plate outline if it is not set.
+    `diameter` is the well size of a grid or a CSV map. The argument
+    overrides the config. The names other than a file name are case
+    insensitive."""
+    if layout is None:
+        layout = getOption(section, 'layout')
+    name = layout.strip().lower()
+    if name in ('', 'off'):
+        return None
+    origin = getOption(section, 'origin')
+    origin = literal(origin) if origin else None
+    diameter = float(getOption(section, 'diameter'))
+    if name in standardPlates:
+        return WellMap.standard(name, origin)
+    if name == 'grid':
+        return WellMap.grid(
+            int(getOption(section, 'rows')),
+            int(getOption(section, 'columns')),
+            float(getOption(section, 'pitch')), origin or (0, 0), diameter)
+    return WellMap.fromCSV(layout, diameter)
 
 
 class MyToolBar(mpl_qt.NavigationToolbar2QT):
     def set_message(self, s):
-        try:
-            parent = self.parent()
-        except TypeError:  # self.parent is not callable
-            parent = self.parent
+        # over the image the readout comes from the cursor layer of the
+        # canvas, matplotlib messages are shown elsewhere
+        if self.canvas.cursorPoint is not None:
+            s = self.canvas.cursorMessage
+        if self.coordinates:
+            self.locLabel.setText(s)
 
-        try:
-            sstr = s.split()
-#            print(sstr, len(sstr))
-            while len(sstr) > 5:  # when 'zoom rect' is present
-                del sstr[0]
-#            print(sstr)
-            x, y = float(sstr[0][2:]), float(sstr[1][2:])
-            if parent.canTransform():
-                xC, yC = parent.beamPosRectified
-                if not parent.buttonStraightRect.isChecked():
-                    xP, yP = parent.transformPoint((x, y))
-                    x0, y0 = (xP-xC)/parent.zoom, (yP-yC)/parent.zoom
-                    s = u'image: x={0:.1f} px, y={1:.1f} px\nplate: '\
-                        'x={2:.2f} mm, y={3:.2f} mm'.format(x, y, x0, y0)
-                else:
-                    x0, y0 = (x-xC)/parent.zoom, (y-yC)/parent.zoom
-                    s = 'plate: x={0:.2f} mm, y={1:.2f} mm'.format(x0, y0)
-            else:
-                s = u'image: x={0:.1f}, y={1:.1f}'.format(x, y)
-        except Exception as e:
-            pass
-#            print(e)
 
+class MyImageToolBar(qt.QWidget):
+    """A minimal toolbar for `MyImageCanvas`: a button that resets the view
+    and the coordinate readout, as in the matplotlib toolbar."""
+
+    def __init__(self, canvas, parent=None):
+        super(MyImageToolBar, self).__init__(parent)
+        self.canvas = canvas
+        canvas.toolbar = self
+        self.coordinates = True
+
+        layout = qt.QHBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        self.buttonHome = qt.QPushButton('Home')
+        self.buttonHome.setToolTip('Reset original view (wheel: zoom, '
+                                   'middle button: pan)')
+        self.buttonHome.clicked.connect(canvas.resetView)
+        layout.addWidget(self.buttonHome)
+        self.locLabel = qt.QLabel('')
+        self.locLabel.setSizePolicy(
+            qt.QSizePolicy.Expanding, qt.QSizePolicy.Preferred)
+        layout.addWidget(self.locLabel)
+
+    def set_message(self, s):
         if self.coordinates:
             self.locLabel.setText(s)
 
 
-class MyMplCanvas(mpl_qt.FigureCanvasQTAgg):
-    def __init__(self, parent=None):
-        self.fig = Figure()
-        self.fig.patch.set_facecolor('white')
-        super(MyMplCanvas, self).__init__(self.fig)
-        self.setParent(parent)
-        self.updateGeometry()
-        self.setupPlot()
-        self.mpl_connect('button_press_event', self.onPress)
-        self.img = None
+class CanvasActions(object):
+    """The context menu and mouse actions shared by the display canvases.
+    The canvas calls `setupActions()` in its constructor, `pressed()` on
+    mouse clicks and `cursorMoved()` on mouse moves in image coordinates.
+
+    The cursor layer (a crosshair with the plate coordinates and the motion
+    that would bring the point to the beam) is updated at most once per
+    screen refresh by the canvas method `drawCursor(label)`, which draws it
+    over the already rendered image."""
+
+    def setupActions(self):
         self.setContextMenuPolicy(qt.Qt.CustomContextMenu)
         self.mouseClickPos = None
-        self.beamPos = eval(config.get('beam', 'pos'))
+        self.beamPos = list(literal(
+            config.get(self.parent().section('beam'), 'pos')))
 
         self.customContextMenuRequested.connect(self.viewMenu)
         self.menu = qt.QMenu()
@@ -160,9 +356,44 @@ class MyMplCanvas(mpl_qt.FigureCanvasQTAgg):
         self.actionMove = self.menu.addAction(
             'move this point to beam', self.moveToBeam)
 
+        tourMenu = self.menu.addMenu('tour')
+        self.actionAddToTour = tourMenu.addAction(
+            'add this point to the tour', self.addToTour)
+        self.actionImportTour = tourMenu.addAction(
+            'import the tour...', self.importTour)
+        self.actionStartTour = tourMenu.addAction(
+            'start the tour', self.startTour)
+        self.actionClearTour = tourMenu.addAction(
+            'clear the tour', self.clearTour)
+        self.actionCancelMotion = self.menu.addAction(
+            'cancel the motion', self.cancelMotion)
+
+        wellMenu = self.menu.addMenu('wells')
+        for plate in sorted(standardPlates, key=lambda p: int(p[3:])):
+            wellMenu.addAction('SBS {0}-well plate'.format(plate[3:]),
+                               partial(self.parent().setWellMap, plate))
+        wellMenu.addAction('load the well map...', self.importWellMap)
+        wellMenu.addAction('no well map',
+                           partial(self.parent().setWellMap, 'off'))
+        wellMenu.addSeparator()
+        self.actionShowWells = wellMenu.addAction(
+            'show the wells', self.showWells)
+        self.actionShowWells.setCheckable(True)
+        self.isWellsVisible = True
+        self.actionShowWells.setChecked(self.isWellsVisible)
+        self.actionSnapToWells = wellMenu.addAction(
+            'snap to the wells', self.snapToWells)
+        self.actionSnapToWells.setCheckable(True)
+        self.isSnappedToWells = getOption(
+            self.parent().section('wells'), 'snap').lower() == 'on'
+        self.actionSnapToWells.setChecked(self.isSnappedToWells)
+
         self.actionDefineBeam = self.menu.addAction(
             'define beam position here', self.setBeamPosition)
 
+        self.calibrationMenu = self.menu.addMenu('calibrations')
+        self.calibrationMenu.aboutToShow.connect(self.updateCalibrationMenu)
+
         self.actionShowBeam = self.menu.addAction(
             'show beam position', self.showBeam)
         self.actionShowBeam.setCheckable(True)
@@ -175,34 +406,65 @@ class MyMplCanvas(mpl_qt.FigureCanvasQTAgg):
         self.isRectVisible = True
         self.actionShowRect.setChecked(self.isRectVisible)
 
-    def setupPlot(self):
-        rect = [0., 0., 1., 1.]
-        self.axes = self.fig.add_axes(rect)
-        self.axes.xaxis.set_visible(False)
-        self.axes.yaxis.set_visible(False)
-        for spine in ['left', 'right', 'bottom', 'top']:
-            self.axes.spines[spine].set_visible(False)
-        self.axes.set_zorder(20)
-
-    def imshow(self, img):
-        if self.img is None:
-            self.img = self.axes.imshow(img)
+        self.actionTrack = self.menu.addAction(
+            'track the plate', self.trackPlate)
+        self.actionTrack.setCheckable(True)
+
+        self.actionSmooth = self.menu.addAction(
+            'smooth rectified image', self.smoothRectified)
+        self.actionSmooth.setCheckable(True)
+        self.isRectifiedSmooth = \
+            getOption('view', 'interpolation').lower() != 'nearest'
+        self.actionSmooth.setChecked(self.isRectifiedSmooth)
+
+        self.actionShowCursor = self.menu.addAction(
+            'show cursor crosshair', self.showCursor)
+        self.actionShowCursor.setCheckable(True)
+        self.isCursorVisible = True
+        self.actionShowCursor.setChecked(self.isCursorVisible)
+
+        self.actionShowStats = self.menu.addAction(
+            'show performance', self.showStats)
+        self.actionShowStats.setCheckable(True)
+        self.actionShowStats.setChecked(
+            getOption('view', 'stats').lower() == 'on')
+
+        self.cursorPoint = None  # image point under the mouse
+        self.cursorMarkPoint = None  # the crosshair, maybe snapped to a well
+        self.cursorMessage = ''
+        self.cursorTimer = qtcore.QTimer()
+        self.cursorTimer.setSingleShot(True)
+        self.cursorTimer.setInterval(displayFrameInterval())
+        self.cursorTimer.timeout.connect(self.updateCursor)
+
+    def cursorMoved(self, xdata, ydata):
+        """Collects the mouse moves of one screen refresh into one cursor
+        update."""
+        if (xdata is None) or (ydata is None):
+            self.cursorPoint = None
         else:
-            prev = self.img.get_array()
-            self.img.set_data(img)
-            if prev.shape != img.shape:
-                self.img.set_extent(
-                    [-0.5, img.shape[1]-0.5, img.shape[0]-0.5, -0.5])
-                self.axes.set_xlim((0, img.shape[1]))
-                self.axes.set_ylim((img.shape[0], 0))
-                self.toolbar.update()
-        self.draw()
+            self.cursorPoint = xdata, ydata
+        if not self.cursorTimer.isActive():
+            self.cursorTimer.start()
 
-    def onPress(self, event):
-        if (event.xdata is None) or (event.ydata is None):
+    def updateCursor(self):
+        parent = self.parent()
+        if self.cursorPoint is None:
+            self.cursorMessage, label = '', ''
+        else:
+            self.cursorMarkPoint, well = parent.snapToWell(self.cursorPoint)
+            self.cursorMessage = parent.formatCoordinates(
+                *self.cursorMarkPoint, well=well)
+            label = parent.cursorLabel(*self.cursorMarkPoint, well=well)
+        if self.toolbar is not None:
+            self.toolbar.set_message(self.cursorMessage)
+        self.drawCursor(label if self.isCursorVisible else '')
+
+    def pressed(self, xdata, ydata):
+        if (xdata is None) or (ydata is None):
             self.mouseClickPos = None
             return
-        self.mouseClickPos = int(round(event.xdata)), int(round(event.ydata))
+        self.mouseClickPos = int(round(xdata)), int(round(ydata))
         if not self.parent().buttonBaseRect.isChecked():
             return
         self.parent().buttonBaseRect.setCorner(*self.mouseClickPos)
@@ -213,8 +475,37 @@ class MyMplCanvas(mpl_qt.FigureCanvasQTAgg):
         self.actionDefineBeam.setEnabled(
             not self.parent().buttonStraightRect.isChecked())
         self.actionMove.setEnabled(self.parent().canTransform())
+        self.actionTrack.setEnabled(self.parent().canTransform())
+        executor = self.parent().motion.executor
+        self.actionAddToTour.setEnabled(self.parent().canTransform())
+        self.actionStartTour.setEnabled(
+            bool(executor.targets) and not executor.isBusy())
+        self.actionClearTour.setEnabled(bool(executor.targets))
+        self.actionCancelMotion.setEnabled(executor.isBusy())
         self.menu.exec_(self.mapToGlobal(position))
-        self.parent().updateFrame()
+        self.parent().requestRender()
+
+    def updateCalibrationMenu(self):
+        """Lists the stored calibrations, with the current one checked."""
+        parent = self.parent()
+        menu = self.calibrationMenu
+        menu.clear()
+        current = parent.calibrationName()
+        names = parent.calibrations.names()
+        for name in names:
+            action = menu.addAction(u'{0} (v{1})'.format(
+                name, parent.calibrations.load(name)['version']),
+                partial(parent.switchCalibration, name))
+            action.setCheckable(True)
+            action.setChecked(name == current)
+        if names:
+            menu.addSeparator()
+        action = menu.addAction('save the calibration as...',
+                                parent.saveCalibrationAs)
+        action.setEnabled(parent.canTransform())
+        action = menu.addAction('delete this calibration',
+                                parent.removeCalibration)
+        action.setEnabled(current in names)
 
     def setBeamPosition(self):
         if (self.beamPos[0] > 0) or (self.beamPos[1] > 0):
@@ -226,7 +517,7 @@ class MyMplCanvas(mpl_qt.FigureCanvasQTAgg):
             if reply == qt.QMessageBox.No:
                 return
         self.beamPos[:] = self.mouseClickPos
-        config.set('beam', 'pos', str(self.beamPos))
+        config.set(self.parent().section('beam'), 'pos', str(self.beamPos))
         write_config()
         self.parent().buttonStraightRect.update()
 
@@ -236,34 +527,366 @@ class MyMplCanvas(mpl_qt.FigureCanvasQTAgg):
     def showRect(self):
         self.isRectVisible = not self.isRectVisible
 
+    def trackPlate(self):
+        self.parent().setTracking(self.actionTrack.isChecked())
+
+    def smoothRectified(self):
+        self.isRectifiedSmooth = not self.isRectifiedSmooth
+
+    def showWells(self):
+        self.isWellsVisible = not self.isWellsVisible
+
+    def snapToWells(self):
+        self.isSnappedToWells = not self.isSnappedToWells
+        config.set(self.parent().section('wells'), 'snap',
+                   'on' if self.isSnappedToWells else 'off')
+        write_config()
+
+    def importWellMap(self):
+        self.parent().importWellMap()
+
+    def showStats(self):
+        self.parent().setStatsVisible(self.actionShowStats.isChecked())
+
+    def showCursor(self):
+        self.isCursorVisible = not self.isCursorVisible
+        self.updateCursor()
+
     def moveToBeam(self):
-        x, y = self.mouseClickPos
         parent = self.parent()
-        xC, yC = parent.beamPosRectified
-        if not parent.buttonStraightRect.isChecked():
-            xP, yP = parent.transformPoint((x, y))
-            x0, y0 = (xP-xC)/parent.zoom, (yP-yC)/parent.zoom
+        point, _ = parent.snapToWell(self.mouseClickPos)
+        x0, y0 = parent.toPlate(point)
+        dx, dy = parent.beamOffset(x0, y0)
+        parent.motion.executor.moveBy(dx, dy)
+
+    def addToTour(self):
+        point, _ = self.parent().snapToWell(self.mouseClickPos)
+        self.parent().addToTour(point)
+
+    def importTour(self):
+        self.parent().importTour()
+
+    def startTour(self):
+        self.parent().motion.executor.startTour()
+
+    def clearTour(self):
+        self.parent().motion.executor.clearTargets()
+
+    def cancelMotion(self):
+        self.parent().motion.executor.cancel()
+
+
+class MyMplCanvas(CanvasActions, mpl_qt.FigureCanvasQTAgg):
+    def __init__(self, parent=None):
+        self.fig = Figure()
+        self.fig.patch.set_facecolor('white')
+        super(MyMplCanvas, self).__init__(self.fig)
+        self.setParent(parent)
+        self.updateGeometry()
+        self.setupPlot()
+        self.mpl_connect('button_press_event', self.onPress)
+        self.mpl_connect('motion_notify_event', self.onMotion)
+        self.mpl_connect('axes_leave_event', self.onLeave)
+        self.mpl_connect('draw_event', self.onDraw)
+        self.mpl_connect('resize_event', self.onViewChanged)
+        self.img = None
+        self.background = None
+        self.dataSize = None
+        self.isViewReset = True
+        self.setupActions()
+        self.axes.callbacks.connect('xlim_changed', self.onViewChanged)
+        self.axes.callbacks.connect('ylim_changed', self.onViewChanged)
+
+    def setupPlot(self):
+        rect = [0., 0., 1., 1.]
+        self.axes = self.fig.add_axes(rect)
+        self.axes.xaxis.set_visible(False)
+        self.axes.yaxis.set_visible(False)
+        for spine in ['left', 'right', 'bottom', 'top']:
+            self.axes.spines[spine].set_visible(False)
+        self.axes.set_zorder(20)
+
+        # the cursor layer: animated artists are skipped by draw() and
+        # blitted over a saved background
+        color = 'yellow'
+        self.cursorH = self.axes.axhline(
+            0, color=color, lw=0.8, animated=True, visible=False)
+        self.cursorV = self.axes.axvline(
+            0, color=color, lw=0.8, animated=True, visible=False)
+        self.cursorText = self.axes.text(
+            0, 0, '', color=color, fontsize=9, ha='left', va='top',
+            animated=True, visible=False,
+            transform=offset_copy(self.axes.transData, fig=self.fig,
+                                  x=10, y=-10, units='dots'))
+
+    def setDataSize(self, size):
+        """Sets the (width, height) of the whole displayed data; a new size
+        resets the view to all of it."""
+        if size == self.dataSize:
+            return
+        self.dataSize = size
+        self.isViewReset = True
+
+    def resetLimits(self):
+        w, h = self.dataSize
+        self.axes.set_xlim((-0.5, w-0.5))
+        self.axes.set_ylim((h-0.5, -0.5))
+        self.isViewReset = False
+        self.toolbar.update()  # the zoom history is of the old data
+
+    def viewRegion(self):
+        """The visible data region (x0, x1, y0, y1)."""
+        if self.isViewReset:
+            w, h = self.dataSize
+            return -0.5, w-0.5, -0.5, h-0.5
+        (x0, x1), (y1, y0) = self.axes.get_xlim(), self.axes.get_ylim()
+        return x0, x1, y0, y1
+
+    def viewPixels(self):
+        return self.axes.bbox.width, self.axes.bbox.height
+
+    def imshow(self, img, extent=None):
+        """Shows `img` over `extent` (left, right, bottom, top) of the data,
+        the default is the whole image."""
+        if extent is None:
+            extent = -0.5, img.shape[1]-0.5, img.shape[0]-0.5, -0.5
+        if self.img is None:
+            self.img = self.axes.imshow(img, extent=extent)
         else:
-            x0, y0 = (x-xC)/parent.zoom, (y-yC)/parent.zoom
+            self.img.set_data(img)
+            self.img.set_extent(extent)
+        if self.isViewReset:
+            self.resetLimits()
+        self.draw()
+
+    def onViewChanged(self, *args):
+        if not self.isViewReset:
+            self.parent().requestRender()
+
+    def onPress(self, event):
+        self.pressed(event.xdata, event.ydata)
 
-        if isTest:
-            print(-x0, y0)
+    def onMotion(self, event):
+        if event.inaxes is not self.axes:
+            self.cursorMoved(None, None)
         else:
-            if motorX is not None:
-                try:
-                    curX = motorX.read_attribute('position').value
-                    motorX.write_attribute('position', curX-x0)
-                except Exception as e:
-                    lines = str(e).splitlines()
-                    for line in reversed(lines):
-                        if 'desc =' in line:
-                            msgBox = qt.QMessageBox()
-                            msgBox.critical(
-                                self, 'Motion has failed', line.strip()[7:])
-                            return
-            if motorY is not None:
-                curY = motorY.read_attribute('position').value
-                motorY.write_attribute('position', curY+y0)
+            self.cursorMoved(event.xdata, event.ydata)
+
+    def onLeave(self, event):
+        self.cursorMoved(None, None)
+
+    def onDraw(self, event):
+        # a new image: keep it as the background and put the cursor over it,
+        # the canvas is repainted after the draw anyway
+        self.background = self.copy_from_bbox(self.axes.bbox)
+        self.drawCursorArtists()
+
+    def drawCursor(self, label):
+        if self.background is None:
+            return
+        self.restore_region(self.background)
+        visible = bool(label)
+        if visible:
+            x, y = self.cursorMarkPoint
+            self.cursorH.set_ydata([y, y])
+            self.cursorV.set_xdata([x, x])
+            self.cursorText.set_position((x, y))
+            self.cursorText.set_text(label)
+        for artist in (self.cursorH, self.cursorV, self.cursorText):
+            artist.set_visible(visible)
+        self.drawCursorArtists()
+        self.blit(self.axes.bbox)
+
+    def drawCursorArtists(self):
+        for artist in (self.cursorH, self.cursorV, self.cursorText):
+            if artist.get_visible():
+                self.axes.draw_artist(artist)
+
+
+class MyImageCanvas(CanvasActions, qt.QWidget):
+    """A display canvas that paints the RGB frame through a QImage sharing
+    the numpy buffer, without matplotlib rendering. Image coordinates follow
+    the matplotlib `imshow` convention: pixel centres are at integer
+    positions."""
+
+    def __init__(self, parent=None):
+        super(MyImageCanvas, self).__init__(parent)
+        self.setAttribute(qt.Qt.WA_OpaquePaintEvent)
+        self.setMouseTracking(True)
+        self.frame = None
+        self.qimage = None
+        self.dataSize = None
+        self.extent = None
+        self.toolbar = None
+        self.scale = 1.  # screen pixels per image pixel
+        self.origin = qt.QPointF()  # image point at the widget's top left
+        self.isViewReset = True
+        self.panStart = None
+        self.cursorWidgetPos = qt.QPoint()
+        self.cursorLabel = ''
+        self.cursorRegion = qt.QRegion()
+        self.setupActions()
+
+    def setDataSize(self, size):
+        """Sets the (width, height) of the whole displayed data; a new size
+        resets the view to all of it."""
+        if size == self.dataSize:
+            return
+        self.dataSize = size
+        self.isViewReset = True
+        self.fitView()
+
+    def imshow(self, img, extent=None):
+        """Shows `img` over `extent` (left, right, bottom, top) of the data,
+        the default is the whole image."""
+        # the QImage doesn't own the buffer, keep it with the canvas:
+        self.frame = np.ascontiguousarray(img)
+        h, w = self.frame.shape[:2]
+        self.qimage = qt.QImage(self.frame.data, w, h, self.frame.strides[0],
+                                qt.QImage.Format_RGB888)
+        if extent is None:
+            extent = -0.5, w-0.5, h-0.5, -0.5
+            self.setDataSize((w, h))
+        self.extent = extent
+        self.update()
+
+    def fitView(self):
+        if self.dataSize is None:
+            return
+        w, h = self.dataSize
+        self.scale = min(self.width() / float(w), self.height() / float(h))
+        self.origin = qt.QPointF(
+            (w - self.width()/self.scale) / 2.,
+            (h - self.height()/self.scale) / 2.)
+
+    def resetView(self):
+        self.isViewReset = True
+        self.fitView()
+        self.viewChanged()
+
+    def viewChanged(self):
+        self.update()
+        if self.dataSize is not None:
+            self.parent().requestRender()
+
+    def viewRegion(self):
+        """The visible data region (x0, x1, y0, y1)."""
+        x0, y0 = self.origin.x() - 0.5, self.origin.y() - 0.5
+        return (x0, x0 + self.width()/self.scale,
+                y0, y0 + self.height()/self.scale)
+
+    def viewPixels(self):
+        return self.width(), self.height()
+
+    def mapToImage(self, pos):
+        """Widget position -> data (x, y) or (None, None) if outside."""
+        if self.dataSize is None:
+            return None, None
+        x = pos.x()/self.scale + self.origin.x()
+        y = pos.y()/self.scale + self.origin.y()
+        w, h = self.dataSize
+        if not (0 <= x < w and 0 <= y < h):
+            return None, None
+        return x - 0.5, y - 0.5
+
+    def mapFromImage(self, point):
+        """Data (x, y) -> widget position."""
+        x = (point[0]+0.5 - self.origin.x()) * self.scale
+        y = (point[1]+0.5 - self.origin.y()) * self.scale
+        return qt.QPoint(int(round(x)), int(round(y)))
+
+    def zoomAt(self, pos, factor):
+        x = pos.x()/self.scale + self.origin.x()
+        y = pos.y()/self.scale + self.origin.y()
+        self.scale *= factor
+        self.origin = qt.QPointF(
+            x - pos.x()/self.scale, y - pos.y()/self.scale)
+        self.isViewReset = False
+        self.viewChanged()
+
+    def paintEvent(self, event):
+        painter = qt.QPainter(self)
+        painter.fillRect(self.rect(), qt.Qt.white)
+        if self.qimage is not None:
+            left, right, bottom, top = self.extent
+            target = qt.QRectF(
+                (left+0.5 - self.origin.x())*self.scale,
+                (top+0.5 - self.origin.y())*self.scale,
+                (right-left)*self.scale, (bottom-top)*self.scale)
+            painter.setRenderHint(qt.QPainter.SmoothPixmapTransform,
+                                  target.width() < self.qimage.width())
+            painter.drawImage(target, self.qimage)
+        if self.cursorLabel:
+            self.paintCursor(painter)
+        painter.end()
+
+    def resizeEvent(self, event):
+        if self.isViewReset:
+            self.fitView()
+        super(MyImageCanvas, self).resizeEvent(event)
+        if self.dataSize is not None:
+            self.parent().requestRender()
+
+    def wheelEvent(self, event):
+        delta = event.angleDelta().y() if PYQT5 else event.delta()
+        factor = 1.25 if delta > 0 else 0.8
+        self.zoomAt(event.pos(), factor)
+        self.cursorMoved(*self.mapToImage(event.pos()))
+
+    def mousePressEvent(self, event):
+        if event.button() == qt.Qt.MidButton:
+            self.panStart = event.pos(), qt.QPointF(self.origin)
+            return
+        self.pressed(*self.mapToImage(event.pos()))
+
+    def mouseReleaseEvent(self, event):
+        if event.button() == qt.Qt.MidButton:
+            self.panStart = None
+
+    def mouseMoveEvent(self, event):
+        if self.panStart is not None:
+            pos0, origin0 = self.panStart
+            shift = event.pos() - pos0
+            self.origin = qt.QPointF(origin0.x() - shift.x()/self.scale,
+                                     origin0.y() - shift.y()/self.scale)
+            self.isViewReset = False
+            self.viewChanged()
+        self.cursorMoved(*self.mapToImage(event.pos()))
+
+    def leaveEvent(self, event):
+        self.cursorMoved(None, None)
+        super(MyImageCanvas, self).leaveEvent(event)
+
+    def drawCursor(self, label):
+        """Repaints only the regions of the previous and the new crosshair,
+        the image there is copied from the QImage without rescaling the
+        whole frame."""
+        self.cursorLabel = label
+        region = qt.QRegion(self.cursorRegion)
+        self.cursorRegion = qt.QRegion()
+        if label:
+            pos = self.cursorWidgetPos = self.mapFromImage(
+                self.cursorMarkPoint)
+            self.cursorRegion += qt.QRect(0, pos.y()-1, self.width(), 3)
+            self.cursorRegion += qt.QRect(pos.x()-1, 0, 3, self.height())
+            self.cursorRegion += self.cursorLabelRect().adjusted(-2, -2, 2, 2)
+        region += self.cursorRegion
+        if not region.isEmpty():
+            self.update(region)
+
+    def cursorLabelRect(self):
+        pos = self.cursorWidgetPos
+        return self.fontMetrics().boundingRect(
+            qt.QRect(pos.x()+10, pos.y()+10, 400, 100),
+            qt.Qt.AlignLeft | qt.Qt.AlignTop, self.cursorLabel)
+
+    def paintCursor(self, painter):
+        pos = self.cursorWidgetPos
+        painter.setPen(qt.QColor(qt.Qt.yellow))
+        painter.drawLine(0, pos.y(), self.width(), pos.y())
+        painter.drawLine(pos.x(), 0, pos.x(), self.height())
+        painter.drawText(self.cursorLabelRect(),
+                         qt.Qt.AlignLeft | qt.Qt.AlignTop, self.cursorLabel)
 
 
 class PerspectiveRectButton(qt.QPushButton):
@@ -297,7 +920,7 @@ class PerspectiveRectButton(qt.QPushButton):
             self.currentDefCorner = -1
         self.parent().plotCanvas.isRectVisible = True
         self.parent().plotCanvas.actionShowRect.setChecked(True)
-        self.parent().updateFrame()
+        self.parent().requestRender()
         self.update()
 
     def setCorner(self, xdata, ydata):
@@ -310,11 +933,12 @@ class PerspectiveRectButton(qt.QPushButton):
             spt1, spt2 = sorted(topPts, key=lambda lst: lst[0])
             spt4, spt3 = sorted(bottomPts, key=lambda lst: lst[0])
             self.corners = [spt1, spt2, spt3, spt4]
-            config.set('rectangle', 'corners', str(self.corners))
+            config.set(self.parent().section('rectangle'), 'corners',
+                       str(self.corners))
             write_config()
             self.setChecked(False)
             self.parent().buttonStraightRect.update()
-        self.parent().updateFrame()
+        self.parent().requestRender()
         self.update()
 
     def eventFilter(self, widget, event):
@@ -371,7 +995,7 @@ class StraightRectButton(PerspectiveRectButton):
     def clickedSlot(self):
         self.parent().buttonBaseRect.setEnabled(not self.isChecked())
         self.parent().getTransform()
-        self.parent().updateFrame()
+        self.parent().requestRender()
 
 
 class ScaleXButton(qt.QPushButton):
@@ -444,44 +1068,534 @@ class ScaleEdit(qt.QDoubleSpinBox):
                 self.setVisible(False)
                 if key in (qt.Qt.Key_Enter, qt.Qt.Key_Return):
                     self.buddyButton.scale = self.value()
-                    config.set('rectangle', 'scale'+self.name,
-                               str(self.buddyButton.scale))
+                    config.set(self.parent().section('rectangle'),
+                               'scale'+self.name, str(self.buddyButton.scale))
                     write_config()
 
                 self.parent().buttonStraightRect.update()
+                self.parent().requestRender()
 
         return super(ScaleEdit, self).eventFilter(widget, event)
 
 
+class FrameGrabber(object):
+    """Reads frames by `read()` in a worker thread every `period` seconds
+    into a small ring buffer. The GUI takes only the newest frame by
+    `latest()`; frames that were never taken are counted as dropped, reads
+    longer than the period as late. `trigger()`, e.g. from a camera event,
+    makes the next read immediately, though not sooner than `minPeriod`
+    after the previous one. `onFrame()` is called in the worker thread after
+    each new frame. `captureTime()` tells the time of the frame just read on
+    this host's clock, None if unknown; the arrival time is taken then."""
+
+    def __init__(self, read, period, depth=3, onFrame=None,
+                 captureTime=None):
+        self.read = read
+        self.captureTime = captureTime
+        self.period = period  # s
+        self.minPeriod = 0.  # s, set by RenderScheduler
+        self.onFrame = onFrame
+        self.frames = collections.deque(maxlen=depth)
+        self.lock = threading.Lock()
+        self.newFrame = threading.Event()
+        self.wakeUp = threading.Event()
+        self.stopped = threading.Event()
+        self.frameCount = 0
+        self.droppedFrames = 0
+        self.lateFrames = 0
+        self.lastError = None
+        self.latestTime = 0.
+        self.thread = threading.Thread(target=self.run, name='FrameGrabber')
+        self.thread.daemon = True
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self, timeout=2):
+        self.stopped.set()
+        self.wakeUp.set()
+        self.thread.join(timeout)
+
+    def trigger(self, event=None):
+        self.wakeUp.set()
+
+    def run(self):
+        while not self.stopped.is_set():
+            t0 = time.time()
+            try:
+                frame = self.read()
+                self.lastError = None
+            except Exception as e:
+                self.lastError = e
+                frame = None
+            dt = time.time() - t0
+            if frame is not None:
+                stamp = None
+                if self.captureTime is not None:
+                    stamp = self.captureTime()
+                if stamp is None:
+                    stamp = time.time()
+                with self.lock:
+                    if len(self.frames) == self.frames.maxlen:
+                        self.droppedFrames += 1
+                    self.frames.append((stamp, frame))
+                    self.frameCount += 1
+                self.newFrame.set()
+                if self.onFrame is not None:
+                    self.onFrame()
+            if dt > self.period:
+                self.lateFrames += 1
+            if self.minPeriod > dt:
+                self.stopped.wait(self.minPeriod - dt)
+            self.wakeUp.wait(max(self.period - (time.time() - t0), 0))
+            self.wakeUp.clear()
+
+    def waitFrame(self, timeout):
+        return self.newFrame.wait(timeout)
+
+    def latest(self):
+        """Returns the newest frame or None if nothing new has come. Its
+        capture or arrival time is then in `latestTime`."""
+        with self.lock:
+            if not self.frames:
+                return None
+            self.latestTime, frame = self.frames[-1]
+            self.droppedFrames += len(self.frames) - 1
+            self.frames.clear()
+            self.newFrame.clear()
+        return frame
+
+
+class PerfStats(object):
+    """Rolling statistics of the refresh over the last `depth` samples: the
+    latencies of the stages (read, in the grabber thread, then track,
+    rectify, overlay, blend and draw), the rate of the shown frames and their
+    age, i.e. the time from the source's `frameTime` (from their arrival if
+    the source does not tell it) to their display, all on this host's
+    clock."""
+
+    stages = 'read', 'track', 'rectify', 'overlay', 'blend', 'draw'
+    bins = 0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000  # ms
+
+    def __init__(self, depth=200):
+        self.latencies = dict(
+            (stage, collections.deque(maxlen=depth)) for stage in self.stages)
+        self.shownTimes = collections.deque(maxlen=depth)
+        self.frameAges = collections.deque(maxlen=depth)
+
+    def lap(self, stage, t0):
+        """Adds the latency of `stage` started at `t0`; returns the current
+        time for the start of the next stage."""
+        t = time.time()
+        self.latencies[stage].append((t - t0) * 1e3)
+        return t
+
+    def frameShown(self, frameTime):
+        t = time.time()
+        self.shownTimes.append(t)
+        self.frameAges.append((t - frameTime) * 1e3)
+
+    def fps(self):
+        times = list(self.shownTimes)
+        if len(times) < 2 or time.time() - times[-1] > 5:
+            return 0.
+        return (len(times) - 1) / (times[-1] - times[0])
+
+    def histogram(self, stage):
+        """The counts of the latencies of `stage` in `bins`."""
+        return np.histogram(list(self.latencies[stage]),
+                            bins=self.bins + (np.inf,))[0]
+
+    def histogramText(self):
+        """The non-empty `histogram()` bins of the stages, a line each."""
+        edges = ['{0}-{1}'.format(a, b)
+                 for a, b in zip(self.bins[:-1], self.bins[1:])]
+        edges.append('>{0}'.format(self.bins[-1]))
+        lines = []
+        for stage in self.stages:
+            counts = self.histogram(stage)
+            if counts.any():
+                lines.append('{0}: {1}'.format(stage, ', '.join(
+                    '{0} ms x{1}'.format(edge, n)
+                    for edge, n in zip(edges, counts) if n)))
+        return '\n'.join(lines)
+
+    def percentiles(self, stage, q=(50, 95)):
+        values = list(self.latencies[stage])
+        if not values:
+            return None
+        return np.percentile(values, q)
+
+    def summary(self, grabber=None):
+        """The status line: median/95th percentile latencies, ms."""
+        items = ['{0:.1f} fps'.format(self.fps())]
+        if self.frameAges:
+            items.append('age {0:.0f} ms'.format(np.median(self.frameAges)))
+        for stage in self.stages:
+            p = self.percentiles(stage)
+            if p is not None:
+                items.append('{0} {1:.1f}/{2:.1f}'.format(stage, *p))
+        if grabber is not None:
+            items.append('dropped {0}, late {1}'.format(
+                grabber.droppedFrames, grabber.lateFrames))
+        return ' | '.join(items)
+
+
+class OverlayLayer(object):
+    """Markers drawn over the camera frames.
+
+    The markers are drawn once, between `begin()` and `end()`, into a colour
+    layer and a coverage mask. Only the covered pixels are kept, so that
+    `blend()` touches these pixels and not the whole frame. The markers are
+    given in data coordinates; when the layer covers only a `window` of the
+    data, they are mapped into it.
+    """
+
+    def __init__(self, alpha=0.75):
+        self.alpha = alpha  # transparency factor
+        self.key = None
+        self.indices = np.empty(0, dtype=np.intp)
+        self.weights = np.empty((0, 1), dtype=np.float32)
+        self.colors = np.empty((0, 3), dtype=np.float32)
+
+    def needsRebuild(self, key):
+        return key != self.key
+
+    def begin(self, key, shape, window=None):
+        """`window` (x, y, width, height) is the part of the data covered by
+        the layer of `shape`, the default is the whole data of this shape."""
+        self.key = key
+        self.layer = np.zeros(shape, dtype=np.uint8)
+        self.mask = np.zeros(shape[:2], dtype=np.uint8)
+        if window is None:
+            window = 0, 0, shape[1], shape[0]
+        x, y, w, h = window
+        self.scale = shape[1] / float(w), shape[0] / float(h)
+        # the data point that goes to the layer point (0, 0):
+        self.origin = x - 0.5 + 0.5/self.scale[0], y - 0.5 + 0.5/self.scale[1]
+
+    def toLayer(self, pt):
+        return (int((pt[0]-self.origin[0]) * self.scale[0]),
+                int((pt[1]-self.origin[1]) * self.scale[1]))
+
+    def toLayerSize(self, size):
+        if size < 0:  # filled
+            return size
+        return max(int(size * self.scale[0]), 1)
+
+    def line(self, pt1, pt2, color, thickness=1, lineType=cv2.LINE_8):
+        pt1, pt2 = self.toLayer(pt1), self.toLayer(pt2)
+        thickness = self.toLayerSize(thickness)
+        cv2.line(self.layer, pt1, pt2, color, thickness, lineType)
+        cv2.line(self.mask, pt1, pt2, 255, thickness, lineType)
+
+    def circle(self, center, radius, color, thickness=1, lineType=cv2.LINE_8):
+        center, radius = self.toLayer(center), int(radius * self.scale[0])
+        thickness = self.toLayerSize(thickness)
+        cv2.circle(self.layer, center, radius, color, thickness, lineType)
+        cv2.circle(self.mask, center, radius, 255, thickness, lineType)
+
+    def dots(self, points, color):
+        """One layer pixel at every point of the (n, 2) array `points`."""
+        xy = ((np.asarray(points).reshape(-1, 2) - self.origin) *
+              self.scale).astype(int)
+        h, w = self.mask.shape
+        xy = xy[(xy[:, 0] >= 0) & (xy[:, 0] < w) &
+                (xy[:, 1] >= 0) & (xy[:, 1] < h)]
+        self.layer[xy[:, 1], xy[:, 0]] = color
+        self.mask[xy[:, 1], xy[:, 0]] = 255
+
+    def rings(self, centers, radii, color, thickness=1, lineType=cv2.LINE_8):
+        """Circles at the (n, 2) array `centers` with `radii`, as copies of
+        one circle drawn per radius in layer pixels, i.e. without a call per
+        circle."""
+        xy = ((np.asarray(centers).reshape(-1, 2) - self.origin) *
+              self.scale).astype(int)
+        radii = (np.asarray(radii) * self.scale[0]).astype(int)
+        thickness = self.toLayerSize(thickness)
+        h, w = self.mask.shape
+        layer = self.layer.reshape(-1, self.layer.shape[-1])
+        mask = self.mask.ravel()
+        for radius in np.unique(radii):
+            c = radius + thickness
+            stamp = np.zeros((2*c + 1, 2*c + 1), dtype=np.uint8)
+            cv2.circle(stamp, (c, c), int(radius), 255, thickness, lineType)
+            dy, dx = np.nonzero(stamp)
+            # the layer colours are premultiplied by the coverage:
+            coverage = stamp[dy, dx]
+            colors = (np.outer(coverage, color) // 255).astype(np.uint8)
+            pts = xy[radii == radius]
+            x, y = pts[:, :1] + (dx - c), pts[:, 1:] + (dy - c)
+            inside = (x >= 0) & (x < w) & (y >= 0) & (y < h)
+            iStamp = np.nonzero(inside)[1]
+            indices = y[inside]*w + x[inside]
+            layer[indices] = np.maximum(layer[indices], colors[iStamp])
+            mask[indices] = np.maximum(mask[indices], coverage[iStamp])
+
+    def end(self):
+        mask = self.mask.ravel()
+        self.indices = np.flatnonzero(mask)
+        # the layer is drawn over black, i.e. its colours are premultiplied
+        # by the antialiased coverage in the mask:
+        coverage = mask[self.indices, None] * np.float32(self.alpha/255.)
+        self.weights = 1 - coverage
+        self.colors = self.layer.reshape(-1, self.layer.shape[-1])[
+            self.indices] * np.float32(self.alpha) + np.float32(0.5)
+        self.layer, self.mask = None, None
+
+    def blend(self, img, inplace=False):
+        out = img if inplace else img.copy()
+        flat = out.reshape(-1, out.shape[-1])
+        flat[self.indices] = flat[self.indices] * self.weights + self.colors
+        return out
+
+
+class FramePyramid(object):
+    """Copies of a frame downscaled by powers of 2, made on demand and kept
+    until the next frame. A part of the frame is shown at a lower resolution
+    from the nearest finer level, so that the cost is proportional to the
+    shown pixels and not to the sensor pixels."""
+
+    def __init__(self):
+        self.levels = [None]
+
+    def setFrame(self, frame):
+        if frame is not self.levels[0]:
+            self.levels = [frame]
+
+    @staticmethod
+    def levelOf(scale):
+        """The level with at least the resolution `scale`, output pixels
+        per frame pixel."""
+        if scale >= 1:
+            return 0
+        return int(np.floor(np.log2(1. / scale) + 1e-6))
+
+    def level(self, n):
+        """(n, image) of the level n or of the coarsest one if the frame
+        is too small for n."""
+        while len(self.levels) <= n:
+            prev = self.levels[-1]
+            h, w = prev.shape[:2]
+            if min(h, w) < 2:
+                break
+            self.levels.append(cv2.resize(prev, (w//2, h//2),
+                                          interpolation=cv2.INTER_AREA))
+        n = min(n, len(self.levels) - 1)
+        return n, self.levels[n]
+
+    def window(self, window, size):
+        """The part `window` (x, y, width, height) of the frame resampled to
+        `size` (width, height). At the full resolution this is a view of the
+        frame, see `isCached()`."""
+        x, y, w, h = window
+        n, img = self.level(self.levelOf(
+            min(size[0] / float(w), size[1] / float(h))))
+        f = 2**n
+        img = img[y//f:-(-(y+h)//f), x//f:-(-(x+w)//f)]
+        if img.shape[1::-1] != tuple(size):
+            img = cv2.resize(img, tuple(size), interpolation=cv2.INTER_AREA)
+        return img
+
+    def isCached(self, img):
+        """Whether `img` is or shares the memory of a level, i.e. must not be
+        changed."""
+        return img.base is not None or any(img is lv for lv in self.levels)
+
+
+class StageMotion(qtcore.QObject):
+    """The `MotionExecutor` of the stage motors, one per process and shared
+    by the panes. `changed` is emitted in the GUI thread on every change of
+    the motion state, position or tour."""
+
+    changed = qtcore.Signal()
+    instance = None
+
+    @classmethod
+    def shared(cls):
+        if cls.instance is None:
+            cls.instance = cls()
+        return cls.instance
+
+    def __init__(self):
+        super(StageMotion, self).__init__()
+        self.executor = MotionExecutor(
+            (motorX, motorY),
+            tolerance=float(getOption('motion', 'tolerance')),
+            timeout=float(getOption('motion', 'timeout')),
+            dwell=float(getOption('motion', 'dwell')),
+            onChange=self.changed.emit)
+
+
+class RenderScheduler(object):
+    """Renders the OrthoView panes of one process in the GUI thread and sets
+    the frame rates of their cameras.
+
+    A pane asks for a render by `schedule()`. The requests are served once
+    per screen refresh: first a pane whose new frame is overdue by more
+    than `starveTime`, then the focused pane, then by the camera `priority`
+    and then the longest waiting one. A tick renders panes
+    until its time budget of one screen refresh is spent, the rest wait for
+    the next tick. New frames are taken at most `maxfps` times per second in
+    the focused pane and `idlefps` in the others (0: as they come); the
+    frame grabbers of the panes are throttled to the same rates. UI changes
+    are rendered from the cached frame at once."""
+
+    starveTime = 0.1  # s
+
+    def __init__(self):
+        self.panes = []
+        self.focusPane = None
+        self.interval = displayFrameInterval()  # ms
+        self.wakeTime = 0.
+        self.timer = qtcore.QTimer()
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self.run)
+        app = qt.QApplication.instance()
+        if app is not None:
+            app.focusChanged.connect(self.focusChanged)
+
+    def addPane(self, pane):
+        self.panes.append(pane)
+        if self.focusPane is None:
+            self.setFocusPane(pane)
+        else:
+            self.setRates(pane)
+
+    def removePane(self, pane):
+        if pane in self.panes:
+            self.panes.remove(pane)
+        if self.focusPane is pane:
+            self.setFocusPane(self.panes[0] if self.panes else None)
+
+    def setFocusPane(self, pane):
+        self.focusPane = pane
+        for p in self.panes:
+            self.setRates(p)
+
+    def focusChanged(self, old, new):
+        for pane in self.panes:
+            if new is not None and (new is pane or pane.isAncestorOf(new)):
+                if pane is not self.focusPane:
+                    self.setFocusPane(pane)
+                return
+
+    def framePeriod(self, pane):
+        """The shortest time between two new frames of `pane`, s."""
+        fps = pane.maxFps if pane is self.focusPane else pane.idleFps
+        return 1. / fps if fps > 0 else 0.
+
+    def setRates(self, pane):
+        pane.grabber.minPeriod = self.framePeriod(pane)
+
+    def schedule(self, delay=None):
+        """Wakes up the scheduler after `delay` ms, by default at the next
+        screen refresh; an earlier wake-up is kept."""
+        delay = self.interval if delay is None else delay
+        wakeTime = time.time() + delay*1e-3
+        if not self.timer.isActive() or wakeTime < self.wakeTime:
+            self.wakeTime = wakeTime
+            self.timer.start(delay)
+
+    def run(self):
+        t0 = time.time()
+        queue, waits = [], []
+        for pane in self.panes:
+            dueTime = pane.frameRenderTime + self.framePeriod(pane)
+            frameDue = pane.isFrameDirty and t0 >= dueTime
+            if frameDue or pane.isRenderPending:
+                isStarving = frameDue and t0 - dueTime > self.starveTime
+                order = 0 if isStarving else 1 if pane is self.focusPane \
+                    else 2
+                queue.append(((order, -pane.priority, pane.frameRenderTime),
+                              pane, frameDue))
+            if pane.isFrameDirty and not frameDue:
+                waits.append(dueTime - t0)
+        queue.sort(key=lambda item: item[0])
+
+        for i, (order, pane, frameDue) in enumerate(queue):
+            if i > 0 and (time.time() - t0)*1e3 > self.interval:
+                waits.append(0)  # the budget is spent, the rest goes next
+                break
+            if frameDue:
+                pane.frameRenderTime = time.time()
+            pane.renderView(takeFrame=frameDue)
+        if waits:
+            self.schedule(max(int(min(waits)*1e3), self.interval))
+
+
 class OrthoView(qt.QWidget):
-    def __init__(self, parent=None):
+    frameReady = qtcore.Signal()
+    cameraRoiMargin = 0.25
+    windowStep = 32  # alignment of the rendered part of the view, pixels
+    trackingTolerance = 0.05  # px, smaller corner moves keep the calibration
+
+    def __init__(self, parent=None, canvas=None, source=None, name=None,
+                 scheduler=None):
+        """*canvas* selects the display widget: 'mpl' for matplotlib or
+        'qimage' for a plain QImage painter, the default is taken from the
+        [view] section of OrthoView.ini. *source* is a frame source of
+        `FrameSources`, the default is made by `makeFrameSource()`. *name*
+        is the name of the camera pane, its calibration and camera are in
+        its own config sections, see `paneSection()`. The panes of one
+        window share a `RenderScheduler`, a single view makes its own."""
         super(OrthoView, self).__init__(parent)
 
-        self.setWindowTitle('OrthoView')
-        self.setMinimumSize(800, 600+53)
+        self.name = name
+        self.setWindowTitle('OrthoView' + (' - ' + name if name else ''))
+        if name is None:
+            self.setMinimumSize(800, 600+53)
+        else:
+            self.setMinimumSize(400, 300+53)
 #        self.setFixedSize(640, 480)
+        self.setFocusPolicy(qt.Qt.ClickFocus)
         self.beamPosRectified = [0, 0]
-
-        self.plotCanvas = MyMplCanvas(self)
+        self.calibration = None
+        self.isFrameDirty = False
+        self.isRenderPending = False
+        self.frameRenderTime = 0.
+        self.renderedKey = None
+        self.tracker = None
+        self.wellMap = None
+        self.calibrations = CalibrationStore(config, name)
+        self.cachedStateKey = None
+        self.maxPixels = int(float(getOption('view', 'maxpixels')))
+        cameraSection = self.section('camera')
+        self.maxFps = float(getOption(cameraSection, 'maxfps'))
+        self.idleFps = float(getOption(cameraSection, 'idlefps'))
+        self.priority = int(getOption(cameraSection, 'priority'))
+
+        if canvas is None:
+            canvas = getOption('view', 'canvas')
+        if canvas == 'qimage':
+            self.plotCanvas = MyImageCanvas(self)
+            self.toolbar = MyImageToolBar(self.plotCanvas, self)
+        else:
+            self.plotCanvas = MyMplCanvas(self)
+            self.toolbar = MyToolBar(self.plotCanvas, self)
+            for action in self.toolbar.findChildren(qtwidgets.QAction):
+                if action.text() in ['Customize', 'Subplots']:
+                    action.setVisible(False)
         self.plotCanvas.setSizePolicy(
             qt.QSizePolicy.Expanding, qt.QSizePolicy.Expanding)
-        self.toolbar = MyToolBar(self.plotCanvas, self)
-        for action in self.toolbar.findChildren(qtwidgets.QAction):
-            if action.text() in ['Customize', 'Subplots']:
-                action.setVisible(False)
+        self.plotCanvas.setFocusPolicy(qt.Qt.ClickFocus)
         self.toolbar.locLabel.setAlignment(qt.Qt.AlignCenter)
 
         layoutT = qt.QHBoxLayout()
         self.buttonBaseRect = PerspectiveRectButton()
-        self.buttonBaseRect.corners = eval(config.get('rectangle', 'corners'))
+        rectangleSection = self.section('rectangle')
+        self.buttonBaseRect.corners = literal(
+            config.get(rectangleSection, 'corners'))
 
         self.buttonScaleX = ScaleXButton()
-        self.buttonScaleX.scale = float(config.get('rectangle', 'scalex'))
+        self.buttonScaleX.scale = float(
+            config.get(rectangleSection, 'scalex'))
         self.editScaleX = ScaleEdit('x', buddyButton=self.buttonScaleX)
         self.buttonScaleX.buddyEdit = self.editScaleX
 
         self.buttonScaleY = ScaleYButton()
-        self.buttonScaleY.scale = float(config.get('rectangle', 'scaley'))
+        self.buttonScaleY.scale = float(
+            config.get(rectangleSection, 'scaley'))
         self.editScaleY = ScaleEdit('y', buddyButton=self.buttonScaleY)
         self.buttonScaleY.buddyEdit = self.editScaleY
 
@@ -493,10 +1607,12 @@ class OrthoView(qt.QWidget):
                     self.buttonScaleY, self.editScaleY,
                     self.buttonStraightRect):
             but.setFixedSize(60, 40)
+        if name is not None:
+            layoutT.addWidget(qt.QLabel(name))
         layoutT.addWidget(self.toolbar)
         if TaurusLed is not None:
             led = TaurusLed()
-            led.setModel(taurusLedModel)
+            led.setModel(getOption(cameraSection, 'device') + '/status')
             layoutT.addWidget(led)
         layoutT.addWidget(self.buttonBaseRect)
         layoutT.addWidget(self.buttonScaleX)
@@ -508,167 +1624,799 @@ class OrthoView(qt.QWidget):
         layout = qt.QVBoxLayout(self)
         layout.addLayout(layoutT)
         layout.addWidget(self.plotCanvas)
+        self.stats = PerfStats()
+        self.statsLabel = qt.QLabel('')
+        self.statsTip = \
+            'median/95th percentile latencies of the refresh stages, ms'
+        self.statsLabel.setToolTip(self.statsTip)
+        layout.addWidget(self.statsLabel)
+        self.motionLabel = qt.QLabel('')
+        self.motionLabel.setVisible(False)
+        layout.addWidget(self.motionLabel)
+        self.motion = StageMotion.shared()
+        self.reportedMotionError = None
+        self.motion.changed.connect(self.motionChanged)
+        self.statsTimer = qtcore.QTimer()
+        self.statsTimer.timeout.connect(self.updateStats)
+        self.setStatsVisible(getOption('view', 'stats').lower() == 'on')
 
         # markers
+        self.overlay = OverlayLayer(alpha=0.75)
+        self.pyramid = FramePyramid()
         self.beamMarkColor = (255, 0, 0)
         self.cornerColor = (0, 192, 0)
         self.currentCornerColor = (64, 64, 255)
+        self.lostCornerColor = (255, 160, 0)
+        self.tourColor = (0, 200, 255)
+        self.currentTourColor = (255, 255, 255)
+        self.wellColor = (255, 255, 0)
         self.gridColor = (192, 192, 192)
 
-        if not isTest:
-            self.refreshTimer = qtcore.QTimer()
-            self.refreshTimer.timeout.connect(self.updateFrame)
-            self.refreshTimer.start(500)  # ms
-            try:  # Camera tango device
-                self.camera = DeviceProxy('b308a-eh/rpi/cam-01')
-            except Exception as e:
-                raise Exception("Something is wrong with the tango device {0}".
-                                format(e))
+        # a placeholder until the first camera frame, which comes by
+        # frameReady; the GUI never waits for the camera:
+        self.img = np.zeros((480, 640, 3), dtype=np.uint8)
+        self.frameNumber = 0  # of the frames taken by getFrame()
+        self.shownFrameNumber = 0
+        if source is None:
+            source = makeFrameSource(section=cameraSection)
+        self.source = source
+        self.cameraRoiMode = getOption(cameraSection, 'roi')
+        self.grabber = FrameGrabber(
+            self.readFrame, self.source.period, onFrame=self.frameReady.emit,
+            captureTime=lambda: self.source.frameTime)
+        if self.source.subscribe(self.grabber.trigger):
+            # the periodic reading stays as a slow fallback for missed events
+            self.grabber.period = 2.  # s
+        self.scheduler = scheduler or RenderScheduler()
+        self.scheduler.addPane(self)
+        self.frameReady.connect(self.requestFrame)
+        self.grabber.start()
+        self.refreshTimer = qtcore.QTimer()
+        self.refreshTimer.timeout.connect(self.requestFrame)
+        self.refreshTimer.start(500)  # ms
         self.updateFrame()
         self.buttonStraightRect.update()
+        self.setTracking(
+            getOption(self.section('rectangle'), 'tracking') == 'on')
+        self.setWellMap(getOption(self.section('wells'), 'layout'))
+
+    def updateCameraRoi(self):
+        """Asks the camera for the full resolution region around the
+        reference rectangle, with a margin of `cameraRoiMargin` of its size
+        on every side; the rest comes from the coarse image. The region is
+        written to the camera in the grabber thread, woken up for it."""
+        if self.cameraRoiMode != 'auto':
+            return
+        corners = np.array(self.buttonBaseRect.corners)
+        (x0, y0), (x1, y1) = corners.min(axis=0), corners.max(axis=0)
+        mx = (x1 - x0) * self.cameraRoiMargin
+        my = (y1 - y0) * self.cameraRoiMargin
+        h, w = self.img.shape[:2]
+        x0, y0 = max(int(x0 - mx), 0), max(int(y0 - my), 0)
+        x1, y1 = min(int(x1 + mx) + 1, w), min(int(y1 + my) + 1, h)
+        if self.source.setRoi((x0, y0, x1-x0, y1-y0)):
+            self.grabber.trigger()
+
+    def section(self, kind):
+        return paneSection(kind, self.name)
+
+    def closeEvent(self, event):
+        self.motion.changed.disconnect(self.motionChanged)
+        if self.tracker is not None:
+            self.saveCorners()
+        if self.calibration is not None:
+            self.cacheCalibration()
+        fileWriter.flush()
+        self.scheduler.removePane(self)
+        self.refreshTimer.stop()
+        self.statsTimer.stop()
+        self.source.close()
+        self.grabber.stop()
+        super(OrthoView, self).closeEvent(event)
+
+    def setStatsVisible(self, visible):
+        self.statsLabel.setVisible(visible)
+        if visible:
+            self.statsTimer.start(1000)  # ms
+        else:
+            self.statsTimer.stop()
+
+    def updateStats(self):
+        text = self.stats.summary(self.grabber)
+        if self.source.lastError is not None:
+            text += ' | camera: ' + errorText(self.source.lastError)
+        if fileWriter.lastError is not None:
+            text += ' | saving: {0}'.format(fileWriter.lastError)
+        self.statsLabel.setText(text)
+        histogram = self.stats.histogramText()
+        self.statsLabel.setToolTip(
+            self.statsTip + ('\n\n' + histogram if histogram else ''))
+
+    def readFrame(self):
+        """Runs in the grabber thread."""
+        t0 = time.time()
+        frame = self.source.read()
+        if frame is not None:
+            self.stats.lap('read', t0)
+        return frame
 
     def getFrame(self):
-        if isTest:
-            frame = cv2.imread(r"_images/sample-holder-test.png")
-            # OpenCV uses BGR as its default colour order for images
-            self.img = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-#            import pickle
-#            with open(r"_images/sample-holder-test2.pickle", 'rb') as f:
-#                try:
-#                    packed = pickle.load(f, encoding='latin1')
-#                except TypeError:
-#                    packed = pickle.load(f)
-#            unpacked = np.empty(list(packed.shape)+[3], dtype=np.uint8)
-#            unpacked[:, :, 2] = (packed >> 16) & 0xff
-#            unpacked[:, :, 1] = (packed >> 8) & 0xff
-#            unpacked[:, :, 0] = packed & 0xff
-#            self.img = unpacked
-
+        """Sets self.img to the newest RGB frame; keeps the previous one if
+        the source has delivered nothing new. Returns True for a new frame."""
+        frame = self.grabber.latest()
+        if frame is None:
+            return False
+        self.img = frame
+        return True
+
+    def requestRender(self, newFrame=False):
+        """Schedules a render by the `RenderScheduler`. The requests of one
+        display frame are merged into one render; with `newFrame` it takes
+        the newest camera frame, otherwise the UI changes are rendered from
+        the cached frame."""
+        if newFrame:
+            self.isFrameDirty = True
         else:
-            frame = self.camera.read_attribute('Image').value
+            self.isRenderPending = True
+        self.scheduler.schedule()
 
-            # for monochrome frames:
-#            self.img = cv2.normalize(
-#                src=frame, dst=None, alpha=0, beta=255,
-#                norm_type=cv2.NORM_MINMAX, dtype=cv2.CV_8UC1)
-#            self.img = cv2.cvtColor(self.img, cv2.COLOR_GRAY2BGR)
-
-            # for color frames:
-            unpacked = np.empty(list(frame.shape)+[3], dtype=np.uint8)
-            unpacked[:, :, 2] = (frame >> 16) & 0xff
-            unpacked[:, :, 1] = (frame >> 8) & 0xff
-            unpacked[:, :, 0] = frame & 0xff
-            self.img = unpacked
+    def requestFrame(self):
+        self.requestRender(newFrame=True)
 
     def updateFrame(self):
-        self.getFrame()
-        try:
-            CV_AA = cv2.CV_AA
-        except AttributeError:
-            CV_AA = cv2.LINE_AA
-
-        if self.canTransform() and self.buttonStraightRect.isChecked():
-            # draw rectified
-            self.img = cv2.warpPerspective(
-                self.img, self.perspectiveTransform2,
-                (self.boundingRect[2], self.boundingRect[3]))
-            overlay = self.img.copy()
-            ps = self.img.shape[0] * 0.02
-
-            # grid:
-            grid = np.arange(-10, 10) * 10 * self.zoom
-            xgrid = np.int16(self.targetRect[0][0] + grid)
-            ygrid = np.int16(self.targetRect[0][1] + grid)
-            for xg in xgrid:
-                cv2.line(overlay, (xg, ygrid[0]), (xg, ygrid[-1]),
-                         self.gridColor, 2)
-            for yg in ygrid:
-                cv2.line(overlay, (xgrid[0], yg), (xgrid[-1], yg),
-                         self.gridColor, 2)
-
-            # beam position mark:
-            if self.plotCanvas.isBeamPositionVisible:
-                cv2.circle(
-                    overlay, tuple(int(p) for p in self.beamPosRectified),
-                    int(ps*0.75), self.beamMarkColor, int(ps/3.), CV_AA)
-
-            # rectangle corners:
-            if self.plotCanvas.isRectVisible:
-                for corner in self.targetRect:
-                    cv2.circle(overlay, corner, int(ps/3.), self.cornerColor,
-                               -1, CV_AA)
-
+        """Takes the newest frame and renders it at once."""
+        self.isFrameDirty = True
+        self.renderView()
+
+    def renderView(self, takeFrame=True):
+        """Renders the view; with `takeFrame` it takes the newest frame if
+        one has come."""
+        self.isRenderPending = False
+        if self.isFrameDirty and takeFrame:
+            self.isFrameDirty = False
+            prevShape = self.img.shape
+            isNewFrame = self.getFrame()
+            if isNewFrame:
+                self.frameNumber += 1
+            if self.img.shape != prevShape and self.canTransform():
+                self.getTransform()  # the camera has changed its frame size
+            elif isNewFrame and self.tracker is not None:
+                self.trackCorners()
+        rectified = self.canTransform() and self.buttonStraightRect.isChecked()
+        canvas = self.plotCanvas
+        if rectified:
+            dataSize = tuple(self.boundingRect[2:4])
+            canvas.setDataSize(dataSize)
+            window, size = self.displayWindow(dataSize)
         else:
-            overlay = self.img.copy()
-            ps = self.img.shape[0] * 0.02
-
-            # beam position mark + text:
-            if self.plotCanvas.isBeamPositionVisible:
-                beamPos = tuple(self.plotCanvas.beamPos)
-#                beamMarkTextPos = (beamPos[0]+10, beamPos[1]+20)
-                cv2.circle(
-                    overlay, beamPos,
-                    int(ps), self.beamMarkColor, int(ps/3.), CV_AA)
-                # cv2.putText(
-                #     overlay, 'beam', beamMarkTextPos,
-                #     cv2.FONT_HERSHEY_SIMPLEX, 0.75, self.beamMarkColor, 1)
-
-            # rectangle corners:
-            if self.plotCanvas.isRectVisible:
-                for icorner, corner in enumerate(self.buttonBaseRect.corners):
-                    if corner is None:
-                        continue
-                    color = self.cornerColor
-                    if self.buttonBaseRect.isChecked():
-                        if icorner == self.buttonBaseRect.currentDefCorner:
-                            color = self.currentCornerColor
-                    cv2.circle(overlay, corner, int(ps/3.), color, -1, CV_AA)
-
-        alpha = 0.75  # transparency factor
-        imageNew = cv2.addWeighted(overlay, alpha, self.img, 1-alpha, 0)
-        self.plotCanvas.imshow(imageNew)
+            dataSize = self.img.shape[1::-1]
+            canvas.setDataSize(dataSize)
+            window, size = self.displayWindow(dataSize)
+        dataShape = dataSize[::-1]
+        key = self.overlayKey(size[::-1] + self.img.shape[2:], rectified,
+                              window)
+        renderKey = (self.frameNumber, key, self.calibration if rectified
+                     else None, canvas.isRectifiedSmooth)
+        if renderKey == self.renderedKey:  # nothing has changed
+            return
+        self.renderedKey = renderKey
+
+        stats = self.stats
+        t = time.time()
+        self.pyramid.setFrame(self.img)
+        if rectified:
+            # the rectified view has about one pixel per image pixel:
+            level, img = self.pyramid.level(
+                self.pyramid.levelOf(size[0] / float(window[2])))
+            img = self.rectify(img, window, size, level)
+            t = stats.lap('rectify', t)
+        else:
+            img = self.pyramid.window(window, size)
+        if self.overlay.needsRebuild(key):
+            self.overlay.begin(key, img.shape, window)
+            if rectified:
+                self.drawRectifiedOverlay(dataShape)
+            else:
+                self.drawImageOverlay(dataShape)
+            self.drawWellOverlay(dataShape, rectified, window)
+            self.drawTourOverlay(dataShape, rectified)
+            self.overlay.end()
+            t = stats.lap('overlay', t)
+        # the raw frame and its levels are kept for getTransform and the next
+        # renders, a remapped or resampled image is ours
+        img = self.overlay.blend(img, inplace=not self.pyramid.isCached(img))
+        t = stats.lap('blend', t)
+        x, y, w, h = window
+        canvas.imshow(img, (x-0.5, x+w-0.5, y+h-0.5, y-0.5))
+        stats.lap('draw', t)
+        if renderKey[0] != self.shownFrameNumber:
+            self.shownFrameNumber = renderKey[0]
+            stats.frameShown(self.grabber.latestTime)
+
+    def displayWindow(self, dataSize):
+        """The part of the data of `dataSize` to render, (x, y, width,
+        height) in data pixels, and its output size (width, height). This is
+        the visible part of the canvas, aligned to `windowStep` pixels, at the
+        screen resolution rounded up to a power of sqrt(2) and with at most
+        `maxPixels` output pixels."""
+        w, h = dataSize
+        (x0, x1, y0, y1) = self.plotCanvas.viewRegion()
+        pw, ph = self.plotCanvas.viewPixels()
+        scale = max(pw / max(x1-x0, 1e-3), ph / max(y1-y0, 1e-3))
+        step = self.windowStep
+        ix0 = int(min(max(np.floor((x0+0.5) / step) * step, 0), w-1))
+        iy0 = int(min(max(np.floor((y0+0.5) / step) * step, 0), h-1))
+        ix1 = int(min(max(np.ceil((x1+0.5) / step) * step, ix0+1), w))
+        iy1 = int(min(max(np.ceil((y1+0.5) / step) * step, iy0+1), h))
+        rw, rh = ix1 - ix0, iy1 - iy0
+        if 0 < scale < 1:
+            scale = 2 ** (np.ceil(np.log2(scale) * 2) / 2)
+        scale = min(scale, 1., (self.maxPixels / float(rw*rh))**0.5)
+        size = max(int(round(rw*scale)), 1), max(int(round(rh*scale)), 1)
+        return (ix0, iy0, rw, rh), size
+
+    def overlayKey(self, shape, rectified, window=None):
+        """Everything the overlay markers depend on."""
+        canvas = self.plotCanvas
+        key = [shape, rectified, window, canvas.isBeamPositionVisible,
+               canvas.isRectVisible]
+        if rectified:
+            key += [self.zoom, tuple(self.targetRect),
+                    tuple(self.beamPosRectified)]
+        else:
+            key += [tuple(canvas.beamPos), tuple(self.buttonBaseRect.corners),
+                    self.buttonBaseRect.isChecked(),
+                    self.buttonBaseRect.currentDefCorner,
+                    self.tracker is not None and self.tracker.isLost]
+        if self.wellMap is not None and canvas.isWellsVisible and \
+                self.canTransform():
+            key += [self.wellMap, self.calibration]
+        executor = self.motion.executor
+        if executor.targets and self.canTransform():
+            key += [tuple(executor.targets), executor.position,
+                    executor.current]
+        return tuple(key)
+
+    def drawRectifiedOverlay(self, shape):
+        overlay = self.overlay
+        ps = shape[0] * 0.02
+
+        # grid:
+        grid = np.arange(-10, 10) * 10 * self.zoom
+        xgrid = [int(self.targetRect[0][0] + g) for g in grid]
+        ygrid = [int(self.targetRect[0][1] + g) for g in grid]
+        for xg in xgrid:
+            overlay.line((xg, ygrid[0]), (xg, ygrid[-1]), self.gridColor, 2)
+        for yg in ygrid:
+            overlay.line((xgrid[0], yg), (xgrid[-1], yg), self.gridColor, 2)
+
+        # beam position mark:
+        if self.plotCanvas.isBeamPositionVisible:
+            overlay.circle(
+                tuple(int(p) for p in self.beamPosRectified),
+                int(ps*0.75), self.beamMarkColor, int(ps/3.), CV_AA)
+
+        # rectangle corners:
+        if self.plotCanvas.isRectVisible:
+            for corner in self.targetRect:
+                overlay.circle(corner, int(ps/3.), self.cornerColor, -1,
+                               CV_AA)
+
+    def drawImageOverlay(self, shape):
+        overlay = self.overlay
+        ps = shape[0] * 0.02
+
+        # beam position mark + text:
+        if self.plotCanvas.isBeamPositionVisible:
+            beamPos = tuple(self.plotCanvas.beamPos)
+#            beamMarkTextPos = (beamPos[0]+10, beamPos[1]+20)
+            overlay.circle(
+                beamPos, int(ps), self.beamMarkColor, int(ps/3.), CV_AA)
+            # cv2.putText(
+            #     overlay, 'beam', beamMarkTextPos,
+            #     cv2.FONT_HERSHEY_SIMPLEX, 0.75, self.beamMarkColor, 1)
+
+        # rectangle corners:
+        if self.plotCanvas.isRectVisible:
+            for icorner, corner in enumerate(self.buttonBaseRect.corners):
+                if corner is None:
+                    continue
+                color = self.cornerColor
+                if self.tracker is not None and self.tracker.isLost:
+                    color = self.lostCornerColor
+                if self.buttonBaseRect.isChecked():
+                    if icorner == self.buttonBaseRect.currentDefCorner:
+                        color = self.currentCornerColor
+                overlay.circle(corner, int(ps/3.), color, -1, CV_AA)
+
+    def drawWellOverlay(self, shape, rectified, window):
+        """The wells of the well map within `window` of the view. Only
+        the wells of the window are taken from the map, the wells smaller
+        than two pixels of the layer are drawn as dots."""
+        wellMap = self.wellMap
+        calib = self.calibration
+        if wellMap is None or not self.plotCanvas.isWellsVisible or \
+                not self.canTransform() or calib is None:
+            return
+        x, y, w, h = window
+        corners = np.float64(
+            [(x, y), (x+w, y), (x+w, y+h), (x, y+h)]) - 0.5
+        r = wellMap.diameter * 0.5
+        if rectified or calib.inFront(corners).all():
+            corners = self.plateToWells(calib.toPlate(corners, rectified))
+            (x0, y0), (x1, y1) = corners.min(axis=0), corners.max(axis=0)
+            wells = wellMap.inRect(x0-r, y0-r, x1+r, y1+r)
+        else:  # the horizon is in the view
+            wells = np.arange(len(wellMap))
+        plate = self.wellsToPlate(wellMap.centers[wells])
+        if not rectified:
+            plate = plate[calib.inFront(calib.plateToRectified(plate), True)]
+        points = calib.fromPlate(plate, rectified)
+        radii = np.hypot(*(calib.fromPlate(plate + (r, 0), rectified) -
+                           points).T)
+        inside = ((points[:, 0] + radii > x - 0.5) &
+                  (points[:, 0] - radii < x + w - 0.5) &
+                  (points[:, 1] + radii > y - 0.5) &
+                  (points[:, 1] - radii < y + h - 0.5))
+        points, radii = points[inside], radii[inside]
+        isDot = radii * self.overlay.scale[0] < 2
+        self.overlay.dots(points[isDot], self.wellColor)
+        self.overlay.rings(points[~isDot], radii[~isDot], self.wellColor, 1,
+                           CV_AA)
+
+    def drawTourOverlay(self, shape, rectified):
+        """The queued tour targets, at the plate points that they would
+        bring to the beam, joined in their order."""
+        executor = self.motion.executor
+        # before the first getTransform() there is no calibration yet:
+        if not executor.targets or not self.canTransform() or \
+                self.calibration is None:
+            return
+        overlay = self.overlay
+        ps = shape[0] * 0.02
+        position = executor.position
+        points = []
+        for target in executor.targets:
+            offset = [0 if t is None or p is None else t - p
+                      for t, p in zip(target[:2], position)]
+            points.append(tuple(self.calibration.fromPlate(
+                self.beamOffsetToPlate(*offset), rectified)))
+        for pt1, pt2 in zip(points[:-1], points[1:]):
+            overlay.line(pt1, pt2, self.tourColor, 1, CV_AA)
+        for target, point in zip(executor.targets, points):
+            color = self.currentTourColor if target == executor.current \
+                else self.tourColor
+            overlay.circle(point, int(ps*0.5), color, int(ps/4.), CV_AA)
 
     def canTransform(self):
         return ((None not in self.buttonBaseRect.corners) and
                 self.buttonScaleX.scale > 0 and self.buttonScaleY.scale > 0)
 
     def getTransform(self):
-        dY2, dX2 = self.img.shape[:2]
-        dX, dY = self.buttonScaleX.scale, self.buttonScaleY.scale
-        self.zoom = dX2 / dX
-        dX = int(dX * self.zoom)
-        dY = int(dY * self.zoom)
-        pIn = self.buttonBaseRect.corners
-        pOut = [(0, 0), (dX, 0), (dX, dY), (0, dY)]
-        self.perspectiveTransform1 = cv2.getPerspectiveTransform(
-            np.float32(pIn), np.float32(pOut))
-
-        inCorners = [[(0, 0), (dX2, 0), (dX2, dY2), (0, dY2)]]
-        outCorners = cv2.perspectiveTransform(
-            np.float32(inCorners), self.perspectiveTransform1)
-        self.boundingRect = cv2.boundingRect(outCorners)
-        self.beamPosRectified = self.transformPoint(self.plotCanvas.beamPos)
-        self.targetRect = [(x-self.boundingRect[0], y-self.boundingRect[1])
-                           for x, y in pOut]
-        self.perspectiveTransform2 = cv2.getPerspectiveTransform(
-            np.float32(pIn), np.float32(self.targetRect))
+        """Makes the calibration of the current corners, scales and beam
+        position. An unchanged calibration is kept, a calibration computed
+        before is read from the cache, which keeps the stored calibrations
+        and the current one."""
+        args = (self.buttonBaseRect.corners, self.buttonScaleX.scale,
+                self.buttonScaleY.scale, self.plotCanvas.beamPos,
+                self.img.shape[1::-1])
+        key = calibrationKey(*args)
+        if self.calibration is None or self.calibration.key != key:
+            stored = self.storedCalibrationKeys()
+            if self.calibration is not None and \
+                    self.calibration.key in stored:
+                self.cacheCalibration()  # with its view maps by now
+            mapCache.setKeys(self.section('rectangle'), stored | set([key]))
+            state = mapCache.load(key)
+            self.calibration = PlateCalibration(*args, state=state)
+            if state is None:
+                self.cacheCalibration()
+            else:
+                self.cachedStateKey = self.stateKey()
+        self.copyTransforms()
+        self.updateCameraRoi()
+        if self.tracker is not None:
+            self.tracker.reset(self.img, self.buttonBaseRect.corners)
+
+    def stateKey(self):
+        calib = self.calibration
+        return calib.key, frozenset(calib.stateMapKeys())
+
+    def storedCalibrationKeys(self):
+        """The keys of the stored calibrations for the current frames."""
+        imageSize = self.img.shape[1::-1]
+        keys = set()
+        for name in self.calibrations.names():
+            values = self.calibrations.load(name)
+            if None not in values['corners']:
+                keys.add(calibrationKey(
+                    values['corners'], values['scalex'], values['scaley'],
+                    values['pos'], imageSize))
+        return keys
+
+    def cacheCalibration(self):
+        """Saves the transforms and the remap tables of the reset view of
+        the calibration into the cache if they have changed since the last
+        save. It runs when the calibration is replaced and on closing, never
+        while rendering. A tracked calibration is not cached, it does not
+        match its key."""
+        if self.calibration.isTracked:
+            return
+        stateKey = self.stateKey()
+        if stateKey != self.cachedStateKey:
+            self.cachedStateKey = stateKey
+            mapCache.save(self.calibration.key, self.calibration.state())
+
+    def calibrationName(self):
+        """The name of the current stored calibration, may be empty."""
+        return getOption(self.section('rectangle'), 'calibration')
+
+    def saveCalibrationAs(self):
+        """Stores the current calibration under a name, as a new version
+        if the name exists, see `CalibrationStore`."""
+        name, ok = qt.QInputDialog.getText(
+            self, 'Save the calibration', 'name:', qt.QLineEdit.Normal,
+            self.calibrationName())
+        if not ok:
+            return
+        name = u'{0}'.format(name).strip()
+        try:
+            self.calibrations.save(
+                name, self.buttonBaseRect.corners, self.buttonScaleX.scale,
+                self.buttonScaleY.scale, self.plotCanvas.beamPos)
+        except ValueError as e:
+            qt.QMessageBox.critical(self, 'Save the calibration', str(e))
+            return
+        config.set(self.section('rectangle'), 'calibration', name)
+        write_config()
+
+    def switchCalibration(self, name):
+        """Makes the stored calibration `name` current."""
+        values = self.calibrations.load(name)
+        self.buttonBaseRect.corners = [tuple(c) for c in values['corners']]
+        self.buttonScaleX.scale = values['scalex']
+        self.editScaleX.setValue(values['scalex'])
+        self.buttonScaleY.scale = values['scaley']
+        self.editScaleY.setValue(values['scaley'])
+        self.plotCanvas.beamPos[:] = values['pos']
+        rectangle = self.section('rectangle')
+        config.set(rectangle, 'corners', str(self.buttonBaseRect.corners))
+        config.set(rectangle, 'scalex', str(values['scalex']))
+        config.set(rectangle, 'scaley', str(values['scaley']))
+        config.set(rectangle, 'calibration', name)
+        config.set(self.section('beam'), 'pos', str(self.plotCanvas.beamPos))
+        write_config()
+        self.buttonStraightRect.update()
+        self.requestRender()
+
+    def removeCalibration(self):
+        name = self.calibrationName()
+        reply = qt.QMessageBox.question(
+            self, 'Confirm',
+            u'Do you really want to delete the calibration {0}?'.format(name),
+            qt.QMessageBox.Yes | qt.QMessageBox.No, qt.QMessageBox.No)
+        if reply == qt.QMessageBox.No:
+            return
+        self.calibrations.remove(name)
+        config.set(self.section('rectangle'), 'calibration', '')
+        write_config()
+
+    def copyTransforms(self):
+        calib = self.calibration
+        self.zoom = calib.zoom
+        self.perspectiveTransform1 = calib.perspectiveTransform1
+        self.perspectiveTransform2 = calib.perspectiveTransform2
+        self.boundingRect = calib.boundingRect
+        self.beamPosRectified = calib.beamPosRectified
+        self.targetRect = calib.targetRect
+
+    def setTracking(self, on):
+        """Follows the reference corners in the new frames by
+        `PlateTracker.CornerTracker`. The tracked corners are saved when the
+        tracking stops."""
+        on = on and self.canTransform()
+        if on and self.tracker is None:
+            self.tracker = CornerTracker()
+            self.tracker.reset(self.img, self.buttonBaseRect.corners)
+        elif not on and self.tracker is not None:
+            self.tracker = None
+            self.saveCorners()
+        self.plotCanvas.actionTrack.setChecked(on)
+        section = self.section('rectangle')
+        if getOption(section, 'tracking') != ('on' if on else 'off'):
+            config.set(section, 'tracking', 'on' if on else 'off')
+            write_config()
+        self.requestRender()
+
+    def trackCorners(self):
+        """Moves the calibration to the corners tracked in the new frame;
+        when the tracker is lost the last calibration stays."""
+        if self.buttonBaseRect.isChecked():  # the corners are being defined
+            return
+        t0 = time.time()
+        corners = self.tracker.track(self.img)
+        self.stats.lap('track', t0)
+        if corners is None or np.abs(
+                corners - self.buttonBaseRect.corners).max() < \
+                self.trackingTolerance:
+            return
+        self.buttonBaseRect.corners = [
+            (round(float(x), 2), round(float(y), 2)) for x, y in corners]
+        self.calibration.updateCorners(self.buttonBaseRect.corners)
+        self.copyTransforms()
+
+    def saveCorners(self):
+        config.set(self.section('rectangle'), 'corners',
+                   str(self.buttonBaseRect.corners))
+        write_config()
+
+    def rectify(self, img, window=None, size=None, level=0):
+        """Rectifies the raw frame `img` with the remap tables cached per
+        calibration. This is equivalent to `cv2.warpPerspective()` with
+        `perspectiveTransform2` but doesn't invert the homography for every
+        pixel on every frame. Only the part `window` (x, y, width, height)
+        of the rectified view is made, resampled to `size` (width, height);
+        the default is the whole view. `img` may be the frame downscaled by
+        2**`level`. While the plate is tracked, the calibration changes with
+        the frames and the tables would serve one frame only, the window is
+        then warped directly."""
+        nearest = not self.plotCanvas.isRectifiedSmooth
+        if window is not None and self.tracker is not None:
+            return cv2.warpPerspective(
+                img, self.calibration.windowTransform(window, size, level),
+                tuple(size),
+                flags=cv2.INTER_NEAREST if nearest else cv2.INTER_LINEAR)
+        if window is None:
+            map1, map2 = self.calibration.rectifyMaps(nearest)
+        else:
+            map1, map2 = self.calibration.windowMaps(
+                window, size, nearest, level)
+        return cv2.remap(
+            img, map1, map2,
+            cv2.INTER_NEAREST if nearest else cv2.INTER_LINEAR)
+
+    def toPlate(self, points):
+        """Plate mm of displayed points, which are image or rectified view
+        points depending on the 'check' button."""
+        return self.calibration.toPlate(
+            points, self.buttonStraightRect.isChecked())
+
+    def formatCoordinates(self, x, y, well=None):
+        """The coordinate readout for the image point (x, y), the centre of
+        the `well` if given."""
+        if self.canTransform():
+            x0, y0 = self.toPlate((x, y))
+            wellText = '' if well is None else u', well {0}'.format(well)
+            if not self.buttonStraightRect.isChecked():
+                return u'image: x={0:.1f} px, y={1:.1f} px\nplate: '\
+                    'x={2:.2f} mm, y={3:.2f} mm{4}'.format(
+                        x, y, x0, y0, wellText)
+            else:
+                return u'plate: x={0:.2f} mm, y={1:.2f} mm{2}'.format(
+                    x0, y0, wellText)
+        else:
+            return u'image: x={0:.1f}, y={1:.1f}'.format(x, y)
+
+    def beamOffset(self, x0, y0):
+        """The motion of the motors that brings the plate point (x0, y0) mm
+        to the beam."""
+        return -x0, y0
+
+    def beamOffsetToPlate(self, dx, dy):
+        """The plate point (mm) that the motion (dx, dy) brings to the beam,
+        the inverse of `beamOffset()`."""
+        return -dx, dy
+
+    def wellsToPlate(self, points):
+        """Plate mm of the well map points, which are in mm from the first
+        reference corner."""
+        return np.asarray(points, dtype=np.float64) + \
+            self.calibration.rectifiedToPlate(self.targetRect[0])
+
+    def plateToWells(self, points):
+        return np.asarray(points, dtype=np.float64) - \
+            self.calibration.rectifiedToPlate(self.targetRect[0])
+
+    def snapToWell(self, point):
+        """The displayed centre and the name of the well nearest to the
+        displayed `point`, or `point` and None if there is no well within
+        the well spacing or the snapping is off."""
+        if self.wellMap is None or not self.plotCanvas.isSnappedToWells or \
+                not self.canTransform():
+            return point, None
+        wellPoint = self.plateToWells(self.toPlate(point))
+        if not np.all(np.isfinite(wellPoint)):
+            return point, None
+        iwell = self.wellMap.nearest(wellPoint, self.wellMap.spacing)
+        if iwell is None:
+            return point, None
+        center = self.calibration.fromPlate(
+            self.wellsToPlate(self.wellMap.centers[iwell]),
+            self.buttonStraightRect.isChecked())
+        return tuple(center), self.wellMap.names[iwell]
+
+    def setWellMap(self, layout):
+        """Loads the well map `layout`, see `makeWellMap()`, and keeps it
+        in the config. A map that cannot be loaded leaves no map and a
+        message in the coordinate readout."""
+        section = self.section('wells')
+        try:
+            self.wellMap = makeWellMap(section, layout)
+        except (IOError, ValueError) as e:
+            self.wellMap = None
+            self.toolbar.set_message('no well map: {0}'.format(e))
+            self.requestRender()
+            return
+        if getOption(section, 'layout') != layout:
+            config.set(section, 'layout', layout)
+            write_config()
+        self.requestRender()
+
+    def importWellMap(self):
+        """Loads a well map from a CSV file of the well centres, see
+        `WellMap.fromCSV()`."""
+        fileName = qt.QFileDialog.getOpenFileName(
+            self, 'Load the well map', '', 'CSV files (*.csv *.txt)')
+        if isinstance(fileName, tuple):  # Qt5
+            fileName = fileName[0]
+        if fileName:
+            self.setWellMap(fileName)
+
+    def addToTour(self, point):
+        """Queues the stage position that brings the displayed `point` to the
+        beam. The target is relative to the stage position read now, off the
+        GUI thread: the position cached by the executor is not updated by
+        the moves made outside of it."""
+        x0, y0 = self.toPlate(point)
+        self.motion.executor.addRelativeTarget(self.beamOffset(x0, y0))
+
+    def importTour(self):
+        """Queues the stage positions of a CSV file: x, y and optionally the
+        dwell time (s) per line, in the motor units; '#' starts a
+        comment."""
+        fileName = qt.QFileDialog.getOpenFileName(
+            self, 'Import the tour', '', 'CSV files (*.csv *.txt)')
+        if isinstance(fileName, tuple):  # Qt5
+            fileName = fileName[0]
+        if not fileName:
+            return
+        rows = []
+        try:
+            with open(fileName) as f:
+                for iline, line in enumerate(f, 1):
+                    line = line.split('#')[0].strip()
+                    if not line:
+                        continue
+                    row = [float(v) for v in line.split(',')]
+                    if len(row) not in (2, 3):
+                        raise ValueError(
+                            'line {0}: expected x, y[, dwell]'.format(iline))
+                    rows.append(row)
+        except (IOError, ValueError) as e:
+            qt.QMessageBox.critical(self, 'Import the tour', str(e))
+            return
+        for row in rows:
+            dwell = row[2] if len(row) > 2 else None
+            self.motion.executor.addTarget((row[0], row[1]), dwell)
+
+    def motionChanged(self):
+        executor = self.motion.executor
+        error = executor.lastError
+        if error is not None and error is not self.reportedMotionError:
+            self.reportedMotionError = error
+            if self.scheduler.focusPane is self:
+                qt.QMessageBox.critical(
+                    self, 'Motion has failed', errorText(error))
+        items = []
+        if executor.state != 'idle':
+            items.append(executor.state)
+        if executor.current is not None:
+            items.append('tour, {0} points left'.format(
+                len(executor.targets)))
+        elif executor.targets:
+            items.append('{0} tour points queued'.format(
+                len(executor.targets)))
+        position = ['{0:.3f}'.format(p) for p in executor.position
+                    if p is not None]
+        if items and position:
+            items.append('stage at ' + ', '.join(position) + ' mm')
+        self.motionLabel.setText(' | '.join(items))
+        self.motionLabel.setVisible(bool(items))
+        self.requestRender()  # the tour marks follow the stage
+
+    def cursorLabel(self, x, y, well=None):
+        """The label at the cursor crosshair for the image point (x, y),
+        the centre of the `well` if given."""
+        if not self.canTransform():
+            return u'{0:.0f}, {1:.0f} px'.format(x, y)
+        x0, y0 = self.toPlate((x, y))
+        label = u'{0:.2f}, {1:.2f} mm\nmove {2:+.2f}, {3:+.2f} mm'.format(
+            x0, y0, *self.beamOffset(x0, y0))
+        return label if well is None else u'well {0}: {1}'.format(well, label)
 
     def transformPoint(self, p):
-        outPoint = cv2.perspectiveTransform(
-            np.float32([[p]]), self.perspectiveTransform1)
-        return (outPoint[0][-1][0]-self.boundingRect[0],
-                outPoint[0][-1][1]-self.boundingRect[1])
+        """Image point -> rectified view point."""
+        return tuple(self.calibration.imageToRectified(p))
+
+
+class MultiOrthoView(qt.QWidget):
+    """Several camera panes side by side in one window with one
+    `RenderScheduler`. *names* are the pane names, the default is `cameras`
+    of the [view] section of OrthoView.ini; *kind*, *fileName* and *rate*
+    override the sources of all panes as in `makeFrameSource()`."""
+
+    def __init__(self, parent=None, names=None, canvas=None, kind=None,
+                 fileName=None, rate=None):
+        super(MultiOrthoView, self).__init__(parent)
+        self.setWindowTitle('OrthoView')
+        if names is None:
+            names = paneNames()
+        self.scheduler = RenderScheduler()
+        splitter = qt.QSplitter()
+        self.panes = []
+        for name in names:
+            source = makeFrameSource(kind, fileName, rate,
+                                     paneSection('camera', name))
+            pane = OrthoView(canvas=canvas, source=source, name=name,
+                             scheduler=self.scheduler)
+            splitter.addWidget(pane)
+            self.panes.append(pane)
+        layout = qt.QHBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.addWidget(splitter)
+
+    def closeEvent(self, event):
+        for pane in self.panes:
+            pane.close()
+        super(MultiOrthoView, self).closeEvent(event)
+
+
+def paneNames():
+    """The camera panes of the [view] section, e.g. `cameras = top, side`;
+    empty for the single view."""
+    return [name.strip() for name in getOption('view', 'cameras').split(',')
+            if name.strip()]
 
 
 if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description='OrthoView')
+    parser.add_argument(
+        '--canvas', choices=('mpl', 'qimage'), default=None,
+        help='display widget: matplotlib or a plain QImage painter '
+        '(default from OrthoView.ini)')
+    parser.add_argument(
+        '--source', choices=('tango', 'image', 'replay', 'synthetic'),
+        default=None, help='frame source (default from OrthoView.ini)')
+    parser.add_argument(
+        '--file', default=None,
+        help='image, .npy frame stack or video for the image and replay '
+        'sources')
+    parser.add_argument(
+        '--rate', type=float, default=None,
+        help='frames per second of the replay and synthetic sources, 0 for '
+        'as fast as possible')
+    parser.add_argument(
+        '--cameras', nargs='+', default=None, metavar='NAME',
+        help='camera panes in one window, with their own config sections '
+        '(default from OrthoView.ini)')
+    args, qtArgs = parser.parse_known_args()
+
     if isTest:
-        app = qt.QApplication(sys.argv)
+        app = qt.QApplication(sys.argv[:1] + qtArgs)
     else:
         from taurus.qt.qtgui.application import TaurusApplication
-        app = TaurusApplication(sys.argv)
+        app = TaurusApplication(sys.argv[:1] + qtArgs)
     icon = qt.QIcon(os.path.join(selfDir, '_static', 'orthoview.ico'))
     app.setWindowIcon(icon)
 
-    window = OrthoView()
+    names = paneNames() if args.cameras is None else args.cameras
+    if names:
+        window = MultiOrthoView(names=names, canvas=args.canvas,
+                                kind=args.source, fileName=args.file,
+                                rate=args.rate)
+    else:
+        window = OrthoView(canvas=args.canvas, source=makeFrameSource(
+            args.source, args.file, args.rate))
     window.show()
     sys.exit(app.exec_())
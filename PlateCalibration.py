@@ -0,0 +1,267 @@
+# -*- coding: utf-8 -*-
+"""
+PlateCalibration
+================
+
+The transforms between three coordinate systems of OrthoView:
+
+- image: pixels of the camera frame;
+- rectified: pixels of the orthogonal (rectified) view of the target plane;
+- plate: millimetres in the target plane relative to the beam position, x to
+  the right and y down as in the images.
+
+The calibration is defined by the image positions of the four corners of a
+rectangle in the plate plane, the rectangle size in mm and the beam position
+in the image. All point transforms are vectorized: they accept a single
+point (x, y) or any array of points with the last dimension of 2 and return
+an array of the same shape.
+
+"""
+
+__author__ = "Konstantin Klementiev"
+__versioninfo__ = (1, 0, 0)
+__version__ = '.'.join(map(str, __versioninfo__))
+__license__ = "MIT license"
+
+import hashlib
+import numpy as np
+import cv2
+
+stateFormat = 1  # of `PlateCalibration.state()`, a new format drops the caches
+
+
+def applyHomography(transform, points):
+    """Applies the 3x3 projective `transform` to an array of points."""
+    pts = np.asarray(points, dtype=np.float64)
+    flat = pts.reshape(-1, 2)
+    xyw = flat.dot(transform[:, :2].T) + transform[:, 2]
+    return (xyw[:, :2] / xyw[:, 2:]).reshape(pts.shape)
+
+
+def perspectiveRemapMaps(transform, size, nearest=False):
+    """Returns fixed-point maps for `cv2.remap()` that reproduce
+    `cv2.warpPerspective()` with `transform` into an output image of `size`
+    (width, height). With `nearest` the maps are rounded for
+    `cv2.INTER_NEAREST`, the second map is then None."""
+    w, h = size
+    xs, ys = np.meshgrid(np.arange(w, dtype=np.float32),
+                         np.arange(h, dtype=np.float32))
+    xy = cv2.perspectiveTransform(np.dstack((xs, ys)),
+                                  np.linalg.inv(transform))
+    xy[~np.isfinite(xy)] = -1  # the horizon line of the transform
+    return cv2.convertMaps(xy, None, cv2.CV_16SC2, nninterpolation=nearest)
+
+
+def calibrationKey(corners, scalex, scaley, beamPos, imageSize):
+    """A hash of the calibration input, names its cached state."""
+    text = repr(([tuple(float(v) for v in c) for c in corners],
+                 float(scalex), float(scaley),
+                 tuple(float(v) for v in beamPos),
+                 tuple(int(v) for v in imageSize), stateFormat))
+    return hashlib.sha1(text.encode('ascii')).hexdigest()[:16]
+
+
+class PlateCalibration(object):
+    """`corners` are the image points of the rectangle corners in the order
+    top-left, top-right, bottom-right, bottom-left; `scalex` and `scaley`
+    are the rectangle sides in mm; `beamPos` is the image point of the beam;
+    `imageSize` is (width, height) of the camera frames. The rectified view
+    has the same number of pixels per mm along the rectangle as the image
+    width per the rectangle width. `state` is a `state()` of the same
+    calibration, e.g. read from `CalibrationStore.MapCache`, which is taken
+    instead of computing the transforms."""
+
+    maxExtent = 10
+    maxCachedMaps = 8
+    maxStateMaps = 2
+
+    def __init__(self, corners, scalex, scaley, beamPos, imageSize,
+                 state=None):
+        self.corners = [tuple(c) for c in corners]
+        self.scalex, self.scaley = scalex, scaley
+        self.beamPos = tuple(beamPos)
+        self.imageSize = tuple(imageSize)
+        self.key = calibrationKey(self.corners, scalex, scaley, self.beamPos,
+                                  self.imageSize)
+        self.remapMaps = {}
+        self.mapOrder = []  # the keys of remapMaps, the last used last
+        self.isTracked = False  # moved by updateCorners()
+        if state is not None and str(state['key']) == self.key:
+            self.restore(state)
+            return
+
+        dX2, dY2 = self.imageSize
+        self.zoom = dX2 / float(scalex)  # rectified pixels per mm
+        dX = int(scalex * self.zoom)
+        dY = int(scaley * self.zoom)
+        pIn = np.float32(self.corners)
+        pOut = [(0, 0), (dX, 0), (dX, dY), (0, dY)]
+        self.perspectiveTransform1 = cv2.getPerspectiveTransform(
+            pIn, np.float32(pOut))
+
+        inCorners = [[(0, 0), (dX2, 0), (dX2, dY2), (0, dY2)]]
+        outCorners = cv2.perspectiveTransform(
+            np.float32(inCorners), self.perspectiveTransform1)
+        # with a steep perspective or a badly placed corner the image corners
+        # go far away or behind the horizon; the view is limited to
+        # `maxExtent` image sizes around the rectangle
+        limit = self.maxExtent * max(dX2, dY2)
+        outCorners[~np.isfinite(outCorners)] = 0
+        outCorners = np.clip(outCorners, [-limit, -limit],
+                             [dX + limit, dY + limit]).astype(np.float32)
+        self.boundingRect = cv2.boundingRect(outCorners)
+        self.targetRect = [(x-self.boundingRect[0], y-self.boundingRect[1])
+                           for x, y in pOut]
+        # image -> rectified, i.e. with the origin at the bounding rect:
+        self.perspectiveTransform2 = cv2.getPerspectiveTransform(
+            pIn, np.float32(self.targetRect))
+        self.inverseTransform2 = np.linalg.inv(self.perspectiveTransform2)
+        self.beamPosRectified = tuple(self.imageToRectified(self.beamPos))
+
+    def stateMapKeys(self):
+        """The keys of the remap tables kept in `state()`: the last used
+        `maxStateMaps` ones of the whole rectified view, i.e. of the view
+        after a reset, which is the first one shown."""
+        whole = (0, 0) + tuple(self.boundingRect[2:4])
+        keys = [key for key in self.mapOrder if key[0] == whole]
+        return keys[-self.maxStateMaps:]
+
+    def state(self):
+        """The computed transforms and the remap tables of `stateMapKeys()`
+        as a dict of arrays, for `PlateCalibration(..., state=)`."""
+        state = dict(key=np.array(self.key), zoom=np.array(self.zoom),
+                     perspectiveTransform1=self.perspectiveTransform1,
+                     perspectiveTransform2=self.perspectiveTransform2,
+                     inverseTransform2=self.inverseTransform2,
+                     boundingRect=np.array(self.boundingRect),
+                     targetRect=np.array(self.targetRect),
+                     beamPosRectified=np.array(self.beamPosRectified))
+        for i, mapKey in enumerate(self.stateMapKeys()):
+            window, size, nearest, level = mapKey
+            state['mapKey{0}'.format(i)] = np.array(
+                tuple(window) + tuple(size) + (nearest, level))
+            map1, map2 = self.remapMaps[mapKey]
+            state['map1_{0}'.format(i)] = map1
+            if map2 is not None:
+                state['map2_{0}'.format(i)] = map2
+        return state
+
+    def restore(self, state):
+        self.zoom = float(state['zoom'])
+        self.perspectiveTransform1 = state['perspectiveTransform1']
+        self.perspectiveTransform2 = state['perspectiveTransform2']
+        self.inverseTransform2 = state['inverseTransform2']
+        self.boundingRect = tuple(state['boundingRect'].tolist())
+        self.targetRect = [tuple(p) for p in state['targetRect'].tolist()]
+        self.beamPosRectified = tuple(state['beamPosRectified'].tolist())
+        i = 0
+        while 'mapKey{0}'.format(i) in state:
+            k = state['mapKey{0}'.format(i)].tolist()
+            mapKey = tuple(k[0:4]), tuple(k[4:6]), bool(k[6]), k[7]
+            self.remapMaps[mapKey] = (state['map1_{0}'.format(i)],
+                                      state.get('map2_{0}'.format(i)))
+            self.mapOrder.append(mapKey)
+            i += 1
+
+    def updateCorners(self, corners):
+        """Follows the rectangle moved in the image to `corners`, e.g. by
+        `PlateTracker`: the homographies and the rectified beam position
+        change, the rectified view (its size, zoom and the rectangle in it)
+        stays, so that the plate stays still in the rectified view. `key`
+        stays that of the calibration the rectified view comes from and
+        `isTracked` is set: a moved calibration is not the one of its
+        corners and is not to be cached."""
+        self.corners = [tuple(c) for c in corners]
+        self.isTracked = True
+        pIn = np.float32(self.corners)
+        self.perspectiveTransform2 = cv2.getPerspectiveTransform(
+            pIn, np.float32(self.targetRect))
+        x0, y0 = self.boundingRect[:2]
+        fromOrigin = np.array([[1, 0, x0], [0, 1, y0], [0, 0, 1]])
+        self.perspectiveTransform1 = fromOrigin.dot(self.perspectiveTransform2)
+        self.inverseTransform2 = np.linalg.inv(self.perspectiveTransform2)
+        self.beamPosRectified = tuple(self.imageToRectified(self.beamPos))
+        self.remapMaps = {}
+        self.mapOrder = []
+
+    def imageToRectified(self, points):
+        return applyHomography(self.perspectiveTransform2, points)
+
+    def rectifiedToImage(self, points):
+        return applyHomography(self.inverseTransform2, points)
+
+    def rectifiedToPlate(self, points):
+        return (np.asarray(points, dtype=np.float64) -
+                self.beamPosRectified) / self.zoom
+
+    def plateToRectified(self, points):
+        return (np.asarray(points, dtype=np.float64) * self.zoom +
+                self.beamPosRectified)
+
+    def imageToPlate(self, points):
+        return self.rectifiedToPlate(self.imageToRectified(points))
+
+    def plateToImage(self, points):
+        return self.rectifiedToImage(self.plateToRectified(points))
+
+    def toPlate(self, points, rectified=False):
+        """Plate mm of image or, if `rectified`, rectified view points."""
+        if rectified:
+            return self.rectifiedToPlate(points)
+        return self.imageToPlate(points)
+
+    def fromPlate(self, points, rectified=False):
+        if rectified:
+            return self.plateToRectified(points)
+        return self.plateToImage(points)
+
+    def inFront(self, points, rectified=False):
+        """True for the image or, if `rectified`, rectified view points on
+        the side of the horizon where the beam is; the homographies map the
+        points beyond the horizon too, as a mirrored image."""
+        if rectified:
+            row, beam = self.inverseTransform2[2], self.beamPosRectified
+        else:
+            row, beam = self.perspectiveTransform2[2], self.beamPos
+        w = np.asarray(points, dtype=np.float64).dot(row[:2]) + row[2]
+        return w * (np.dot(beam, row[:2]) + row[2]) > 0
+
+    def rectifyMaps(self, nearest=False):
+        """The remap tables of the whole rectified view."""
+        w, h = self.boundingRect[2:4]
+        return self.windowMaps((0, 0, w, h), (w, h), nearest)
+
+    def windowMaps(self, window, size, nearest=False, level=0):
+        """The remap tables of the part `window` (x, y, width, height) of the
+        rectified view, in rectified pixels, resampled to `size` (width,
+        height). The source is the image downscaled by 2**`level`, see
+        `OrthoView.FramePyramid`. The last `maxCachedMaps` used tables are
+        kept, the least recently used one is dropped for a new one."""
+        key = tuple(window), tuple(size), nearest, level
+        if key not in self.remapMaps:
+            while len(self.remapMaps) >= self.maxCachedMaps:
+                del self.remapMaps[self.mapOrder.pop(0)]
+            self.remapMaps[key] = perspectiveRemapMaps(
+                self.windowTransform(window, size, level), size, nearest)
+        if not self.mapOrder or self.mapOrder[-1] != key:
+            if key in self.mapOrder:
+                self.mapOrder.remove(key)
+            self.mapOrder.append(key)
+        return self.remapMaps[key]
+
+    def windowTransform(self, window, size, level=0):
+        """The homography from the pixels of the image downscaled by
+        2**`level` to the pixels of the part `window` (x, y, width, height)
+        of the rectified view resampled to `size` (width, height)."""
+        x, y, w, h = window
+        sx, sy = size[0] / float(w), size[1] / float(h)
+        # rectified pixel centres -> output pixel centres:
+        toWindow = np.array([[sx, 0, (0.5-x)*sx - 0.5],
+                             [0, sy, (0.5-y)*sy - 0.5],
+                             [0, 0, 1]])
+        # downscaled image pixel centres -> image pixel centres:
+        f = 2**level
+        fromLevel = np.array([[f, 0, 0.5*f - 0.5],
+                              [0, f, 0.5*f - 0.5],
+                              [0, 0, 1]])
+        return toWindow.dot(self.perspectiveTransform2).dot(fromLevel)
@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+"""
+PlateTracker
+============
+
+Follows the four reference corners of OrthoView from frame to frame, so that
+the calibration stays valid when the plate or the stage moves.
+
+Every corner is searched only in a small window around its previous
+position: first by pyramidal Lucas-Kanade optical flow from the previous
+frame, checked by the backward flow, and, if the flow fails, by matching the
+corner template taken at the calibration. The found point is refined to
+sub-pixel accuracy by `cv2.cornerSubPix`. The four windows are converted to
+gray separately, the full frame is never processed, so the cost per frame is
+fixed by `searchRadius` and does not depend on the frame size.
+
+A new position is accepted only if the corners still form a convex
+quadrangle with the side lengths changed by less than `maxSideChange`;
+otherwise the tracker is lost and looks for the templates around the last
+accepted corners on the next frames, in windows that grow up to
+`maxSearchGrowth` times.
+
+"""
+
+__author__ = "Konstantin Klementiev"
+__versioninfo__ = (1, 0, 0)
+__version__ = '.'.join(map(str, __versioninfo__))
+__license__ = "MIT license"
+
+import numpy as np
+import cv2
+
+
+class CornerTracker(object):
+    """`reset()` takes the frame and the corners of the calibration,
+    `track()` returns the corners in every next frame or None when lost."""
+
+    searchRadius = 24  # px, the largest motion between two frames
+    templateRadius = 12  # px, half side of the corner templates
+    flowWindow = 15  # px
+    flowLevels = 2
+    maxFlowError = 0.5  # px, forward-backward
+    minMatchScore = 0.7  # normalized correlation of the templates
+    subPixWindow = 4  # px, half side of the cornerSubPix window
+    maxSubPixShift = 3.  # px, farther from a click there is no corner
+    maxSideChange = 0.1  # relative, per frame
+    maxSearchGrowth = 8  # of searchRadius, when lost
+
+    def __init__(self):
+        self.corners = None
+        self.isLost = False
+        self.lostFrames = 0
+
+    @property
+    def cropRadius(self):
+        """Grows twice with every lost frame, up to `maxSearchGrowth`."""
+        growth = min(2**self.lostFrames, self.maxSearchGrowth)
+        return self.searchRadius*growth + self.templateRadius + \
+            self.subPixWindow
+
+    def crop(self, frame, center, radius):
+        """The gray part of `frame` within `radius` around `center` and its
+        origin in the frame."""
+        h, w = frame.shape[:2]
+        x, y = int(round(center[0])), int(round(center[1]))
+        x0, y0 = min(max(x - radius, 0), w), min(max(y - radius, 0), h)
+        x1, y1 = max(min(x + radius + 1, w), x0), max(min(y + radius + 1, h),
+                                                       y0)
+        patch = frame[y0:y1, x0:x1]
+        if patch.ndim == 3:
+            patch = cv2.cvtColor(patch, cv2.COLOR_RGB2GRAY)
+        return patch, np.float32([x0, y0])
+
+    def refine(self, gray, point):
+        """cornerSubPix of `point` in `gray`, or None if it is too close to
+        the edge of `gray`."""
+        r = self.subPixWindow
+        h, w = gray.shape[:2]
+        if not (r < point[0] < w - r - 1 and r < point[1] < h - r - 1):
+            return None
+        pt = np.array(point, dtype=np.float32).reshape(1, 1, 2)  # a copy
+        criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_COUNT, 20, 0.01)
+        cv2.cornerSubPix(gray, pt, (r, r), (-1, -1), criteria)
+        return pt.reshape(2)
+
+    def reset(self, frame, corners):
+        """Takes the corner templates and the sub-pixel offsets of the
+        clicked `corners` to the corner features of `frame`. The tracked
+        corners keep these offsets, so the calibration does not jump."""
+        self.corners = np.float32(corners).reshape(4, 2)
+        self.isLost = False
+        self.lostFrames = 0
+        self.templates, self.offsets, self.prevCrops = [], [], []
+        for corner in self.corners:
+            gray, origin = self.crop(frame, corner, self.cropRadius)
+            local = corner - origin
+            refined = self.refine(gray, local)
+            if refined is None or np.hypot(*(refined - local)) > \
+                    self.maxSubPixShift:
+                offset = None  # not a corner feature, no sub-pixel refining
+            else:
+                offset = refined - local
+            self.offsets.append(offset)
+            template, _ = self.crop(frame, corner, self.templateRadius)
+            self.templates.append(template)
+            self.prevCrops.append((gray, origin))
+
+    def flow(self, prevGray, gray, point):
+        """LK flow of `point` from `prevGray` to `gray` (the same window of
+        two frames) or None if the backward flow does not come back."""
+        win = (self.flowWindow, self.flowWindow)
+        p0 = np.float32(point).reshape(1, 1, 2)
+        p1, st, _ = cv2.calcOpticalFlowPyrLK(
+            prevGray, gray, p0, None, winSize=win, maxLevel=self.flowLevels)
+        if p1 is None or not st[0, 0]:
+            return None
+        pb, st, _ = cv2.calcOpticalFlowPyrLK(
+            gray, prevGray, p1, None, winSize=win, maxLevel=self.flowLevels)
+        if pb is None or not st[0, 0] or \
+                np.hypot(*(pb - p0).ravel()) > self.maxFlowError:
+            return None
+        return p1.reshape(2)
+
+    def match(self, gray, template):
+        """The centre of the best match of `template` in `gray` or None."""
+        th, tw = template.shape[:2]
+        if gray.shape[0] < th or gray.shape[1] < tw:
+            return None
+        res = cv2.matchTemplate(gray, template, cv2.TM_CCOEFF_NORMED)
+        _, score, _, loc = cv2.minMaxLoc(res)
+        if score < self.minMatchScore:
+            return None
+        return np.float32([loc[0] + (tw-1)*0.5, loc[1] + (th-1)*0.5])
+
+    def isPlausible(self, corners):
+        if not cv2.isContourConvex(corners.reshape(-1, 1, 2)):
+            return False
+        sides = np.hypot(*(np.roll(corners, -1, axis=0) - corners).T)
+        prevSides = np.hypot(
+            *(np.roll(self.corners, -1, axis=0) - self.corners).T)
+        return np.all(np.abs(sides / prevSides - 1) < self.maxSideChange)
+
+    def track(self, frame):
+        """The corners in `frame`, a (4, 2) array, or None when lost."""
+        if self.corners is None:
+            return None
+        found = []
+        for i, corner in enumerate(self.corners):
+            prevGray, prevOrigin = self.prevCrops[i]
+            gray, origin = self.crop(frame, corner, self.cropRadius)
+            point = None
+            if not self.isLost and gray.shape == prevGray.shape:
+                point = self.flow(prevGray, gray, corner - origin)
+            if point is None:
+                point = self.match(gray, self.templates[i])
+            if point is not None and self.offsets[i] is not None:
+                refined = self.refine(gray, point + self.offsets[i])
+                if refined is not None:
+                    point = refined - self.offsets[i]
+            if point is None:
+                break
+            found.append(point + origin)
+
+        if len(found) < 4 or not self.isPlausible(np.float32(found)):
+            self.isLost = True
+            self.lostFrames += 1
+            return None
+        self.isLost = False
+        self.lostFrames = 0
+        self.corners = np.float32(found)
+        # the next flow starts from the windows around the new corners:
+        self.prevCrops = [self.crop(frame, corner, self.cropRadius)
+                          for corner in self.corners]
+        return self.corners
@@ -1,17 +1,79 @@
 # -*- coding: utf-8 -*-
 """
 USBCamera class for a USB camera connected to a Raspberry Pi.
-The image is a device attribute of PyTango.DevULong type that packs 3 
-one-byte-long color channels. The client should unpack colors like this:
+The image is a device attribute of PyTango.DevULong type that packs 3
+one-byte-long color channels as described in `FrameCodec.py`, which has to be
+deployed together with this module. The client should unpack colors like this:
 
 ``
     frame = self.camera.read_attribute('Image').value
-    unpacked = np.empty(list(frame.shape)+[3], dtype=np.uint8)
-    unpacked[:, :, 2] = (frame >> 16) & 0xff
-    unpacked[:, :, 1] = (frame >> 8) & 0xff
-    unpacked[:, :, 0] = frame & 0xff
+    unpacked = FrameCodec.unpack(frame)  # RGB
 ``
 
+The same frame is also available compressed, as JPEG or lossless PNG, in the
+DevEncoded attribute encoded_image, see the properties `image_encoding` and
+`image_quality`. It is decoded by `FrameCodec.decode(*value)`.
+
+Frames are captured continuously by a capture thread every `capture_period`
+ms (0: as fast as the camera delivers) into a new buffer, which then replaces
+the current one. There is no double buffer to swap: Tango serializes an
+attribute value after the read method has returned, so a reused back buffer
+could still be held by a slow client. A buffer is never written again after
+it is published, and a read gets a whole frame. Attribute reads return the
+current buffer at once, without waiting for the camera, so several clients
+share one capture. The attributes frame_counter and frame_timestamp tell the
+number and the capture time of the current frame. Every new frame is
+announced by a data ready event on the image attribute with the frame number
+as its counter. Clients may subscribe to the event and read the image only
+when it has changed:
+
+``
+    camera.subscribe_event('Image', PyTango.EventType.DATA_READY_EVENT, cb)
+``
+
+A camera that delivers unchanged frames (a frozen or unplugged one) is
+detected by the pixels alone, as a frozen driver may still advance its
+timestamps: a checksum of a sparse grid of about 64x48 pixels of each frame
+and, when it matches the previous one, a checksum of a denser grid of about
+256x192 pixels between the sparse ones. Both grids have a fixed size, so the
+check costs the same for every resolution, and only the checksums are kept,
+not the previous frame. A change that falls only between the pixels of the
+dense grid is missed: at 640x480 the grid has every 4th pixel, at 4096x3072
+every 256th. A live camera changes most pixels by its noise, so such a miss
+does not repeat over several frames; after `stale_frame_limit` (default 3)
+unchanged frames in a row the device goes to FAULT. The attribute frame_age
+is the time since the last changed frame.
+
+The capture resolution is set by the writable attribute resolution. The
+attribute binning (default 1) reduces image and encoded_image in software by
+averaging binning x binning pixels, for a coarse full view. The attribute roi
+[x, y, width, height] selects the region of the full resolution frame in
+roi_image; with zero width or height roi_image is the same as image. The
+region is clamped to the frame; the attribute effective_roi tells the region
+of the current roi_image. The attributes read in one request (e.g. image,
+roi_image, effective_roi, resolution and frame_timestamp) are all of the
+same frame.
+
+The image attributes are sized for frames of at most MAX_WIDTH x MAX_HEIGHT
+pixels, as Tango fixes their maximal dimensions with the device class. A
+larger resolution is refused, and a camera that delivers larger frames goes
+to FAULT instead of sending truncated images; raise the limits for such a
+sensor.
+
+The camera is opened and, after a fault, reopened in the capture thread, so
+neither the device initialization nor any attribute read waits for it; in
+the FAULT state the image reads fail at once. Reconnection attempts follow an
+exponential backoff from `reconnect_delay` to `max_reconnect_delay` seconds.
+The attributes reconnect_count, connect_duration and next_reconnect show the
+recovery. The attributes capture_fps, read_latency (of the camera) and
+fault_count, also summarized in the device status, tell whether a lag comes
+from the camera or from further on.
+
+With the property `simulate` set to True the device produces synthetic frames
+without a camera, e.g. for testing clients with
+`PyTango.test_context.DeviceTestContext(USBCamera,
+properties=dict(simulate=True))`.
+
 """
 __author__ = "started by Juliano Murari, finished by Konstantin Klementiev"
 __versioninfo__ = (1, 0, 0)
@@ -21,6 +83,9 @@ __license__ = "MIT license"
 
 import time
 import datetime
+import zlib
+import threading
+import collections
 
 import cv2  # > 3.0!
 import numpy as np
@@ -32,6 +97,63 @@ from PyTango import AttrWriteType, DevState, DebugIt
 from PyTango.server import Device, DeviceMeta, attribute, server_run
 from PyTango.server import device_property
 
+import FrameCodec
+
+# the largest sensor to be used; the image attributes are sized to it
+MAX_WIDTH, MAX_HEIGHT = 4096, 3072
+
+# a captured frame as published by the capture thread: the packed image and
+# ROI image, the effective ROI, the full frame size, the frame number and
+# time and the frame as captured (BGR, binned)
+CapturedFrame = collections.namedtuple(
+    'CapturedFrame', 'image roi_image roi size number time frame')
+
+
+class SimulatedCamera(object):
+    """Mimics the used part of cv2.VideoCapture: a test pattern with a bright
+    disc that moves by 4 pixels per frame."""
+
+    def __init__(self, width=640, height=480):
+        self.set_size(width, height)
+        self.nframe = 0
+
+    def set_size(self, width, height):
+        self.width, self.height = width, height
+        yy, xx = np.mgrid[0:height, 0:width]
+        self.background = np.dstack(
+            ((xx * 255 // width), (yy * 255 // height),
+             np.full_like(xx, 64))).astype(np.uint8)
+
+    def isOpened(self):
+        return True
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_FRAME_WIDTH:
+            return self.width
+        if prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            return self.height
+        return 0
+
+    def set(self, prop, value):
+        if prop == cv2.CAP_PROP_FRAME_WIDTH:
+            self.set_size(int(value), self.height)
+        elif prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            self.set_size(self.width, int(value))
+        else:
+            return False
+        return True
+
+    def read(self):
+        frame = self.background.copy()
+        x = (self.nframe * 4) % self.width
+        cv2.circle(frame, (x, self.height//2), self.height//8,
+                   (255, 255, 255), -1)
+        self.nframe += 1
+        return True, frame
+
+    def release(self):
+        pass
+
 
 class USBCamera(Device):
     __metaclass__ = DeviceMeta
@@ -40,123 +162,466 @@ class USBCamera(Device):
     # check info with usb-devices command
     dev_name = device_property(dtype=str)
 
-    # image from camera device
+    # period of frame capturing, ms; 0: as fast as the camera delivers
+    capture_period = device_property(dtype=int, default_value=200)
+
+    # synthetic frames, no camera needed
+    simulate = device_property(dtype=bool, default_value=False)
+
+    # compression of encoded_image: 'JPEG_RGB' or 'PNG' (lossless)
+    image_encoding = device_property(dtype=str, default_value='JPEG_RGB')
+    # JPEG quality, 0 to 100
+    image_quality = device_property(dtype=int, default_value=80)
+
+    # number of consecutive unchanged frames taken as a frozen camera
+    stale_frame_limit = device_property(dtype=int, default_value=3)
+
+    # delay before the first reconnection attempt after a fault, s; it is
+    # doubled after each failed attempt up to max_reconnect_delay
+    reconnect_delay = device_property(dtype=float, default_value=1.)
+    max_reconnect_delay = device_property(dtype=float, default_value=60.)
+
+    # image from camera device, binned by `binning`
     # use dtype=((PyTango.DevUShort,),), for monochrome images
     image = attribute(label="Image", dtype=((PyTango.DevULong,),),
-                      max_dim_x=640, max_dim_y=480,
+                      max_dim_x=MAX_WIDTH, max_dim_y=MAX_HEIGHT,
                       access=AttrWriteType.READ)
 
+    # the region `roi` of the full resolution frame
+    roi_image = attribute(label="ROI image", dtype=((PyTango.DevULong,),),
+                          max_dim_x=MAX_WIDTH, max_dim_y=MAX_HEIGHT,
+                          access=AttrWriteType.READ)
+
+    # capture resolution [width, height] requested from the camera; reads
+    # give the actual size of the captured frames
+    resolution = attribute(label="Resolution", dtype=(int,), max_dim_x=2,
+                           access=AttrWriteType.READ_WRITE,
+                           memorized=True, hw_memorized=True)
+
+    # [x, y, width, height] of roi_image in the full frame, zero width or
+    # height for the whole frame
+    roi = attribute(label="ROI", dtype=(int,), max_dim_x=4,
+                    access=AttrWriteType.READ_WRITE,
+                    memorized=True, hw_memorized=True)
+
+    # [x, y, width, height] of the current roi_image as clamped to the
+    # frame, zero width and height when roi_image is the same as image
+    effective_roi = attribute(label="Effective ROI", dtype=(int,),
+                              max_dim_x=4, access=AttrWriteType.READ)
+
+    # software binning of image and encoded_image, pixels per side
+    binning = attribute(label="Binning", dtype=int,
+                        access=AttrWriteType.READ_WRITE,
+                        memorized=True, hw_memorized=True)
+
+    # the same image as JPEG or PNG
+    encoded_image = attribute(label="Encoded image", dtype=PyTango.DevEncoded,
+                              access=AttrWriteType.READ)
+
+    # time since the last changed frame
+    frame_age = attribute(label="Frame age", dtype=float, unit="s",
+                          access=AttrWriteType.READ)
+
+    # number of the frame in image, counted from the device initialization
+    frame_counter = attribute(label="Frame counter", dtype=int,
+                              access=AttrWriteType.READ)
+
+    # capture time of the frame in image, s since the epoch
+    frame_timestamp = attribute(label="Frame timestamp", dtype=float,
+                                unit="s", access=AttrWriteType.READ)
+
+    # number of reconnection attempts since the device initialization
+    reconnect_count = attribute(label="Reconnections", dtype=int,
+                                access=AttrWriteType.READ)
+
+    # duration of the last successful camera opening
+    connect_duration = attribute(label="Connect duration", dtype=float,
+                                 unit="s", access=AttrWriteType.READ)
+
+    # time to the next reconnection attempt, 0 if connected or connecting
+    next_reconnect = attribute(label="Next reconnection in", dtype=float,
+                               unit="s", access=AttrWriteType.READ)
+
+    # rate of the captured frames over the last `stats_depth` frames
+    capture_fps = attribute(label="Capture rate", dtype=float, unit="Hz",
+                            access=AttrWriteType.READ)
+
+    # mean time of reading a frame from the camera over the last
+    # `stats_depth` frames
+    read_latency = attribute(label="Read latency", dtype=float, unit="ms",
+                             access=AttrWriteType.READ)
+
+    # number of falls into FAULT since the device initialization
+    fault_count = attribute(label="Faults", dtype=int,
+                            access=AttrWriteType.READ)
+
+    stats_depth = 30
+
     @DebugIt()
     def init_device(self):
         self.set_state(DevState.INIT)
         self.get_device_properties()  # necessary before use the properties
 
-        # dev_name = 'Image_Processor_USB_2.0_PC_Cam' (property)
-        camera_path = '/dev/v4l/by-id/usb-' + self.dev_name + '*'
-#        camera_path = "/dev/video*"
-        self._image = None
-        self.previous_frame = np.empty((0))
+        self.camera = None
+        self.requested_resolution = None
+        self.roi_rect = [0, 0, 0, 0]
+        self.binning_factor = 1
+        self._capture = CapturedFrame(
+            None, None, [0, 0, 0, 0], [0, 0], 0, 0., None)
+        self._request = self._capture  # of the current client request
+        self._lock = threading.Lock()
+        self._capture_thread = None
+        self.frame_signature = None
+        self.dense_signature = None  # None if not taken of the last frame
+        self.stale_frames = 0
+        self.fresh_time = time.time()
+        self.frame_number = 0
+        self.frame_time = 0.
+        self._encoded = None, None  # (frame_number, DevEncoded pair)
+        self.reconnects = 0
+        self.connect_time = 0.
+        self.next_reconnect_time = 0.
+        self._resolution_changed = False
+        self.capture_times = collections.deque(maxlen=self.stats_depth)
+        self.read_times = collections.deque(maxlen=self.stats_depth)
+        self.faults = 0
+        self.status_time = 0.
+        self.set_data_ready_event('image', True)
+        # the camera is opened in the capture thread, init_device returns at
+        # once and the state goes to ON or FAULT later:
+        self.start_capture()
 
-        device_paths = sorted(glob.glob(camera_path))
-        print(device_paths)
+    def open_camera(self):
+        """Returns True if the camera has been opened."""
+        if self.simulate:
+            self.camera = SimulatedCamera()
+            device_paths = ['simulated camera']
+        else:
+            if not self.dev_name:
+                self.set_fault("Error: the property dev_name is not set")
+                return False
+            # dev_name = 'Image_Processor_USB_2.0_PC_Cam' (property)
+            camera_path = '/dev/v4l/by-id/usb-' + self.dev_name + '*'
+#            camera_path = "/dev/video*"
+            device_paths = sorted(glob.glob(camera_path))
+        self.info_stream(str(device_paths))
         if len(device_paths) == 0:
-            status = "Error: device does not exist. Check connection.\n"
+            self.set_fault("Error: device does not exist. Check connection.\n")
+            return False
+
+        for device_path in device_paths:
+            if self.simulate:
+                break
+            self.info_stream("init device on " + device_path)
+            self.camera = cv2.VideoCapture(str(device_path))
+            if self._capture_stop.wait(2):
+                break
+            if self.camera.isOpened():
+                break
+            self.camera.release()
+
+        # check camera
+        if self.camera.isOpened():
+            self.apply_resolution()
+            now = datetime.datetime.now()
+            status = now.strftime("%Y/%m/%d %H:%M:%S :")
+            status += " camera has started correctly"
             self.info_stream(status)
             self.set_status(status)
-            self.set_state(DevState.FAULT)
+            self.set_state(DevState.ON)
+            return True
         else:
-            for device_path in device_paths:
-                self.info_stream("init device on " + device_path)
-                self.camera = cv2.VideoCapture(str(device_path))
-                time.sleep(2)
-                if self.camera.isOpened():
-                    break
-                self.camera.release()
+            self.set_fault("Error: camera has not started correctly")
+            return False
 
-            # check camera
-            if self.camera.isOpened():
-                now = datetime.datetime.now()
-                status = now.strftime("%Y/%m/%d %H:%M:%S :")
-                status += " camera has started correctly"
-                self.info_stream(status)
-                self.set_status(status)
-                self.set_state(DevState.ON)
-            else:
-                status = "Error: camera has not started correctly"
-                self.info_stream(status)
-                self.set_status(status)
-                self.set_state(DevState.FAULT)
+    def set_fault(self, status):
+        self.info_stream(status)
+        self.set_status(status)
+        self.set_state(DevState.FAULT)
+        self.faults += 1
 
-    def delete_device(self):
+    def apply_resolution(self):
+        if self.requested_resolution is None:
+            return
+        width, height = self.requested_resolution
+        self._resolution_changed = False
+        self.camera.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+        self.camera.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+
+    def release_camera(self):
         try:
             self.camera.release()
-            del(self.camera)
-        except:
+        except Exception:
             pass
-        time.sleep(1)
+        self.camera = None
+
+    def delete_device(self):
+        self.stop_capture()
 
     def info_stream(self, info):
         print(info)
         super(USBCamera, self).info_stream(info)
 
     def pack_frame(self, fr):
-        return (fr[:, :, 0] * 0x10000) + (fr[:, :, 1] * 0x100) + fr[:, :, 2]
+        return FrameCodec.pack(fr)
+
+    def get_statistics(self):
+        return "{0:.1f} fps, read {1:.1f} ms, {2} faults, {3} reconnections"\
+            .format(self.read_capture_fps(), self.read_read_latency(),
+                    self.faults, self.reconnects)
 
-    def was_fault(self):
-        if self.get_state() != DevState.FAULT:
+    def get_frame_signature(self, frame):
+        """A constant-cost fingerprint of a frame: a checksum over a sparse
+        grid of about 64x48 pixels."""
+        h, w = frame.shape[:2]
+        sample = frame[::max(h//48, 1), ::max(w//64, 1)]
+        return zlib.crc32(sample.tobytes())
+
+    def get_dense_signature(self, frame):
+        """A checksum over a grid of about 256x192 pixels, shifted by half
+        a step from the grid of `get_frame_signature()`; constant cost."""
+        h, w = frame.shape[:2]
+        sy, sx = max(h//192, 1), max(w//256, 1)
+        sample = frame[sy//2::sy, sx//2::sx]
+        return zlib.crc32(sample.tobytes())
+
+    def is_frame_unchanged(self, frame):
+        """Takes the dense signature only when the fingerprints match. The
+        first frame of a matching run has no dense signature to compare with
+        and counts as changed."""
+        signature = self.get_frame_signature(frame)
+        if signature != self.frame_signature:
+            self.frame_signature = signature
+            self.dense_signature = None
             return False
-        self.delete_device()
-        self.init_device()
-        return True
+        dense = self.get_dense_signature(frame)
+        unchanged = dense == self.dense_signature
+        self.dense_signature = dense
+        return unchanged
 
-    @DebugIt()
-    def read_attr_hardware(self, attr_list):
-        if self.was_fault():
-            return
-        if not self.camera.isOpened():
-            status = "Error with camera connection"
-            self.info_stream(status)
-            self.set_status(status)
-            self.set_state(DevState.FAULT)
-            self.delete_device()
-            self.init_device()
+    def start_capture(self):
+        self._capture_stop = threading.Event()
+        self._capture_thread = threading.Thread(
+            target=self.capture_loop, name='capture')
+        self._capture_thread.daemon = True
+        self._capture_thread.start()
+
+    def stop_capture(self):
+        thread = getattr(self, '_capture_thread', None)
+        if thread is None:
             return
+        self._capture_stop.set()
+        thread.join(5)
+        self._capture_thread = None
+
+    def capture_loop(self):
+        if hasattr(PyTango, 'EnsureOmniThread'):  # for pushing events
+            with PyTango.EnsureOmniThread():
+                self.run_camera()
+        else:
+            self.run_camera()
+
+    def run_camera(self):
+        """Opens the camera and captures frames until it fails, then waits
+        with an exponentially growing delay and reopens it. Everything here
+        runs in the capture thread, so the attribute reads never wait for
+        the camera and fail at once in the FAULT state. An unexpected error
+        is a fault too, followed by a reconnection, it never ends the
+        thread."""
+        delay = self.reconnect_delay
+        try:
+            while not self._capture_stop.is_set():
+                t0 = time.time()
+                try:
+                    if self.open_camera():
+                        self.connect_time = time.time() - t0
+                        started = self.frame_number
+                        self.capture_frames()
+                        if self.frame_number > started:
+                            delay = self.reconnect_delay
+                except Exception as e:
+                    self.set_fault("Error: {0}".format(e))
+                self.release_camera()
+                if self._capture_stop.is_set():
+                    break
+                self.next_reconnect_time = time.time() + delay
+                self.set_status("{0}\nReconnection {1} in {2:.1f} s".format(
+                    self.get_status().strip(), self.reconnects+1, delay))
+                self._capture_stop.wait(delay)
+                self.next_reconnect_time = 0.
+                delay = min(delay*2, self.max_reconnect_delay)
+                self.reconnects += 1
+        finally:
+            self.release_camera()
 
+    def capture_frames(self):
+        period = self.capture_period * 1e-3
+        while not self._capture_stop.is_set():
+            t0 = time.time()
+            if self._resolution_changed:
+                self.apply_resolution()
+            if not self.capture_frame():
+                break
+            self._capture_stop.wait(max(period - (time.time()-t0), 0))
+
+    def capture_frame(self):
+        """Grabs a frame into new buffers and makes them the current ones.
+        Returns False when the camera has failed."""
+        t0 = time.time()
         try:
             ret, frame = self.camera.read()
+            self.read_times.append(time.time() - t0)
         except Exception as e:
             print('**********')
             print(e)
+            ret = False
 
         # ret can be True even if you unplug the camera, wtf!
-        if not ret or np.array_equal(self.previous_frame, frame):
-            status = "Error to read image"
-            self.info_stream(status)
-            self.set_status(status)
-            self.set_state(DevState.FAULT)
-            self.delete_device()
-            self.init_device()
-            return
+        if ret:
+            if self.is_frame_unchanged(frame):
+                self.stale_frames += 1
+            else:
+                self.stale_frames = 0
+                self.fresh_time = time.time()
+        if not ret or self.stale_frames >= self.stale_frame_limit:
+            self.set_fault("Error to read image")
+            return False
 
-        if self._image is None:
-            self._image = np.empty(frame.shape[0:2], dtype=np.uint32)
+        h, w = frame.shape[:2]
+        if w > MAX_WIDTH or h > MAX_HEIGHT:
+            self.set_fault("Error: the {0}x{1} frames exceed the image "
+                           "attributes of {2}x{3}".format(
+                               w, h, MAX_WIDTH, MAX_HEIGHT))
+            return False
+        x, y, rw, rh = self.roi_rect
+        if rw > 0 and rh > 0:
+            x, y = min(max(x, 0), w-1), min(max(y, 0), h-1)
+            roi = frame[y:y+rh, x:x+rw]
+            roi_image = self.pack_frame(roi)
+            roi_effective = [x, y, roi.shape[1], roi.shape[0]]
+        else:
+            roi_image = None
+            roi_effective = [0, 0, 0, 0]
+        b = self.binning_factor
+        if b > 1:
+            frame = cv2.resize(frame, (max(w//b, 1), max(h//b, 1)),
+                               interpolation=cv2.INTER_AREA)
         # convert to gray scale:
-        # self._image[:, :] = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        self._image[:, :] = self.pack_frame(frame)
-        status = "The device is ON"
-        # self.info_stream(status)
-        self.set_status(status)
-        self.set_state(DevState.ON)
-        self.previous_frame = frame
+        # image = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        image = self.pack_frame(frame)
+        with self._lock:
+            self.frame_number += 1
+            self.frame_time = time.time()
+            self._capture = CapturedFrame(
+                image, roi_image, roi_effective, [w, h], self.frame_number,
+                self.frame_time, frame)
+        self.capture_times.append(self.frame_time)
+        if self.get_state() != DevState.ON or \
+                self.frame_time - self.status_time > 1:
+            self.status_time = self.frame_time
+            self.set_status("The device is ON\n" + self.get_statistics())
+            if self.get_state() != DevState.ON:
+                self.set_state(DevState.ON)
+        self.push_data_ready_event('image', self.frame_number)
+        return True
+
+    def read_attr_hardware(self, attr_list):
+        """Takes the current frame once per client request, for all the
+        attributes read in it."""
+        with self._lock:
+            self._request = self._capture
 
     @DebugIt()
     def read_image(self):
-        self.was_fault()
-        return self._image
+        return self._request.image
 
     def is_image_allowed(self, request):
-        self.was_fault()
-        return self.get_state() != DevState.FAULT
+        return self.get_state() == DevState.ON and self.frame_number > 0
+
+    @DebugIt()
+    def read_roi_image(self):
+        request = self._request
+        return request.image if request.roi_image is None else \
+            request.roi_image
+
+    def is_roi_image_allowed(self, request):
+        return self.is_image_allowed(request)
+
+    def read_resolution(self):
+        return self._request.size
+
+    def write_resolution(self, value):
+        if len(value) != 2 or min(value) <= 0:
+            raise ValueError('resolution must be [width, height]')
+        if value[0] > MAX_WIDTH or value[1] > MAX_HEIGHT:
+            raise ValueError('resolution is limited to {0}x{1}'.format(
+                MAX_WIDTH, MAX_HEIGHT))
+        self.requested_resolution = [int(v) for v in value]
+        self._resolution_changed = True  # applied in the capture thread
+
+    def read_roi(self):
+        return self.roi_rect
+
+    def write_roi(self, value):
+        if len(value) != 4 or min(value) < 0:
+            raise ValueError('roi must be [x, y, width, height]')
+        self.roi_rect = [int(v) for v in value]
+
+    def read_effective_roi(self):
+        return self._request.roi
+
+    def read_binning(self):
+        return self.binning_factor
+
+    def write_binning(self, value):
+        if value < 1:
+            raise ValueError('binning must be a positive integer')
+        self.binning_factor = int(value)
+
+    @DebugIt()
+    def read_encoded_image(self):
+        number, frame = self._request.number, self._request.frame
+        # encode each captured frame once, whatever the number of clients
+        if self._encoded[0] != number:
+            self._encoded = number, FrameCodec.encode(
+                frame, self.image_encoding, self.image_quality)
+        return self._encoded[1]
+
+    def is_encoded_image_allowed(self, request):
+        return self.is_image_allowed(request)
+
+    def read_frame_age(self):
+        return time.time() - self.fresh_time
+
+    def read_frame_counter(self):
+        return self._request.number
+
+    def read_frame_timestamp(self):
+        return self._request.time
+
+    def read_reconnect_count(self):
+        return self.reconnects
+
+    def read_connect_duration(self):
+        return self.connect_time
+
+    def read_capture_fps(self):
+        times = list(self.capture_times)
+        if len(times) < 2 or self.get_state() != DevState.ON:
+            return 0.
+        return (len(times) - 1) / (times[-1] - times[0])
+
+    def read_read_latency(self):
+        times = list(self.read_times)
+        return np.mean(times) * 1e3 if times else 0.
+
+    def read_fault_count(self):
+        return self.faults
+
+    def read_next_reconnect(self):
+        if self.next_reconnect_time == 0:
+            return 0.
+        return max(self.next_reconnect_time - time.time(), 0.)
 
 
 def main():
@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+"""
+WellMap
+=======
+
+The wells of a sample plate for OrthoView: their centres and names, with a
+spatial index for finding the well nearest to a point and the wells within
+a rectangle.
+
+The well centres are in mm from the first (top-left) reference corner, x
+along the top side of the reference rectangle and y along its left side. A
+map is a regular grid of a given pitch (`WellMap.grid()`, with the standard
+SBS plates in `standardPlates`) or any list of centres read from a CSV file
+(`WellMap.fromCSV()`).
+
+The index is a uniform grid of cells of about one well each; the wells are
+sorted by their cells, so that the wells of a row of cells form one slice.
+Finding the nearest well looks into the cells around the point only, and the
+wells within a rectangle are collected from the slices of its rows of cells,
+so neither depends on the number of wells of the plate.
+
+"""
+
+__author__ = "Konstantin Klementiev"
+__versioninfo__ = (1, 0, 0)
+__version__ = '.'.join(map(str, __versioninfo__))
+__license__ = "MIT license"
+
+import string
+import numpy as np
+
+# rows, columns, pitch, the A1 centre from the plate corner, well size (mm)
+standardPlates = {
+    'sbs96': (8, 12, 9., (14.38, 11.24), 6.4),
+    'sbs384': (16, 24, 4.5, (12.13, 8.99), 3.6),
+    'sbs1536': (32, 48, 2.25, (11.005, 7.865), 1.5)}
+
+
+def rowName(irow):
+    """'A'...'Z', 'AA', 'AB'..."""
+    letters = string.ascii_uppercase
+    name = ''
+    irow += 1
+    while irow > 0:
+        irow, rem = divmod(irow - 1, 26)
+        name = letters[rem] + name
+    return name
+
+
+class WellMap(object):
+    """`centers` is an (n, 2) array of the well centres in mm, `names` the
+    well names (the default: their numbers from 1), `diameter` the well size
+    in mm. `spacing` (mm) is the typical distance between neighbouring
+    wells, it sets the index cells; the default is estimated from the
+    number of wells and their extent."""
+
+    def __init__(self, centers, names=None, diameter=0., spacing=None):
+        self.centers = np.asarray(centers, dtype=np.float64).reshape(-1, 2)
+        if len(self.centers) == 0:
+            raise ValueError('the well map is empty')
+        if names is None:
+            names = [str(i+1) for i in range(len(self.centers))]
+        if len(names) != len(self.centers):
+            raise ValueError('the well names do not match the centres')
+        self.names = list(names)
+        self.diameter = float(diameter)
+
+        self.origin = self.centers.min(axis=0)
+        w, h = self.centers.max(axis=0) - self.origin
+        if spacing is None:
+            n = len(self.centers)
+            if w*h > 0:
+                spacing = (w*h / n)**0.5
+            else:  # the wells are in one line
+                spacing = max(w, h) / max(n-1, 1)
+        self.spacing = spacing if spacing > 0 else 1.
+        nx = int(w / self.spacing) + 1
+        ny = int(h / self.spacing) + 1
+        self.shape = nx, ny
+        cells = self.cellOf(self.centers)
+        cellIds = cells[:, 1]*nx + cells[:, 0]
+        self.order = np.argsort(cellIds, kind='mergesort')
+        # the wells of the cell i are order[starts[i]:starts[i+1]]:
+        self.starts = np.searchsorted(cellIds[self.order],
+                                      np.arange(nx*ny + 1))
+
+    @classmethod
+    def grid(cls, rows, columns, pitch, origin=(0., 0.), diameter=0.):
+        """A regular plate of `rows` x `columns` wells at `pitch` mm with the
+        well A1 at `origin`; the wells are named A1, A2... B1..."""
+        ix, iy = np.meshgrid(np.arange(columns), np.arange(rows))
+        centers = np.column_stack((ix.ravel(), iy.ravel())) * float(pitch) + \
+            np.asarray(origin, dtype=np.float64)
+        names = ['{0}{1}'.format(rowName(r), c+1)
+                 for r in range(rows) for c in range(columns)]
+        return cls(centers, names, diameter, spacing=pitch)
+
+    @classmethod
+    def standard(cls, plate, origin=None):
+        """One of `standardPlates`; the reference rectangle is the plate
+        outline unless `origin` of A1 is given."""
+        rows, columns, pitch, a1, diameter = standardPlates[plate.lower()]
+        return cls.grid(rows, columns, pitch,
+                        a1 if origin is None else origin, diameter)
+
+    @classmethod
+    def fromCSV(cls, fileName, diameter=0.):
+        """Reads the lines `x, y` or `name, x, y` (mm); '#' starts a
+        comment."""
+        centers, names = [], []
+        with open(fileName) as f:
+            for iline, line in enumerate(f, 1):
+                line = line.split('#')[0].strip()
+                if not line:
+                    continue
+                fields = [field.strip() for field in line.split(',')]
+                if len(fields) not in (2, 3):
+                    raise ValueError('{0}, line {1}: expected [name, ] x, y'
+                                     .format(fileName, iline))
+                try:
+                    centers.append((float(fields[-2]), float(fields[-1])))
+                except ValueError:
+                    if not centers:  # a header line
+                        continue
+                    raise ValueError('{0}, line {1}: bad coordinates'
+                                     .format(fileName, iline))
+                names.append(fields[0] if len(fields) == 3 else
+                             str(len(centers)))
+        return cls(centers, names, diameter)
+
+    def __len__(self):
+        return len(self.centers)
+
+    def cellOf(self, points):
+        """The index cells (ix, iy) of `points`, clipped to the index."""
+        cells = np.floor((np.asarray(points, dtype=np.float64) -
+                          self.origin) / self.spacing).astype(int)
+        return np.clip(cells, 0, np.array(self.shape) - 1)
+
+    def inCells(self, ix0, iy0, ix1, iy1):
+        """The wells of the cells from (ix0, iy0) to (ix1, iy1) inclusive."""
+        nx, ny = self.shape
+        ix0, ix1 = max(ix0, 0), min(ix1, nx-1)
+        iy0, iy1 = max(iy0, 0), min(iy1, ny-1)
+        if ix0 > ix1 or iy0 > iy1:
+            return np.empty(0, dtype=np.intp)
+        rows = np.arange(iy0, iy1+1) * nx
+        begins, ends = self.starts[rows + ix0], self.starts[rows + ix1 + 1]
+        return np.concatenate([self.order[b:e] for b, e in zip(begins, ends)])
+
+    def nearest(self, point, maxDistance=np.inf):
+        """The index of the well nearest to `point` or None if it is farther
+        than `maxDistance`. The search grows over the cells around the point
+        until no cell outside can hold a nearer well."""
+        point = np.asarray(point, dtype=np.float64)
+        ix, iy = self.cellOf(point)
+        for k in range(max(self.shape)):
+            wells = self.inCells(ix-k, iy-k, ix+k, iy+k)
+            if len(wells):
+                d = np.hypot(*(self.centers[wells] - point).T)
+                best = d.argmin()
+                # the cells beyond are farther than k cells from the point:
+                if d[best] <= k*self.spacing or k == max(self.shape) - 1:
+                    return wells[best] if d[best] <= maxDistance else None
+            if k*self.spacing > maxDistance:
+                return None
+        return None
+
+    def inRect(self, x0, y0, x1, y1):
+        """The indices of the wells within the rectangle."""
+        (ix0, iy0), (ix1, iy1) = self.cellOf([(x0, y0), (x1, y1)])
+        wells = self.inCells(ix0, iy0, ix1, iy1)
+        x, y = self.centers[wells].T
+        return wells[(x >= x0) & (x <= x1) & (y >= y0) & (y <= y1)]
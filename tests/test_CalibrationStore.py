@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+"""Tests of the calibration persistence of `CalibrationStore`: the named
+calibrations, the background writer and the transform cache."""
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+import numpy as np
+try:
+    from ConfigParser import ConfigParser
+except ImportError:
+    from configparser import ConfigParser
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from CalibrationStore import (BackgroundWriter, CalibrationStore,  # noqa
+                              MapCache)
+from PlateCalibration import PlateCalibration  # noqa: E402
+
+corners = [(170, 190), (600, 180), (590, 420), (180, 440)]
+
+
+class TestCalibrationStore(unittest.TestCase):
+    def test_versions(self):
+        config = ConfigParser()
+        store = CalibrationStore(config)
+        self.assertEqual(store.save('plate A', corners, 40, 25, [400, 300]),
+                         1)
+        self.assertEqual(store.save('plate A', corners, 40, 25, [400, 300]),
+                         1)
+        self.assertEqual(store.save('plate A', corners, 40, 26, [400, 300]),
+                         2)
+        self.assertEqual(store.names(), ['plate A'])
+        calibration = store.load('plate A')
+        self.assertEqual(calibration['corners'], corners)
+        self.assertEqual(calibration['scaley'], 26.)
+        self.assertEqual(calibration['pos'], [400, 300])
+        self.assertEqual(calibration['version'], 2)
+
+        store.remove('plate A')
+        self.assertEqual(store.names(), [])
+        with self.assertRaises(KeyError):
+            store.load('plate A')
+        with self.assertRaises(ValueError):
+            store.save('[bad]', corners, 40, 25, [400, 300])
+
+    def test_panes(self):
+        config = ConfigParser()
+        store = CalibrationStore(config)
+        side = CalibrationStore(config, 'side')
+        store.save('a', corners, 40, 25, [400, 300])
+        side.save('b', corners, 40, 25, [400, 300])
+        self.assertEqual(store.names(), ['a'])
+        self.assertEqual(side.names(), ['b'])
+        self.assertTrue(config.has_section('calibration:side b'))
+
+
+class TestBackgroundWriter(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.writer = BackgroundWriter(delay=0.05)
+        self.addCleanup(self.writer.stop)
+
+    def test_last_data_written(self):
+        fileName = os.path.join(self.directory, 'sub', 'a.ini')
+        written = []
+        for i in range(5):
+            self.writer.submit(fileName, u'version {0}'.format(i),
+                               done=lambda: written.append(1))
+        self.writer.flush()
+        with open(fileName) as f:
+            self.assertEqual(f.read(), 'version 4')
+        self.assertEqual(len(written), 1)
+        self.assertFalse(os.path.exists(fileName + '.tmp'))
+
+    def test_survives_errors(self):
+        fileName = os.path.join(self.directory, 'a.bin')
+
+        def fail(f):
+            f.write(b'partial')
+            raise RuntimeError('broken')
+
+        self.writer.submit(fileName, b'old', delay=0)
+        self.writer.flush()
+        self.writer.submit(fileName, fail, delay=0)
+        self.writer.flush()
+        self.assertIsInstance(self.writer.lastError, RuntimeError)
+        with open(fileName, 'rb') as f:
+            self.assertEqual(f.read(), b'old')
+        self.assertFalse(os.path.exists(fileName + '.tmp'))
+
+        self.writer.submit(fileName, b'new', delay=0)
+        self.writer.flush()
+        self.assertIsNone(self.writer.lastError)
+        with open(fileName, 'rb') as f:
+            self.assertEqual(f.read(), b'new')
+
+
+class TestMapCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.writer = BackgroundWriter(delay=0)
+        self.addCleanup(self.writer.stop)
+        self.cache = MapCache(os.path.join(self.directory, 'cache'),
+                              self.writer)
+
+    def makeCalibration(self, scalex):
+        calibration = PlateCalibration(corners, scalex, 25, (400, 300),
+                                       (800, 600))
+        calibration.rectifyMaps()
+        return calibration
+
+    def test_persistence(self):
+        calibration = self.makeCalibration(40)
+        self.assertIsNone(self.cache.load(calibration.key))
+        self.cache.setKeys('pane', [calibration.key])
+        self.cache.save(calibration.key, calibration.state())
+        self.writer.flush()
+
+        state = self.cache.load(calibration.key)
+        self.assertIsNotNone(state)
+        restored = PlateCalibration(corners, 40, 25, (400, 300), (800, 600),
+                                    state=state)
+        self.assertEqual(restored.mapOrder, calibration.mapOrder)
+        np.testing.assert_array_equal(restored.perspectiveTransform2,
+                                      calibration.perspectiveTransform2)
+
+        with open(self.cache.fileName(calibration.key), 'wb') as f:
+            f.write(b'broken')
+        self.assertIsNone(self.cache.load(calibration.key))
+
+    def test_prune(self):
+        a, b, c = [self.makeCalibration(scalex) for scalex in (40, 41, 42)]
+        self.cache.setKeys('pane1', [a.key])
+        self.cache.setKeys('pane2', [b.key])
+        for calibration in (a, b):
+            self.cache.save(calibration.key, calibration.state())
+        self.writer.flush()
+        self.assertIsNotNone(self.cache.load(a.key))
+        self.assertIsNotNone(self.cache.load(b.key))
+
+        # a is replaced by c in pane1, b is kept by pane2:
+        self.cache.setKeys('pane1', [c.key])
+        self.cache.save(c.key, c.state())
+        self.writer.flush()
+        self.assertIsNone(self.cache.load(a.key))
+        self.assertIsNotNone(self.cache.load(b.key))
+        self.assertIsNotNone(self.cache.load(c.key))
+
+    def test_prune_keeps_other_processes(self):
+        a, b = [self.makeCalibration(scalex) for scalex in (40, 41)]
+        # a file of another OrthoView sharing the cache directory:
+        other = MapCache(self.cache.directory, self.writer)
+        other.setKeys('pane', [a.key])
+        other.save(a.key, a.state())
+        self.writer.flush()
+
+        self.cache.setKeys('pane', [b.key])
+        self.cache.save(b.key, b.state())
+        self.writer.flush()
+        self.assertIsNotNone(self.cache.load(a.key))
+
+        # a key owned and then released here, but not saved here:
+        self.cache.setKeys('pane', [a.key, b.key])
+        self.cache.setKeys('pane', [b.key])
+        self.cache.save(b.key, b.state())
+        self.writer.flush()
+        self.assertIsNotNone(self.cache.load(a.key))
+
+
+if __name__ == '__main__':
+    unittest.main()
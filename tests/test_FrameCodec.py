@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""Tests of the frame transport of `FrameCodec`."""
+
+import os
+import sys
+import unittest
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import FrameCodec  # noqa: E402
+
+
+class TestFrameCodec(unittest.TestCase):
+    def setUp(self):
+        self.frame = np.random.RandomState(0).randint(
+            0, 256, (30, 40, 3)).astype(np.uint8)
+
+    def test_pack_round_trip(self):
+        packed = FrameCodec.pack(self.frame, isBGR=False)
+        self.assertEqual(packed.shape, (30, 40))
+        self.assertEqual(packed.dtype, np.uint32)
+        np.testing.assert_array_equal(FrameCodec.unpack(packed), self.frame)
+
+    def test_pack_bgr(self):
+        # the frames of cv2.VideoCapture are BGR, unpack() gives RGB:
+        unpacked = FrameCodec.unpack(FrameCodec.pack(self.frame))
+        np.testing.assert_array_equal(unpacked, self.frame[:, :, ::-1])
+
+    def test_packed_value(self):
+        frame = np.array([[[0x12, 0x34, 0x56]]], dtype=np.uint8)
+        packed = FrameCodec.pack(frame, isBGR=False)
+        self.assertEqual(int(packed[0, 0]), 0xFF563412)
+        # as the old clients unpack it:
+        value = int(packed[0, 0])
+        self.assertEqual(
+            (value & 0xff, (value >> 8) & 0xff, (value >> 16) & 0xff),
+            (0x12, 0x34, 0x56))
+
+    def test_out_reused(self):
+        out = np.empty((30, 40), dtype=np.uint32)
+        self.assertIs(FrameCodec.pack(self.frame, out), out)
+        rgb = np.empty((30, 40, 3), dtype=np.uint8)
+        self.assertIs(FrameCodec.unpack(out, rgb), rgb)
+        wrong = np.empty((3, 4), dtype=np.uint32)
+        self.assertIsNot(FrameCodec.pack(self.frame, wrong), wrong)
+
+    def test_png_is_lossless(self):
+        encoding, data = FrameCodec.encode(self.frame, 'PNG', isBGR=False)
+        self.assertEqual(encoding, 'PNG')
+        np.testing.assert_array_equal(
+            FrameCodec.decode(encoding, data), self.frame)
+
+    def test_jpeg(self):
+        yy, xx = np.mgrid[0:30, 0:40]
+        smooth = np.dstack((xx*6, yy*8, xx+yy)).astype(np.uint8)
+        decoded = FrameCodec.decode(
+            *FrameCodec.encode(smooth, quality=95, isBGR=False))
+        self.assertEqual(decoded.shape, smooth.shape)
+        diff = np.abs(decoded.astype(int) - smooth)
+        self.assertLess(diff.mean(), 3)
+
+    def test_bad_encoding(self):
+        with self.assertRaises(ValueError):
+            FrameCodec.encode(self.frame, 'GIF')
+        with self.assertRaises(ValueError):
+            FrameCodec.decode('GIF', b'')
+        with self.assertRaises(ValueError):
+            FrameCodec.decode('PNG', b'not a png')
+
+
+if __name__ == '__main__':
+    unittest.main()
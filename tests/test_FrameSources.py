@@ -0,0 +1,284 @@
+# -*- coding: utf-8 -*-
+"""Tests of the frame sources of `FrameSources`: the image, replay and
+synthetic sources, and `TangoCameraSource` with `OrthoView.FrameGrabber`
+against a mocked Tango camera proxy."""
+
+import os
+import sys
+import time
+import types
+import shutil
+import tempfile
+import unittest
+import numpy as np
+import cv2
+try:
+    from unittest import mock
+except ImportError:  # Python 2
+    import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import FrameCodec  # noqa: E402
+import FrameSources  # noqa: E402
+from OrthoView import FrameGrabber  # noqa: E402
+
+DATA_READY_EVENT = 'data ready'
+
+
+class EventType(object):
+    DATA_READY_EVENT = DATA_READY_EVENT
+
+
+# TangoCameraSource.subscribe() only takes EventType from PyTango:
+fakePyTango = types.ModuleType('PyTango')
+fakePyTango.EventType = EventType
+
+
+def randomFrame(h, w, seed):
+    return np.random.RandomState(seed).randint(
+        0, 256, (h, w, 3)).astype(np.uint8)
+
+
+class Value(object):
+    def __init__(self, value):
+        self.value = value
+
+
+class FakeCamera(object):
+    """The proxy of a `USBCamera` device: its attributes are in `values`,
+    the subscribed callbacks are called by `fire()`."""
+
+    def __init__(self, name, hasEvents=True):
+        self.name = name
+        self.hasEvents = hasEvents
+        self.values = dict(binning=1)
+        self.callbacks = {}
+        self.requests = []
+
+    def setFrame(self, frame, timestamp):
+        self.values['Image'] = FrameCodec.pack(frame, isBGR=False)
+        self.values['encoded_image'] = FrameCodec.encode(
+            frame, 'PNG', isBGR=False)
+        self.values['frame_timestamp'] = timestamp
+
+    def get_attribute_list(self):
+        return list(self.values)
+
+    def read_attributes(self, names):
+        self.requests.append(list(names))
+        return [Value(self.values[name]) for name in names]
+
+    def write_attribute(self, name, value):
+        self.values[name] = value
+
+    def subscribe_event(self, name, eventType, callback):
+        if not self.hasEvents or eventType != DATA_READY_EVENT:
+            raise Exception('no events')
+        eventId = len(self.callbacks) + 1
+        self.callbacks[eventId] = name, callback
+        return eventId
+
+    def unsubscribe_event(self, eventId):
+        del self.callbacks[eventId]
+
+    def fire(self):
+        for name, callback in list(self.callbacks.values()):
+            callback(None)
+
+
+class TestFileSources(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def test_image_decoded_once(self):
+        frame = randomFrame(30, 40, 1)
+        fileName = os.path.join(self.directory, 'frame.png')
+        cv2.imwrite(fileName, frame[:, :, ::-1])  # as BGR
+        with mock.patch('cv2.imread', wraps=cv2.imread) as imread:
+            source = FrameSources.ImageSource(fileName)
+            first = source.read()
+            self.assertIsNone(source.read())  # nothing new
+            self.assertIsNone(source.read())
+        self.assertEqual(imread.call_count, 1)
+        np.testing.assert_array_equal(first, frame)
+        self.assertIs(first, source.frame)
+
+    def test_bad_image(self):
+        with self.assertRaises(IOError):
+            FrameSources.ImageSource(os.path.join(self.directory, 'no.png'))
+
+    def test_replay_loops_over_mapped_stack(self):
+        frames = np.stack([randomFrame(12, 16, seed) for seed in range(3)])
+        fileName = os.path.join(self.directory, 'frames.npy')
+        np.save(fileName, frames)
+        source = FrameSources.ReplaySource(fileName, rate=20.)
+        self.addCleanup(source.close)
+        self.assertIsInstance(source.stack, np.memmap)
+        self.assertAlmostEqual(source.period, 0.05)
+        for i in range(7):
+            frame = source.read()
+            self.assertNotIsInstance(frame, np.memmap)
+            np.testing.assert_array_equal(frame, frames[i % 3])
+        self.assertEqual(FrameSources.ReplaySource(fileName, 0).period, 0)
+
+    def test_replay_packed_stack(self):
+        frames = np.stack([randomFrame(12, 16, seed) for seed in range(2)])
+        fileName = os.path.join(self.directory, 'packed.npy')
+        np.save(fileName, np.stack(
+            [FrameCodec.pack(frame, isBGR=False) for frame in frames]))
+        source = FrameSources.ReplaySource(fileName)
+        np.testing.assert_array_equal(source.read(), frames[0])
+        np.testing.assert_array_equal(source.read(), frames[1])
+
+    def test_replay_rate(self):
+        frames = np.stack([randomFrame(12, 16, seed) for seed in range(3)])
+        fileName = os.path.join(self.directory, 'frames.npy')
+        np.save(fileName, frames)
+        source = FrameSources.ReplaySource(fileName, rate=20.)
+        grabber = FrameGrabber(source.read, source.period)
+        grabber.start()
+        time.sleep(0.5)
+        grabber.stop()
+        # about 10 frames, the first one at once:
+        self.assertTrue(5 <= grabber.frameCount <= 12, grabber.frameCount)
+
+    def test_bad_stack(self):
+        fileName = os.path.join(self.directory, 'flat.npy')
+        np.save(fileName, np.zeros(10))
+        with self.assertRaises(ValueError):
+            FrameSources.ReplaySource(fileName)
+
+
+class TestSyntheticPlateSource(unittest.TestCase):
+    def test_repeatable(self):
+        source = FrameSources.SyntheticPlateSource(320, 240, rate=5.)
+        frames = [source.read() for i in range(3)]
+        self.assertAlmostEqual(source.period, 0.2)
+        for frame in frames:
+            self.assertEqual(frame.shape, (240, 320, 3))
+            self.assertEqual(frame.dtype, np.uint8)
+        self.assertFalse(np.array_equal(frames[0], frames[1]))  # it moves
+
+        again = FrameSources.SyntheticPlateSource(320, 240)
+        for frame in frames:
+            np.testing.assert_array_equal(again.read(), frame)
+
+
+class TestTangoCameraSource(unittest.TestCase):
+    def setUp(self):
+        patchers = [mock.patch('taurus.Device', self.makeCamera),
+                    mock.patch.dict(sys.modules, {'PyTango': fakePyTango})]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.hasEvents = True
+        self.hasTimestamp = True
+        self.frame1 = randomFrame(48, 64, 1)
+        self.frame2 = randomFrame(48, 64, 2)
+
+    def makeCamera(self, name):
+        self.camera = FakeCamera(name, self.hasEvents)
+        self.camera.setFrame(self.frame1, 100.)
+        if not self.hasTimestamp:
+            del self.camera.values['frame_timestamp']
+        return self.camera
+
+    def startGrabber(self, source, period):
+        grabber = FrameGrabber(source.read, period,
+                               captureTime=lambda: source.frameTime)
+        isSubscribed = source.subscribe(grabber.trigger)
+        grabber.start()
+        self.addCleanup(source.close)
+        self.addCleanup(grabber.stop)
+        return grabber, isSubscribed
+
+    def test_events_deliver_frames(self):
+        source = FrameSources.TangoCameraSource('test/camera/1', 'raw')
+        # the period is much longer than the waits below, so that only the
+        # events can bring the frames in time:
+        grabber, isSubscribed = self.startGrabber(source, 30.)
+        self.assertTrue(isSubscribed)
+        self.assertEqual(len(self.camera.callbacks), 1)
+
+        self.assertTrue(grabber.waitFrame(5))
+        np.testing.assert_array_equal(grabber.latest(), self.frame1)
+        self.assertEqual(source.cameraTime, 100.)
+
+        for i, frame in enumerate((self.frame2, self.frame1)):
+            self.camera.setFrame(frame, 101. + i)
+            t0 = time.time()
+            self.camera.fire()
+            self.assertTrue(grabber.waitFrame(5))
+            np.testing.assert_array_equal(grabber.latest(), frame)
+            # the frame time is the event receipt on this host's clock:
+            self.assertTrue(t0 <= grabber.latestTime <= time.time())
+            self.assertEqual(source.cameraTime, 101. + i)
+        self.assertEqual(grabber.frameCount, 3)
+
+        source.close()
+        self.assertEqual(len(self.camera.callbacks), 0)
+
+    def test_polling_without_events(self):
+        self.hasEvents = False
+        source = FrameSources.TangoCameraSource('test/camera/1', 'raw')
+        grabber, isSubscribed = self.startGrabber(source, 0.05)
+        self.assertFalse(isSubscribed)
+        self.assertTrue(grabber.waitFrame(5))
+        grabber.latest()
+        self.camera.setFrame(self.frame2, 101.)
+        for i in range(10):  # the frames read before setFrame() may come
+            self.assertTrue(grabber.waitFrame(5))
+            frame = grabber.latest()
+            if np.array_equal(frame, self.frame2):
+                break
+        np.testing.assert_array_equal(frame, self.frame2)
+        self.assertIsNone(source.frameTime)  # no events, the arrival counts
+
+    def test_encoded_transport(self):
+        source = FrameSources.TangoCameraSource('test/camera/1', 'auto')
+        self.assertTrue(source.encoded)
+        np.testing.assert_array_equal(source.read(), self.frame1)
+        self.assertEqual(self.camera.requests[-1],
+                         ['encoded_image', 'frame_timestamp'])
+
+    def test_binned_frame_with_roi(self):
+        source = FrameSources.TangoCameraSource('test/camera/1', 'raw', 4)
+        self.assertEqual(self.camera.values['binning'], 4)
+        self.assertTrue(source.setRoi((8, 4, 20, 12)))
+        # the region is written by the next read(), not by setRoi():
+        self.assertNotIn('roi', self.camera.values)
+        # the camera clamps the region and sends it with the binned frame:
+        roi = randomFrame(10, 16, 3)
+        self.camera.values.update(
+            Image=FrameCodec.pack(self.frame1[::4, ::4], isBGR=False),
+            resolution=[64, 48], effective_roi=[8, 4, 16, 10],
+            roi_image=FrameCodec.pack(roi, isBGR=False))
+
+        frame = source.read()
+        self.assertEqual(self.camera.values['roi'], [8, 4, 20, 12])
+        self.assertEqual(len(self.camera.requests), 1)
+        self.assertEqual(frame.shape, (48, 64, 3))
+        np.testing.assert_array_equal(frame[4:14, 8:24], roi)
+        self.assertEqual(source.cameraTime, 100.)
+        self.assertIsNone(source.frameTime)  # no event has come
+
+    def test_without_frame_timestamp(self):
+        # e.g. the USBCamera before frame_timestamp:
+        self.hasTimestamp = False
+        source = FrameSources.TangoCameraSource('test/camera/1', 'raw', 4)
+        self.camera.values.update(
+            Image=FrameCodec.pack(self.frame1[::4, ::4], isBGR=False),
+            resolution=[64, 48])
+        self.assertEqual(source.read().shape, (48, 64, 3))
+        self.assertEqual(self.camera.requests[-1], ['Image', 'resolution'])
+        self.assertIsNone(source.cameraTime)
+
+    def test_no_roi_at_full_resolution(self):
+        source = FrameSources.TangoCameraSource('test/camera/1', 'raw')
+        self.assertFalse(source.setRoi((8, 4, 20, 12)))
+        self.assertNotIn('roi', self.camera.values)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+"""Tests of the moves, tours and cancels of `MotionExecutor` with simulated
+motors."""
+
+import os
+import sys
+import time
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from MotionExecutor import MotionExecutor, SimulatedMotor  # noqa: E402
+
+
+class TaurusLikeMotor(object):
+    """A motor at its target at once that reports MOVING for `settle`
+    seconds after a write. As on a taurus device, `state` is a property, not
+    a method."""
+
+    def __init__(self, settle):
+        self.settle = settle
+        self.position = 0.
+        self.writeTime = 0.
+
+    @property
+    def state(self):
+        return 'ON'
+
+    def read_attribute(self, name):
+        if name == 'State':
+            moving = time.time() - self.writeTime < self.settle
+            return SimulatedMotor.Value('MOVING' if moving else 'ON')
+        return SimulatedMotor.Value(self.position)
+
+    def write_attribute(self, name, value):
+        self.position = value
+        self.writeTime = time.time()
+
+    def command_inout(self, name):
+        pass
+
+
+class TestMotionExecutor(unittest.TestCase):
+    def makeExecutor(self, speed):
+        self.motors = SimulatedMotor(speed=speed), SimulatedMotor(speed=speed)
+        executor = MotionExecutor(self.motors, tolerance=0.01, timeout=10.,
+                                  dwell=0.01)
+        self.addCleanup(executor.stop)
+        return executor
+
+    def waitFor(self, condition, timeout=10.):
+        t0 = time.time()
+        while not condition():
+            if time.time() - t0 > timeout:
+                self.fail('timed out')
+            time.sleep(0.01)
+
+    def position(self):
+        return [motor.current()[0] for motor in self.motors]
+
+    def test_moveBy(self):
+        executor = self.makeExecutor(100.)
+        executor.moveBy(1., -2.)
+        executor.moveBy(0.5, 0.)
+        self.waitFor(lambda: executor.jobs.empty() and
+                     executor.state == 'idle' and
+                     executor.position == (1.5, -2.))
+        self.assertIsNone(executor.lastError)
+
+    def test_waits_for_the_state(self):
+        self.motors = TaurusLikeMotor(0.3), None
+        executor = MotionExecutor(self.motors, tolerance=0.01, timeout=10.)
+        self.addCleanup(executor.stop)
+        self.waitFor(lambda: executor.state == 'idle' and
+                     executor.jobs.empty())
+        t0 = time.time()
+        executor.moveBy(1., 0.)
+        self.waitFor(lambda: executor.state == 'idle' and
+                     executor.position == (1., None))
+        self.assertGreaterEqual(time.time() - t0, 0.3)
+        self.assertIsNone(executor.lastError)
+
+    def test_addRelativeTarget(self):
+        executor = self.makeExecutor(100.)
+        self.waitFor(lambda: executor.position == (0., 0.))
+        self.motors[1].write_attribute('position', 2.)  # moved outside
+        self.waitFor(lambda: self.position() == [0., 2.])
+        executor.addRelativeTarget((1., 0.5), dwell=0.01)
+        self.waitFor(lambda: executor.targets)
+        self.assertEqual(executor.targets, [(1., 2.5, 0.01)])
+        self.assertEqual(executor.position, (0., 0.))  # the worker's
+
+    def test_tour(self):
+        executor = self.makeExecutor(100.)
+        visited = []
+        executor.onChange = lambda: executor.state == 'dwelling' and \
+            visited.append(executor.current)
+        targets = [(1., 2.), (3., 1.), (0., 0.5)]
+        for target in targets:
+            executor.addTarget(target)
+        executor.startTour()
+        self.waitFor(lambda: not executor.targets and
+                     executor.state == 'idle')
+        self.assertEqual([v[:2] for v in visited], targets)
+        self.assertEqual(executor.position, (0., 0.5))
+        self.assertIsNone(executor.current)
+
+    def test_cancel_move(self):
+        executor = self.makeExecutor(5.)
+        executor.moveBy(100., 0.)
+        executor.moveBy(-50., 0.)  # dropped by the cancel
+        self.waitFor(lambda: executor.state == 'moving')
+        time.sleep(0.1)
+        executor.cancel()
+        self.waitFor(lambda: executor.state == 'idle' and
+                     not self.motors[0].current()[1])
+        x = self.position()[0]
+        self.assertTrue(0 < x < 10, x)
+        time.sleep(0.3)
+        self.assertEqual(self.position()[0], x)
+        self.assertTrue(executor.jobs.empty())
+
+        # the jobs queued after the cancel run:
+        executor.moveBy(-x, 0.)
+        self.waitFor(lambda: executor.state == 'idle' and
+                     abs(self.position()[0]) < 0.01)
+
+    def test_cancel_tour(self):
+        executor = self.makeExecutor(100.)
+        executor.addTarget((1., 1.), dwell=0.01)
+        executor.addTarget((2., 2.), dwell=30.)
+        executor.addTarget((3., 3.), dwell=0.01)
+        executor.startTour()
+        self.waitFor(lambda: executor.state == 'dwelling' and
+                     executor.current[:2] == (2., 2.))
+        executor.cancel()
+        self.waitFor(lambda: executor.state == 'idle')
+        # the tour continues from the first unvisited target:
+        self.assertEqual([t[:2] for t in executor.targets],
+                         [(2., 2.), (3., 3.)])
+        executor.targets[0] = (2., 2., 0.01)
+        executor.startTour()
+        self.waitFor(lambda: not executor.targets and
+                     executor.state == 'idle')
+        self.assertEqual(executor.position, (3., 3.))
+
+    def test_cancel_before_start(self):
+        executor = self.makeExecutor(100.)
+        executor.addTarget((1., 1.))
+        executor.cancel()  # nothing runs, the next jobs are not cancelled
+        executor.startTour()
+        self.waitFor(lambda: not executor.targets and
+                     executor.state == 'idle')
+        self.assertEqual(executor.position, (1., 1.))
+
+
+if __name__ == '__main__':
+    unittest.main()
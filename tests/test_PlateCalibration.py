@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+"""Tests of the transforms of `PlateCalibration`."""
+
+import os
+import sys
+import unittest
+import numpy as np
+import cv2
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from PlateCalibration import PlateCalibration  # noqa: E402
+
+corners = [(170, 190), (600, 180), (590, 420), (180, 440)]
+scalex, scaley = 40., 25.
+beamPos = (400, 300)
+imageSize = (800, 600)
+
+
+class TestPlateCalibration(unittest.TestCase):
+    def setUp(self):
+        self.cal = PlateCalibration(corners, scalex, scaley, beamPos,
+                                    imageSize)
+        self.points = np.random.RandomState(0).uniform(
+            (100, 100), (700, 500), (50, 2))
+
+    def test_corners(self):
+        np.testing.assert_allclose(
+            self.cal.imageToRectified(corners), self.cal.targetRect,
+            atol=1e-6)
+        plate = self.cal.imageToPlate(corners)
+        np.testing.assert_allclose(plate[1] - plate[0], (scalex, 0),
+                                   atol=1e-6)
+        np.testing.assert_allclose(plate[3] - plate[0], (0, scaley),
+                                   atol=1e-6)
+
+    def test_beam_is_plate_origin(self):
+        np.testing.assert_allclose(self.cal.imageToPlate(beamPos), (0, 0),
+                                   atol=1e-9)
+        np.testing.assert_allclose(self.cal.fromPlate((0, 0)), beamPos,
+                                   atol=1e-9)
+
+    def test_round_trips(self):
+        cal = self.cal
+        np.testing.assert_allclose(
+            cal.rectifiedToImage(cal.imageToRectified(self.points)),
+            self.points, atol=1e-6)
+        np.testing.assert_allclose(
+            cal.plateToImage(cal.imageToPlate(self.points)), self.points,
+            atol=1e-6)
+        rectified = cal.imageToRectified(self.points)
+        np.testing.assert_allclose(
+            cal.fromPlate(cal.toPlate(rectified, True), True), rectified,
+            atol=1e-6)
+
+    def test_vectorized(self):
+        grid = self.points.reshape(5, 10, 2)
+        plate = self.cal.imageToPlate(grid)
+        self.assertEqual(plate.shape, grid.shape)
+        for i in (0, 17, 49):
+            np.testing.assert_allclose(
+                plate.reshape(-1, 2)[i], self.cal.imageToPlate(
+                    tuple(self.points[i])), atol=1e-9)
+
+    def test_remap_as_warpPerspective(self):
+        w, h = imageSize
+        yy, xx = np.mgrid[0:h, 0:w]
+        frame = np.dstack((xx * 255 // w, yy * 255 // h,
+                           (xx + yy) * 255 // (w + h))).astype(np.uint8)
+        cv2.circle(frame, (400, 300), 60, (255, 255, 255), -1, cv2.LINE_AA)
+        cal = self.cal
+
+        def compare(maps, transform, size):
+            remapped = cv2.remap(frame, maps[0], maps[1], cv2.INTER_LINEAR)
+            warped = cv2.warpPerspective(frame, transform, size,
+                                         flags=cv2.INTER_LINEAR)
+            self.assertEqual(remapped.shape, warped.shape)
+            diff = np.abs(remapped.astype(int) - warped)
+            self.assertLess(diff.mean(), 0.1)
+            self.assertLessEqual(np.percentile(diff, 99.9), 2)
+
+        size = tuple(cal.boundingRect[2:4])
+        compare(cal.rectifyMaps(), cal.perspectiveTransform2, size)
+        # a zoomed window, 4 output pixels per rectified pixel:
+        window, size = (100, 80, 60, 40), (240, 160)
+        compare(cal.windowMaps(window, size),
+                cal.windowTransform(window, size), size)
+
+    def test_windowMaps_lru(self):
+        cal = self.cal
+        windows = [(i*10, 0, 100, 100) for i in range(cal.maxCachedMaps)]
+        for window in windows:
+            cal.windowMaps(window, (50, 50))
+        maps = cal.windowMaps(windows[0], (50, 50))  # used again
+        cal.windowMaps((500, 0, 100, 100), (50, 50))
+        self.assertEqual(len(cal.remapMaps), cal.maxCachedMaps)
+        self.assertNotIn((windows[1], (50, 50), False, 0), cal.remapMaps)
+        self.assertIs(cal.windowMaps(windows[0], (50, 50)), maps)
+        self.assertEqual(sorted(cal.mapOrder), sorted(cal.remapMaps))
+
+    def test_state(self):
+        cal = self.cal
+        cal.rectifyMaps()
+        state = cal.state()
+        restored = PlateCalibration(corners, scalex, scaley, beamPos,
+                                    imageSize, state=state)
+        self.assertEqual(restored.key, cal.key)
+        self.assertEqual(restored.boundingRect, cal.boundingRect)
+        np.testing.assert_allclose(restored.imageToPlate(self.points),
+                                   cal.imageToPlate(self.points))
+        self.assertEqual(restored.mapOrder, cal.mapOrder)
+        map1, map2 = restored.rectifyMaps()
+        np.testing.assert_array_equal(map1, cal.rectifyMaps()[0])
+
+        # the state of another calibration is ignored:
+        other = PlateCalibration(corners, scalex, scaley + 1, beamPos,
+                                 imageSize, state=state)
+        self.assertNotEqual(other.key, cal.key)
+        self.assertEqual(other.mapOrder, [])
+        np.testing.assert_allclose(
+            other.imageToPlate(corners[3]) - other.imageToPlate(corners[0]),
+            (0, scaley + 1), atol=1e-6)
+
+    def test_updateCorners(self):
+        cal = self.cal
+        key, targetRect = cal.key, cal.targetRect
+        moved = [(x + 5, y + 3) for x, y in corners]
+        cal.updateCorners(moved)
+        self.assertTrue(cal.isTracked)
+        self.assertEqual(cal.key, key)
+        self.assertEqual(cal.targetRect, targetRect)
+        np.testing.assert_allclose(cal.imageToRectified(moved), targetRect,
+                                   atol=1e-6)
+        # the plate coordinates are those of the moved corners:
+        fresh = PlateCalibration(moved, scalex, scaley, beamPos, imageSize)
+        np.testing.assert_allclose(cal.imageToPlate(self.points),
+                                   fresh.imageToPlate(self.points),
+                                   atol=1e-6)
+
+    def test_inFront(self):
+        self.assertTrue(np.all(self.cal.inFront(self.points)))
+        self.assertTrue(self.cal.inFront(beamPos))
+
+
+if __name__ == '__main__':
+    unittest.main()
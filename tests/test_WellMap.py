@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""Tests of the well search of `WellMap` against the brute force one."""
+
+import os
+import sys
+import unittest
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from WellMap import WellMap, rowName  # noqa: E402
+
+
+def bruteNearest(centers, point):
+    return np.hypot(*(centers - point).T).argmin()
+
+
+class TestWellMap(unittest.TestCase):
+    def setUp(self):
+        rs = np.random.RandomState(0)
+        self.random = WellMap(rs.uniform(0, 100, (500, 2)))
+        self.points = rs.uniform(-30, 130, (300, 2))
+
+    def test_nearest(self):
+        for wells in (self.random, WellMap.standard('sbs96'),
+                      WellMap([(0, 0), (10, 0), (50, 0)])):
+            for point in self.points:
+                i = wells.nearest(point)
+                d = np.hypot(*(wells.centers[i] - point))
+                best = bruteNearest(wells.centers, point)
+                # a tie may give either well:
+                self.assertAlmostEqual(
+                    d, np.hypot(*(wells.centers[best] - point)))
+
+    def test_nearest_maxDistance(self):
+        wells = WellMap.grid(8, 12, 9.)
+        self.assertEqual(wells.names[wells.nearest((9.5, 18.5), 1.)], 'C2')
+        self.assertIsNone(wells.nearest((4.5, 4.5), 1.))
+        self.assertIsNone(wells.nearest((500., 500.), 10.))
+        self.assertEqual(wells.names[wells.nearest((500., 500.))], 'H12')
+
+    def test_inRect(self):
+        x, y = self.random.centers.T
+        for x0, y0, x1, y1 in [(10, 20, 30, 25), (-50, -50, 150, 150),
+                               (40, 40, 40.5, 90), (200, 0, 300, 10)]:
+            brute = np.nonzero((x >= x0) & (x <= x1) &
+                               (y >= y0) & (y <= y1))[0]
+            self.assertEqual(sorted(self.random.inRect(x0, y0, x1, y1)),
+                             list(brute))
+
+    def test_standard(self):
+        wells = WellMap.standard('SBS384')
+        self.assertEqual(len(wells), 384)
+        self.assertEqual(wells.names[0], 'A1')
+        self.assertEqual(wells.names[-1], 'P24')
+        np.testing.assert_allclose(wells.centers[0], (12.13, 8.99))
+        self.assertEqual(rowName(25), 'Z')
+        self.assertEqual(rowName(26), 'AA')
+
+    def test_bad_maps(self):
+        with self.assertRaises(ValueError):
+            WellMap(np.empty((0, 2)))
+        with self.assertRaises(ValueError):
+            WellMap([(0, 0), (1, 1)], names=['A1'])
+
+
+if __name__ == '__main__':
+    unittest.main()